@@ -1,3 +1,5 @@
+__version__ = "1.1.2"
+
 
 def is_ok():
     print("The RCAEval package is imported")
\ No newline at end of file
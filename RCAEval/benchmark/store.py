@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import signal
+from contextlib import contextmanager
+from os.path import exists, join
+from typing import Optional
+
+from RCAEval.utility import dump_json, load_json
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+
+class CaseTimeout(BaseException):
+    """
+    Raised when a case runs longer than its time limit
+
+    It derives from BaseException so the catch-all handlers of the RCA methods
+    (e.g., the @rca wrapper) do not swallow it.
+    """
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]):
+    """
+    Raise CaseTimeout if the body runs longer than seconds
+
+    It relies on SIGALRM, so it is a no-op when seconds is falsy or on
+    platforms without it. It must be used from the main thread of a process.
+    """
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def handler(signum, frame):
+        raise CaseTimeout(f"timed out after {seconds}s")
+
+    old_handler = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hash the content of a file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def result_key(**fields) -> str:
+    """
+    Hash everything a case result depends on into a key
+    """
+    text = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    Content-addressed store of case results
+
+    A record is a dict with at least a "status" (ok/failed/timeout). Only ok
+    records count as done, failed and timed out cases are retried on rerun.
+    """
+
+    def __init__(self, root: str):
+        self._root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        """
+        Location of the record for key
+        """
+        return join(self._root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return the record for key, None if missing or unreadable
+        """
+        return self._load(self.path(key))
+
+    def put(self, key: str, record: dict):
+        """
+        Save the record for key
+        """
+        self._dump(self.path(key), record)
+
+    def fingerprint(self, path: str) -> str:
+        """
+        file_fingerprint of path, hashed again only when its size or mtime changed
+
+        The (size, mtime) of the last hash of each file is kept under
+        <root>/fingerprints/, apart from the case records, so skipping a
+        finished case costs a stat, not a read of its data.
+        """
+        stat = os.stat(path)
+        name = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()
+        record_path = join(self._root, "fingerprints", f"{name}.json")
+        seen = self._load(record_path)
+        if seen is not None and [seen["size"], seen["mtime_ns"]] == [stat.st_size, stat.st_mtime_ns]:
+            return seen["sha256"]
+        digest = file_fingerprint(path)
+        self._dump(record_path, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest})
+        return digest
+
+    @staticmethod
+    def _load(path: str) -> Optional[dict]:
+        if not exists(path):
+            return None
+        try:
+            return load_json(path)
+        except ValueError:
+            # a half written record, treat it as missing
+            return None
+
+    @staticmethod
+    def _dump(path: str, record: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so a crash never leaves a broken record behind
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        dump_json(filename=tmp_path, data=record)
+        os.replace(tmp_path, path)
+
+    def is_done(self, key: str) -> bool:
+        """
+        Whether key has a successful record
+        """
+        record = self.get(key)
+        return record is not None and record.get("status") == STATUS_OK
@@ -5,6 +5,7 @@ from typing import Dict, Sequence, Set, Tuple, Union
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 
 from RCAEval.classes.graph import Graph, Node
 
@@ -149,6 +150,119 @@ class MemoryDataLoader(DataLoader):
         )
 
 
+class ArrayDataLoader(DataLoader):
+    """
+    Implement DataLoader with the series of all the nodes in one aligned array
+
+    All the series share one time index, so load resamples and interpolates
+    them together, as preprocess does for each one, once per window, and
+    returns views of the columns of the result.
+    """
+
+    def __init__(self, timestamps: Sequence[float], values: np.ndarray, nodes: Sequence[Node]):
+        """
+        timestamps: (time,) unix timestamps in seconds
+        values: (time, nodes) array, values[:, i] being the series of nodes[i]
+        """
+        self._timestamps = np.asarray(timestamps)
+        self._values = np.asarray(values, dtype=float).reshape(len(self._timestamps), len(nodes))
+        self._columns = {node: i for i, node in enumerate(nodes)}
+        self._cache: Tuple[tuple, np.ndarray] = (None, None)
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, time_col: str = "time") -> "ArrayDataLoader":
+        """
+        Loader of the columns named {entity}_{metric} of data, indexed by time_col
+        """
+        columns, nodes = [], []
+        for column in data.columns:
+            if column == time_col:
+                continue
+            entity, metric = column.split("_")[:2]
+            if f"{entity}_{metric}" == column:
+                columns.append(column)
+                nodes.append(Node(entity=entity, metric=metric))
+        return cls(data[time_col].to_numpy(), data[columns].to_numpy(dtype=float), nodes)
+
+    @property
+    def entities(self) -> Sequence[str]:
+        return tuple(dict.fromkeys(node.entity for node in self._columns))
+
+    @property
+    def metrics(self) -> Dict[str, Sequence[str]]:
+        metrics: Dict[str, Tuple[str, ...]] = {}
+        for node in self._columns:
+            metrics[node.entity] = metrics.get(node.entity, ()) + (node.metric,)
+        return metrics
+
+    def window(
+        self, start: float, end: float, interval: timedelta, unit: str = "s"
+    ) -> Union[None, np.ndarray]:
+        """
+        (points, nodes) array of the series of all the nodes, preprocessed on [start, end]
+
+        Return None if no timestamp falls in [start, end].
+        """
+        key = (start, end, interval, unit)
+        if self._cache[0] == key:
+            return self._cache[1]
+
+        in_window = (self._timestamps >= start) & (self._timestamps <= end)
+        if not in_window.any():
+            output = None
+        else:
+            # 1. Bin the points of the window on [start, end], as resample from start
+            def nanoseconds(values):
+                return pd.to_datetime(values, unit=unit, utc=True).asi8
+
+            origin, last = nanoseconds(np.array([start, end]))
+            step = pd.Timedelta(interval).value
+            bins = (nanoseconds(self._timestamps[in_window]) - origin) // step
+            num_bins = (last - origin) // step + 1
+            values = self._values[in_window]
+            observed = ~np.isnan(values)
+            binning = sparse.csr_matrix(
+                (np.ones(len(bins)), (bins, np.arange(len(bins)))), shape=(num_bins, len(bins))
+            )
+            counts = binning @ observed.astype(float)
+            sums = binning @ np.where(observed, values, 0)
+            output = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+            # 2. Fill the empty bins linearly in time, and with the nearest value at the ends
+            index = np.arange(num_bins)[:, None]
+            valid = ~np.isnan(output)
+            before = np.maximum.accumulate(np.where(valid, index, -1), axis=0)
+            after = np.minimum.accumulate(np.where(valid, index, num_bins)[::-1], axis=0)[::-1]
+            columns = np.arange(output.shape[1])
+            low = output[np.maximum(before, 0), columns]
+            high = output[np.minimum(after, num_bins - 1), columns]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                filled = low + (high - low) * (index - before) / (after - before)
+            filled = np.where(before < 0, high, np.where(after >= num_bins, low, filled))
+            output = np.asfortranarray(np.where(valid, output, filled))
+
+        self._cache = (key, output)
+        return output
+
+    def load(
+        self,
+        entity: str,
+        metric: str,
+        start: float,
+        end: float,
+        interval: timedelta,
+        **kwargs,
+    ) -> Union[None, Sequence[float]]:
+        # pylint: disable=too-many-arguments
+        column = self._columns.get(Node(entity=entity, metric=metric))
+        if column is None:
+            return None
+        window = self.window(start=start, end=end, interval=interval, unit=kwargs.get("unit", "s"))
+        if window is None:
+            return None
+        return window[:, column]
+
+
 class CaseData:
     # pylint: disable=too-many-instance-attributes
     """
@@ -233,11 +347,12 @@ class CaseData:
                 end=current,
                 interval=self._interval,
             )
+            has_data = node_data is not None and len(node_data) > 0
             if self._prune:
-                if node_data and len(set(node_data)) > 1:
+                if has_data and len(set(node_data)) > 1:
                     series[node] = node_data[:length]
             else:
-                if not node_data:
+                if not has_data:
                     node_data = np.zeros(length)
                 series[node] = node_data[:length]
         return series
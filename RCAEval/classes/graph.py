@@ -201,11 +201,7 @@ class MemoryGraph(Graph):
             return MemoryGraph(graph)
 
         adj = finalize_directed_adj(adj)
-
-        for i in range(len(adj)):
-            for j in range(len(adj)):
-                if adj[i, j] == 1:
-                    graph.add_edge(nodes[j], nodes[i])
+        graph.add_edges_from((nodes[j], nodes[i]) for i, j in zip(*np.nonzero(adj == 1)))
 
         return MemoryGraph(graph)
 
@@ -4,7 +4,7 @@ warnings.filterwarnings("ignore")
 
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import RobustScaler, StandardScaler
+from sklearn.preprocessing import RobustScaler
 
 from RCAEval.io.time_series import (
     convert_mem_mb,
@@ -14,6 +14,7 @@ from RCAEval.io.time_series import (
     drop_time,
     preprocess,
     select_useful_cols,
+    split_and_preprocess,
 )
 from RCAEval.utility import is_py310
 
@@ -35,7 +36,7 @@ if is_py310():
         from .causalai import causalai
     except Exception as e:
         pass
-    from .baro import baro, mmbaro, mmnsigma
+    from .baro import baro, baro_batch, mmbaro, mmnsigma, nsigma_batch
     from .causalrca import causalrca
     from .circa import circa
     from .cloudranger import cloudranger
@@ -55,6 +56,7 @@ if is_py310():
         pc_randomwalk,
     )
     from .run import run
+    from .streaming import StreamingBARO, StreamingNSigma
     from .mscred import mscred
     from .tracerca import tracerca
 else:
@@ -86,44 +88,19 @@ def dummy(data, inject_time=None, dataset=None, *args, **kwargs):
 
 
 def nsigma(data, inject_time=None, dataset=None, num_loop=None, sli=None, anomalies=None, **kwargs):
-    if anomalies is None:
-        normal_df = data[data["time"] < inject_time]
-        anomal_df = data[data["time"] >= inject_time]
-    else:
-        normal_df = data.head(anomalies[0])
-        # anomal_df is the rest
-        anomal_df = data.tail(len(data) - anomalies[0])
-
-    normal_df = preprocess(
-        data=normal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
-    )
-
-    anomal_df = preprocess(
-        data=anomal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+    from .baro import _rank, standard_scores
+
+    normal, anomal, columns = split_and_preprocess(
+        data,
+        inject_time,
+        dataset=dataset,
+        dk_select_useful=kwargs.get("dk_select_useful", False),
+        anomalies=anomalies,
     )
 
-    # intersect
-    intersects = [x for x in normal_df.columns if x in anomal_df.columns]
-    normal_df = normal_df[intersects]
-    anomal_df = anomal_df[intersects]
-
-    ranks = []
-
-    for col in normal_df.columns:
-        a = normal_df[col].to_numpy()
-        b = anomal_df[col].to_numpy()
-
-        scaler = StandardScaler().fit(a.reshape(-1, 1))
-        zscores = scaler.transform(b.reshape(-1, 1))[:, 0]
-        score = max(zscores)
-        ranks.append((col, score))
-
-    ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
-    ranks = [x[0] for x in ranks]
-
     return {
-        "node_names": normal_df.columns.to_list(),
-        "ranks": ranks,
+        "node_names": columns,
+        "ranks": _rank(columns, standard_scores(normal, anomal)),
     }
 
 
@@ -139,31 +116,19 @@ def e_diagnosis(
     # print(f"=========== E alpha: {alpha} ===========")
     model = EpsilonDiagnosis(config=EpsilonDiagnosis.config_class(alpha=alpha))
 
-    if anomalies is None:
-        normal_df = data[data["time"] < inject_time]
-        anomal_df = data[data["time"] >= inject_time]
-    else:
-        normal_df = data.head(anomalies[0])
-        # anomal_df is the rest
-        anomal_df = data.tail(len(data) - anomalies[0])
-
-        print(f"{len(normal_df)=} {len(anomal_df)=}")
-
-    normal_df = preprocess(
-        data=normal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
-    )
-
-    anomal_df = preprocess(
-        data=anomal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+    normal, anomal, columns = split_and_preprocess(
+        data,
+        inject_time,
+        dataset=dataset,
+        dk_select_useful=kwargs.get("dk_select_useful", False),
+        anomalies=anomalies,
     )
+    if anomalies is not None:
+        print(f"{len(normal)=} {len(anomal)=}")
 
-    # intersect
-    intersects = [x for x in normal_df.columns if x in anomal_df.columns]
-    normal_df = normal_df[intersects]
-    anomal_df = anomal_df[intersects]
-    min_length = min(normal_df.shape[0], anomal_df.shape[0])
-    normal_df = normal_df.tail(min_length)
-    anomal_df = anomal_df.head(min_length)
+    min_length = min(len(normal), len(anomal))
+    normal_df = pd.DataFrame(normal[len(normal) - min_length :], columns=columns)
+    anomal_df = pd.DataFrame(anomal[:min_length], columns=columns)
 
     model.train(normal_df)
     results = model.find_root_causes(anomal_df)
@@ -185,31 +150,20 @@ def ht(data, inject_time=None, dataset=None, num_loop=None, sli=None, anomalies=
     from pyrca.graphs.causal.fges import FGES, FGESConfig
     from pyrca.graphs.causal.pc import PC
 
-    if anomalies is None:
-        normal_df = data[data["time"] < inject_time]
-        anomal_df = data[data["time"] >= inject_time]
-    else:
-        normal_df = data.head(anomalies[0])
-        # anomal_df is the rest
-        anomal_df = data.tail(len(data) - anomalies[0])
-
-        print(f"{len(normal_df)=} {len(anomal_df)=}")
-
     # preprocess data
-    normal_df = preprocess(
-        data=normal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
-    )
-
-    anomal_df = preprocess(
-        data=anomal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+    normal, anomal, columns = split_and_preprocess(
+        data,
+        inject_time,
+        dataset=dataset,
+        dk_select_useful=kwargs.get("dk_select_useful", False),
+        anomalies=anomalies,
     )
+    if anomalies is not None:
+        print(f"{len(normal)=} {len(anomal)=}")
 
-    intersects = [x for x in normal_df.columns if x in anomal_df.columns]
-    normal_df = normal_df[intersects]
-    anomal_df = anomal_df[intersects]
-    min_length = min(normal_df.shape[0], anomal_df.shape[0])
-    normal_df = normal_df.tail(min_length)
-    anomal_df = anomal_df.head(min_length)
+    min_length = min(len(normal), len(anomal))
+    normal_df = pd.DataFrame(normal[len(normal) - min_length :], columns=columns)
+    anomal_df = pd.DataFrame(anomal[:min_length], columns=columns)
 
     data = pd.concat([normal_df, anomal_df], ignore_index=True)
     data.bfill(inplace=True)
@@ -12,54 +12,170 @@ from RCAEval.io.time_series import (
     drop_extra,
     drop_near_constant,
     drop_time,
-    preprocess,
     select_useful_cols,
+    split_and_preprocess,
 )
 
-def baro(
-    data, inject_time=None, dataset=None, num_loop=None, sli=None, anomalies=None, **kwargs
-):
-    if anomalies is None:
-        normal_df = data[data["time"] < inject_time]
-        anomal_df = data[data["time"] >= inject_time]
+def _max_scores(zscores: np.ndarray) -> list:
+    scores = zscores.max(axis=-2)
+    for index in np.argwhere(np.isnan(scores)):
+        # the builtin max does not propagate nan, keep its result
+        *case, col = index
+        scores[tuple(index)] = max(zscores[(*case, slice(None), col)])
+    return scores.tolist()
+
+
+def robust_scores(normal: np.ndarray, anomal: np.ndarray) -> list:
+    """
+    Max robust z-score of each column of anomal, scaled by the median and IQR of normal
+
+    It computes the same values as fitting a RobustScaler on each column of
+    normal and taking the max of the transformed column of anomal, for all
+    columns at once. Arrays are (rows, columns), or (cases, rows, columns) to
+    score a batch of cases.
+    """
+    if normal.shape[-1] == 0:
+        return np.zeros(normal.shape[:-2] + (0,)).tolist()
+    if normal.shape[-2] == 0:
+        raise ValueError("Found array with 0 sample(s) while a minimum of 1 is required.")
+
+    if np.isnan(normal).any():
+        center = np.nanmedian(normal, axis=-2)
+        q_min, q_max = np.nanpercentile(normal, [25.0, 75.0], axis=-2)
     else:
-        normal_df = data.head(anomalies[0])
-        anomal_df = data.tail(len(data) - anomalies[0])
+        # without nan, the nan-aware reductions give the same values but run column by column
+        center = np.median(normal, axis=-2)
+        q_min, q_max = np.percentile(normal, [25.0, 75.0], axis=-2)
+    scale = q_max - q_min
+    # as sklearn does, do not scale near constant columns
+    scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0
 
+    return _max_scores((anomal - center[..., None, :]) / scale[..., None, :])
 
-    normal_df = preprocess(
-        data=normal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
-    )
 
-    anomal_df = preprocess(
-        data=anomal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
-    )
+def standard_scores(normal: np.ndarray, anomal: np.ndarray) -> list:
+    """
+    Max z-score of each column of anomal, scaled by the mean and std of normal
 
-    # intersect
-    intersects = [x for x in normal_df.columns if x in anomal_df.columns]
-    normal_df = normal_df[intersects]
-    anomal_df = anomal_df[intersects]
+    It computes the same values as fitting a StandardScaler on each column of
+    normal and taking the max of the transformed column of anomal, for all
+    columns at once. Arrays are (rows, columns) or (cases, rows, columns).
+    """
+    if normal.shape[-1] == 0:
+        return np.zeros(normal.shape[:-2] + (0,)).tolist()
+    if normal.shape[-2] == 0:
+        raise ValueError("Found array with 0 sample(s) while a minimum of 1 is required.")
 
-    ranks = []
+    # sum each column contiguously, as StandardScaler does for a single column,
+    # so the rounding is the same
+    values = np.ascontiguousarray(np.swapaxes(normal, -1, -2))
+    count = values.shape[-1] - np.isnan(values).sum(axis=-1)
+    mean = np.nansum(values, axis=-1) / count
+    # corrected two-pass variance
+    temp = values - mean[..., None]
+    correction = np.nansum(temp, axis=-1)
+    temp **= 2
+    var = (np.nansum(temp, axis=-1) - correction**2 / count) / count
 
-    for col in normal_df.columns:
-        a = normal_df[col].to_numpy()
-        b = anomal_df[col].to_numpy()
+    # as sklearn does, do not scale near constant columns
+    eps = np.finfo(np.float64).eps
+    constant = var <= count * eps * var + (count * mean * eps) ** 2
+    scale = np.sqrt(var)
+    scale[constant] = 1.0
 
-        scaler = RobustScaler().fit(a.reshape(-1, 1))
-        zscores = scaler.transform(b.reshape(-1, 1))[:, 0]
-        score = max(zscores)
-        ranks.append((col, score))
+    return _max_scores((anomal - mean[..., None, :]) / scale[..., None, :])
 
-    ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
-    ranks = [x[0] for x in ranks]
+
+def _rank(columns, scores):
+    ranks = sorted(zip(columns, scores), key=lambda x: x[1], reverse=True)
+    return [x[0] for x in ranks]
+
+
+# bytes of the normal and anomalous windows of the cases scored in one pass,
+# e.g., 5 RE2-TT cases of 600 rows x 1200 metrics
+MAX_STACK_BYTES = 1 << 25
+
+
+def _score_batch(cases, score_func, dataset=None, **kwargs):
+    # group the cases sharing columns and window sizes, and score each group at once
+    splits = [
+        split_and_preprocess(
+            data, inject_time, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+        )
+        for data, inject_time in cases
+    ]
+    groups = {}
+    for i, (normal, anomal, columns) in enumerate(splits):
+        groups.setdefault((tuple(columns), normal.shape, anomal.shape), []).append(i)
+
+    outputs = [None] * len(cases)
+    for (columns, normal_shape, anomal_shape), indices in groups.items():
+        # bound the memory of a stack and of the temporaries of its scores
+        case_bytes = 8 * (np.prod(normal_shape) + np.prod(anomal_shape))
+        chunk = max(1, MAX_STACK_BYTES // max(1, case_bytes))
+        for start in range(0, len(indices), chunk):
+            chunk_indices = indices[start : start + chunk]
+            normal = np.stack([splits[i][0] for i in chunk_indices])
+            anomal = np.stack([splits[i][1] for i in chunk_indices])
+            for i, scores in zip(chunk_indices, score_func(normal, anomal)):
+                outputs[i] = {"node_names": list(columns), "ranks": _rank(columns, scores)}
+    return outputs
+
+
+def baro(
+    data, inject_time=None, dataset=None, num_loop=None, sli=None, anomalies=None, **kwargs
+):
+    normal, anomal, columns = split_and_preprocess(
+        data,
+        inject_time,
+        dataset=dataset,
+        dk_select_useful=kwargs.get("dk_select_useful", False),
+        anomalies=anomalies,
+    )
 
     return {
-        "node_names": normal_df.columns.to_list(),
-        "ranks": ranks,
+        "node_names": columns,
+        "ranks": _rank(columns, robust_scores(normal, anomal)),
     }
-    
-    
+
+
+def baro_batch(cases, dataset=None, **kwargs):
+    """
+    Run baro on many (data, inject_time) cases
+
+    Cases whose preprocessed columns and window sizes match are stacked into a
+    (cases, rows, columns) array and scored in one pass. Return the outputs of
+    baro in the order of cases.
+    """
+    return _score_batch(cases, robust_scores, dataset=dataset, **kwargs)
+
+
+def nsigma_batch(cases, dataset=None, **kwargs):
+    """
+    Run nsigma on many (data, inject_time) cases, as baro_batch does
+    """
+    return _score_batch(cases, standard_scores, dataset=dataset, **kwargs)
+
+
+SCORE_FUNCTIONS = {RobustScaler: robust_scores, StandardScaler: standard_scores}
+
+
+def _scaler_scores(normal_df, anomal_df, scaler_function):
+    # (column, max z-score) of each column of normal_df
+    columns = normal_df.columns
+    normal = normal_df.to_numpy(dtype=np.float64)
+    anomal = anomal_df[columns].to_numpy(dtype=np.float64)
+    if scaler_function in SCORE_FUNCTIONS:
+        scores = SCORE_FUNCTIONS[scaler_function](normal, anomal)
+    else:
+        scores = []
+        for i in range(normal.shape[1]):
+            scaler = scaler_function().fit(normal[:, i].reshape(-1, 1))
+            zscores = scaler.transform(anomal[:, i].reshape(-1, 1))[:, 0]
+            scores.append(max(zscores))
+    return list(zip(columns, scores))
+
+
 def mmnsigma(data, inject_time=None, dataset=None, num_loop=None, sli=None, anomalies=None, **kwargs):
     scaler_function = kwargs.get("scaler_function", StandardScaler) 
 
@@ -76,13 +192,11 @@ def mmnsigma(data, inject_time=None, dataset=None, num_loop=None, sli=None, anom
     metric = metric.iloc[::15, :]
 
     # == metric ==
-    normal_metric = metric[metric["time"] < inject_time]
-    anomal_metric = metric[metric["time"] >= inject_time]
-    normal_metric = preprocess(data=normal_metric, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False))
-    anomal_metric = preprocess(data=anomal_metric, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False))
-    intersect = [x for x in normal_metric.columns if x in anomal_metric.columns]
-    normal_metric = normal_metric[intersect]
-    anomal_metric = anomal_metric[intersect]
+    normal_metric, anomal_metric, metric_cols = split_and_preprocess(
+        metric, inject_time, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+    )
+    normal_metric = pd.DataFrame(normal_metric, columns=metric_cols)
+    anomal_metric = pd.DataFrame(anomal_metric, columns=metric_cols)
 
     # == logts ==
     logts = drop_constant(logts)
@@ -110,48 +224,19 @@ def mmnsigma(data, inject_time=None, dataset=None, num_loop=None, sli=None, anom
     ranks = []
     
     # == metric ==
-    for col in normal_metric.columns:
-        if col == "time":
-            continue
-        a = normal_metric[col].to_numpy()
-        b = anomal_metric[col].to_numpy()
-
-        scaler = scaler_function().fit(a.reshape(-1, 1))
-        zscores = scaler.transform(b.reshape(-1, 1))[:, 0]
-        score = max(zscores)
-        ranks.append((col, score))
+    metric_cols = [c for c in metric_cols if c != "time"]
+    ranks.extend(_scaler_scores(normal_metric[metric_cols], anomal_metric, scaler_function))
 
     # == logs ==
-    for col in normal_logts.columns:
-        a = normal_logts[col].to_numpy()
-        b = anomal_logts[col].to_numpy()
-
-        scaler = scaler_function().fit(a.reshape(-1, 1))
-        zscores = scaler.transform(b.reshape(-1, 1))[:, 0]
-        score = max(zscores)
-        ranks.append((col, score))
+    ranks.extend(_scaler_scores(normal_logts, anomal_logts, scaler_function))
 
     # == traces_err ==
     if dataset == "mm-tt" or dataset == "mm-ob":
-        for col in normal_traces_err.columns:
-            a = normal_traces_err[col].to_numpy()[:-2]
-            b = anomal_traces_err[col].to_numpy()
-                
-            scaler = scaler_function().fit(a.reshape(-1, 1))
-            zscores = scaler.transform(b.reshape(-1, 1))[:, 0]
-            score = max(zscores)
-            ranks.append((col, score))
+        ranks.extend(_scaler_scores(normal_traces_err.iloc[:-2], anomal_traces_err, scaler_function))
    
     # == traces_lat ==
     if dataset == "mm-tt" or dataset == "mm-ob":
-        for col in normal_traces_lat.columns:
-            a = normal_traces_lat[col].to_numpy()
-            b = anomal_traces_lat[col].to_numpy()
-
-            scaler = scaler_function().fit(a.reshape(-1, 1))
-            zscores = scaler.transform(b.reshape(-1, 1))[:, 0]
-            score = max(zscores)
-            ranks.append((col, score))
+        ranks.extend(_scaler_scores(normal_traces_lat, anomal_traces_lat, scaler_function))
 
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
     if kwargs.get("verbose") is True:
@@ -8,7 +8,7 @@ import pandas as pd
 import torch.optim as optim
 from sknetwork.ranking import PageRank
 from torch.optim import lr_scheduler
-from RCAEval.io.time_series import preprocess, drop_constant
+from RCAEval.io.time_series import preprocess, drop_constant, split_and_preprocess
 
 warnings.filterwarnings("ignore")
 
@@ -276,13 +276,11 @@ def causalrca(data, inject_time=None, dataset=None, with_bg=False, **kwargs):
         metric = metric.iloc[::15, :]
 
         # == metric ==
-        normal_metric = metric[metric["time"] < inject_time]
-        anomal_metric = metric[metric["time"] >= inject_time]
-        normal_metric = preprocess(data=normal_metric, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False))
-        anomal_metric = preprocess(data=anomal_metric, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False))
-        intersect = [x for x in normal_metric.columns if x in anomal_metric.columns]
-        normal_metric = normal_metric[intersect]
-        anomal_metric = anomal_metric[intersect]
+        normal_metric, anomal_metric, intersect = split_and_preprocess(
+            metric, inject_time, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+        )
+        normal_metric = pd.DataFrame(normal_metric, columns=intersect)
+        anomal_metric = pd.DataFrame(anomal_metric, columns=intersect)
         metric = pd.concat([normal_metric, anomal_metric], axis=0, ignore_index=True)
         data = metric
         print(f"{normal_metric.shape=}")
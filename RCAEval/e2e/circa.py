@@ -29,7 +29,12 @@ def circa(data, inject_time=None, dataset=None, **kwargs):
     pc_input = data.drop(columns=["time"])
     node_names = pc_input.columns.to_list()
 
-    adj = pc_default(pc_input, dataset="ob")
+    adj = pc_default(
+        pc_input,
+        dataset="ob",
+        n_jobs=kwargs.get("n_jobs", 1),
+        parallel_backend=kwargs.get("parallel_backend", "thread"),
+    )
     ranks = rht(adj, inject_time, data)
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
     ranks = [x[0] for x in ranks]
@@ -6,12 +6,14 @@ import networkx as nx
 import numpy as np
 import pandas as pd
 import pingouin as pg
-from causallearn.search.ConstraintBased.PC import pc
+from scipy import sparse
 
 from RCAEval.classes.graph import Graph, MemoryGraph, Node
-from RCAEval.graph_construction.pc import pc_default
+from RCAEval.graph_construction.citest import FisherZ
+from RCAEval.graph_construction.pc import pc, pc_default
 from RCAEval.graph_construction.pcmci import pcmci
 from RCAEval.graph_heads import finalize_directed_adj
+from RCAEval.graph_heads.random_walk import SecondOrderWalk, padded_rows
 from RCAEval.io.time_series import drop_constant, drop_extra, drop_near_constant, drop_time, preprocess
 
 
@@ -67,88 +69,92 @@ def calc_pearson(matrix, method="default", zero_diag=True):
 
 
 # relatoRank
-def secondorder_randomwalk(M, epochs, start_node, label=[], walk_step=1000, print_trace=False):
-    n = M.shape[0]
-    score = np.zeros([n])
-    for epoch in range(epochs):
-        previous = start_node - 1
-        current = start_node - 1
-        if print_trace:
-            print("\n{:2d}".format(current + 1), end="->")
-        for step in range(walk_step):
-            if np.sum(M[previous, current]) == 0:
-                break
-            next_node = np.random.choice(range(n), p=M[previous, current])
-            if print_trace:
-                print("{:2d}".format(current + 1), end="->")
-            score[next_node] += 1
-            previous = current
-            current = next_node
-    score_list = list(zip(label, score))
+def secondorder_randomwalk(walk, epochs, start_node, label=[], walk_step=1000, print_trace=False, rng=None):
+    """
+    Rank nodes by their visits in epochs walks of walk_step steps from start_node (1-based)
+
+    The epochs walk in lock-step, each stops when it reaches a state without transitions.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    start = np.full(epochs, (start_node - 1) % walk.num_nodes)
+    score, path = walk.walk(start, start, walk_step, rng, trace=print_trace)
+    if print_trace:
+        for epoch in range(epochs):
+            steps = path[:, epoch]
+            print("->".join("{:2d}".format(node + 1) for node in [start[0], *steps[steps >= 0]]))
+    score_list = list(zip(label, score.astype(float)))
     score_list.sort(key=lambda x: x[1], reverse=True)
     return score_list
 
 
-def guiyi(p):
-    """Normalize matrix column-wise."""
-    nextp = [[0 for i in range(len(p[0]))] for j in range(len(p))]
-    for i in range(len(p)):
-        for j in range(len(p[0])):
-            lineSum = (np.sum(p, axis=1))[i]
-            if lineSum == 0:
-                break
-            nextp[i][j] = p[i][j] / lineSum
-    return nextp
-
-
-def relaToRank(rela, access, rankPaces, frontend, beta=0.1, rho=0.3, print_trace=False):
+def relaToRank(rela, access, rankPaces, frontend, beta=0.1, rho=0.3, print_trace=False, seed=None):
+    """
+    CloudRanger second-order walk on the access graph, scored by the correlations with frontend
+
+    The walk from previous node k to node i moves to the children j of i with
+    the weights (1 - beta) * P[k][i] + beta * P[i][j] and to the parents j of
+    i with rho * ((1 - beta) * P[k][i] + beta * P[j][i]), each group
+    normalized, and stays on i with max(0, S[i] - the largest of the others).
+    Transitions only depend on k through P[k][i], so they are stored for the
+    edges k -> i and once for every other k, instead of as an n x n x n tensor.
+    """
+    access = np.asarray(access)
     n = len(access)
-    S = rela[frontend - 1]
-    P = [[0 for col in range(n)] for row in range(n)]
-    for i in range(n):
-        for j in range(n):
-            if access[i][j] != 0:
-                P[i][j] = abs(S[j])
-    P = guiyi(P)
-    M = np.zeros([n, n, n])
-    # Forward probability
-    for i in range(n):
-        for j in range(n):
-            if access[i][j] > 0:
-                for k in range(n):
-                    M[k, i, j] = (1 - beta) * P[k][i] + beta * P[i][j]
-    # Normalize w.r.t. out nodes
-    for k in range(n):
-        for i in range(n):
-            if np.sum(M[k, i]) > 0:
-                M[k, i] = M[k, i] / np.sum(M[k, i])
-    # Add backward edges
-    for k in range(n):
-        for i in range(n):
-            in_inds = []
-            for j in range(n):
-                if access[i][j] == 0 and access[j][i] != 0:
-                    M[k, i, j] = rho * ((1 - beta) * P[k][i] + beta * P[j][i])
-                    in_inds.append(j)
-            # Normalize wrt in nodes
-            if np.sum(M[k, i, in_inds]) > 0:
-                M[k, i, in_inds] /= np.sum(M[k, i, in_inds])
+    S = np.asarray(rela[frontend - 1], dtype=float)
+
+    # first-order P, |S[j]| on the edges i -> j normalized by row
+    rows, cols = np.nonzero(access)
+    values = np.abs(S[cols])
+    line_sum = np.bincount(rows, weights=values, minlength=n)
+    values = np.divide(values, line_sum[rows], out=np.zeros_like(values), where=line_sum[rows] != 0)
+    P = sparse.csr_matrix((values, (rows, cols)), shape=(n, n))
+
+    def edge_p(i, j):
+        # P[i][j] of edges i -> j, np.nonzero lists them sorted
+        return values[np.searchsorted(rows * n + cols, i * n + j)]
+
+    # candidates of each node: children (forward), parents only (backward) and itself
+    FORWARD, BACKWARD, SELF = 1, 2, 3
+    forward = np.nonzero(access > 0)
+    backward = np.nonzero((access == 0) & (access.T != 0))
+    self_only = np.flatnonzero(np.diag(access) <= 0)
+    nodes = np.concatenate([forward[0], backward[0], self_only])
+    candidates = np.concatenate([forward[1], backward[1], self_only])
+    kinds = np.repeat([FORWARD, BACKWARD, SELF], [len(forward[0]), len(backward[0]), len(self_only)])
+    # P[i][j] for children, P[j][i] for parents
+    base = np.concatenate([edge_p(*forward), edge_p(backward[1], backward[0]), np.zeros(len(self_only))])
+    order = np.lexsort((candidates, nodes))
+    nodes, candidates, kinds, base = nodes[order], candidates[order], kinds[order], base[order]
+    candidates = padded_rows(nodes, candidates, n, fill=-1)
+    kinds = padded_rows(nodes, kinds, n)
+    base = padded_rows(nodes, base, n)
+
+    # one row per edge k -> i with P[k][i], and one per i for the other k
+    row_nodes = np.concatenate([np.arange(n), cols])
+    row_pre = np.concatenate([np.zeros(n), values])[:, None]
+    candidates, kinds, base = candidates[row_nodes], kinds[row_nodes], base[row_nodes]
+
+    # Forward probability, normalized w.r.t. out nodes
+    M = np.where(kinds == FORWARD, (1 - beta) * row_pre + beta * base, 0)
+    total = M.sum(axis=1, keepdims=True)
+    M = np.divide(M, total, out=M, where=total > 0)
+    # Add backward edges, normalized w.r.t. in nodes
+    M_in = np.where(kinds == BACKWARD, rho * ((1 - beta) * row_pre + beta * base), 0)
+    total = M_in.sum(axis=1, keepdims=True)
+    M += np.divide(M_in, total, out=M_in, where=total > 0)
     # Add self edges
-    for k in range(n):
-        for i in range(n):
-            if M[k, i, i] == 0:
-                in_out_node = list(range(n))
-                in_out_node.remove(i)
-                M[k, i, i] = max(0, S[i] - max(M[k, i, in_out_node]))
-    # Normalize all
-    for k in range(n):
-        for i in range(n):
-            if np.sum(M[k, i]) > 0:
-                M[k, i] /= np.sum(M[k, i])
+    is_self = candidates == row_nodes[:, None]
+    others = np.where(is_self, 0, M).max(axis=1, initial=0)
+    self_value = np.maximum(0, S[row_nodes] - others)
+    M = np.where(is_self & (M == 0), self_value[:, None], M)
 
+    walk = SecondOrderWalk(n, candidates, M, rows * n + cols, n + np.arange(len(rows)), np.arange(n))
     label = [i for i in range(1, n + 1)]
-    l = secondorder_randomwalk(M, rankPaces, frontend, label, print_trace=print_trace)
-    return l, P, M
+    l = secondorder_randomwalk(
+        walk, rankPaces, frontend, label, print_trace=print_trace, rng=np.random.default_rng(seed)
+    )
+    return l, P, walk
 
 
 def cloudranger(
@@ -169,14 +175,23 @@ def cloudranger(
     rho = 0.2
 
     # graph construction, pc
-    cg = pc(np_data.astype(float), show_progress=False, alpha=pc_alpha)
+    cg = pc(
+        np_data.astype(float),
+        indep_test=FisherZ(),
+        show_progress=False,
+        alpha=pc_alpha,
+        n_jobs=kwargs.get("n_jobs", 1),
+        parallel_backend=kwargs.get("parallel_backend", "thread"),
+    )
     adj = cg.G.graph
 
     # scoring
     rela = calc_pearson(np_data.T, method="numpy", zero_diag=False)
     dep_graph = finalize_directed_adj(adj).T
 
-    rank, P, M = relaToRank(rela, dep_graph, 10, sli, beta=beta, rho=rho, print_trace=False)
+    rank, P, walk = relaToRank(
+        rela, dep_graph, 10, sli, beta=beta, rho=rho, print_trace=False, seed=kwargs.get("seed")
+    )
 
     ranks = []
     for r in rank:  # (10, 1032.)
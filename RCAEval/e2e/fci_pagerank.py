@@ -9,7 +9,9 @@ def fci_pagerank(data, inject_time=None, dataset=None, dk_select_useful=False, n
     data = preprocess(data=data, dataset=dataset, dk_select_useful=dk_select_useful)
     node_names = data.columns.to_list()
 
-    adj = fci_default(data)
+    adj = fci_default(
+        data, n_jobs=kwargs.get("n_jobs", 1), parallel_backend=kwargs.get("parallel_backend", "thread")
+    )
     ranks = page_rank(adj, node_names=node_names, n_iter=n_iter)
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
     ranks = [x[0] for x in ranks]
@@ -21,7 +21,7 @@ def granger_pagerank(data, inject_time=None, dataset=None, num_loop=None, sli=No
     )
 
     node_names = data.columns.to_list()
-    adj = granger(data)
+    adj = granger(data, n_jobs=kwargs.get("n_jobs", 1))
 
     # check if adj values are all 0
     if adj.sum().sum() == 0:
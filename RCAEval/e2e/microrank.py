@@ -7,14 +7,22 @@ import math
 import time
 import datetime
 import codecs
+from collections import Counter
 import warnings
 warnings.filterwarnings("ignore")
-from copy import deepcopy
 
-from tqdm import tqdm
 import numpy as np
 from dateutil.parser import parse
 import pandas as pd
+from scipy import sparse
+
+from RCAEval.io.traces import (
+    abnormal_spans,
+    add_operation,
+    add_slo,
+    operation_slo,
+    split_spans,
+)
 
 
 def pageRank(p_ss, p_sr, p_rs, v, operation_length, trace_length, d=0.85, alpha=0.01):
@@ -26,10 +34,10 @@ def pageRank(p_ss, p_sr, p_rs, v, operation_length, trace_length, d=0.85, alpha=
 
     for i in range(iteration):
         updated_service_ranking_vector = d * \
-            (np.dot(p_sr, request_ranking_vector) +
-             alpha * np.dot(p_ss, service_ranking_vector))
+            (p_sr @ request_ranking_vector +
+             alpha * (p_ss @ service_ranking_vector))
         updated_request_ranking_vector = d * \
-            np.dot(p_rs, service_ranking_vector) + (1.0 - d) * v
+            (p_rs @ service_ranking_vector) + (1.0 - d) * v
         service_ranking_vector = updated_service_ranking_vector / \
             np.amax(updated_service_ranking_vector)
         request_ranking_vector = updated_request_ranking_vector / \
@@ -41,6 +49,23 @@ def pageRank(p_ss, p_sr, p_rs, v, operation_length, trace_length, d=0.85, alpha=
 
 
 
+def transition_matrix(relation, row_index, column_index):
+    """ Sparse matrix with 1 / len(relation[key]) at [row_index[value], column_index[key]]
+    for each value of relation[key]
+    """
+    rows, columns, data = [], [], []
+    for key, values in relation.items():
+        if not values:
+            continue
+        rows.extend(row_index[value] for value in values)
+        columns.extend([column_index[key]] * len(values))
+        data.extend([1.0 / len(values)] * len(values))
+    return sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), (rows, columns)),
+        shape=(len(row_index), len(column_index)),
+    )
+
+
 def trace_pagerank(operation_operation, operation_trace, trace_operation, pr_trace, anomaly):
     """ Calculate pagerank weight of anormaly_list or normal_list
     :arg 
@@ -52,73 +77,41 @@ def trace_pagerank(operation_operation, operation_trace, trace_operation, pr_tra
     operation_length = len(operation_operation)
     trace_length = len(operation_trace)
 
-    p_ss = np.zeros((operation_length, operation_length), dtype=np.float32)
-    p_sr = np.zeros((operation_length, trace_length), dtype=np.float32)
-    p_rs = np.zeros((trace_length, operation_length), dtype=np.float32)
-
     # matrix = np.zeros((n, n), dtype=np.float32)
     pr = np.zeros((trace_length, 1), dtype=np.float32)
 
-    node_list = []
-    for key in operation_operation.keys():
-        node_list.append(key)
-
-    trace_list = []
-    for key in operation_trace.keys():
-        trace_list.append(key)
-
-    # matrix node*node
-    for operation in operation_operation:
-        child_num = len(operation_operation[operation])
-
-        for child in operation_operation[operation]:
-            p_ss[node_list.index(child)][node_list.index(
-                operation)] = 1.0 / child_num
-
-    # matrix node*request
-    for trace_id in operation_trace:
-        child_num = len(operation_trace[trace_id])
-        for child in operation_trace[trace_id]:
-            p_sr[node_list.index(child)][trace_list.index(trace_id)] \
-                = 1.0 / child_num
-
-    # matrix request*node
-    for operation in trace_operation:
-        child_num = len(trace_operation[operation])
-
-        for child in trace_operation[operation]:
-            p_rs[trace_list.index(child)][node_list.index(operation)] \
-                = 1.0 / child_num
-
-    kind_list = np.zeros(len(trace_list))
-    p_srt = p_sr.T
-    for i in range(len(trace_list)):
-        index_list = [i]
-        if kind_list[i] != 0:
-            continue
-        n = 0
-        for j in range(i, len(trace_list)):
-            if (p_srt[i] == p_srt[j]).all():
-                index_list.append(j)
-                n += 1
-        for index in index_list:
-            kind_list[index] = n
-
-    num_sum_trace = 0
-    kind_sum_trace = 0
+    node_list = list(operation_operation.keys())
+    trace_list = list(operation_trace.keys())
+    node_index = {operation: i for i, operation in enumerate(node_list)}
+    trace_index = {trace_id: i for i, trace_id in enumerate(trace_list)}
+
+    # sparse matrices node*node, node*request and request*node
+    p_ss = transition_matrix(operation_operation, node_index, node_index)
+    p_sr = transition_matrix(operation_trace, node_index, trace_index)
+    p_rs = transition_matrix(trace_operation, trace_index, node_index)
+
+    # kind of a trace: the number of traces with the same coverage row
+    p_srt = p_sr.T.tocsr()
+    p_srt.sort_indices()
+    row_keys = [
+        p_srt.indices[start:end].tobytes() + p_srt.data[start:end].tobytes()
+        for start, end in zip(p_srt.indptr[:-1], p_srt.indptr[1:])
+    ]
+    kind_count = Counter(row_keys)
+    kind_list = np.array([kind_count[key] for key in row_keys], dtype=float)
+
+    # sequential sums, as the former loops
+    pr_index = np.array([trace_index[trace_id] for trace_id in pr_trace], dtype=np.int64)
+    inverse_kind = 1.0 / kind_list[pr_index]
     if not anomaly:
-        for trace_id in pr_trace:
-            num_sum_trace += 1.0 / kind_list[trace_list.index(trace_id)]
-        for trace_id in pr_trace:
-            pr[trace_list.index(trace_id)] = 1.0 / \
-                kind_list[trace_list.index(trace_id)] / num_sum_trace
+        num_sum_trace = sum(inverse_kind.tolist())
+        pr[pr_index, 0] = inverse_kind / num_sum_trace
     else:
-        for trace_id in pr_trace:
-            kind_sum_trace += 1.0 / kind_list[trace_list.index(trace_id)]
-            num_sum_trace += 1.0 / len(pr_trace[trace_id])
-        for trace_id in pr_trace:
-            pr[trace_list.index(trace_id)] = 1.0 / (kind_list[trace_list.index(trace_id)] / kind_sum_trace * 0.5
-                                                    + 1.0 / len(pr_trace[trace_id])) / num_sum_trace * 0.5
+        trace_spans = np.array([len(ops) for ops in pr_trace.values()], dtype=float)
+        kind_sum_trace = sum(inverse_kind.tolist())
+        num_sum_trace = sum((1.0 / trace_spans).tolist())
+        pr[pr_index, 0] = 1.0 / (kind_list[pr_index] / kind_sum_trace * 0.5
+                                 + 1.0 / trace_spans) / num_sum_trace * 0.5
 
     if anomaly:
         print("\nAnomaly_PageRank:")
@@ -127,21 +120,19 @@ def trace_pagerank(operation_operation, operation_trace, trace_operation, pr_tra
     result = pageRank(p_ss, p_sr, p_rs, pr, operation_length, trace_length)
 
     weight = {}
-    sum = 0
+    result_sum = 0
     for operation in operation_operation:
-        sum += result[node_list.index(operation)][0]
+        result_sum += result[node_index[operation]][0]
 
+    # number of traces of each operation
+    trace_num = p_sr.getnnz(axis=1)
     trace_num_list = {}
     for operation in operation_operation:
-        trace_num_list[operation] = 0
-        i = node_list.index(operation)
-        for j in range(len(trace_list)):
-            if p_sr[i][j] != 0:
-                trace_num_list[operation] += 1
+        trace_num_list[operation] = int(trace_num[node_index[operation]])
 
     for operation in operation_operation:
-        weight[operation] = result[node_list.index(
-            operation)][0] * sum / len(operation_operation)
+        weight[operation] = result[node_index[
+            operation]][0] * result_sum / len(operation_operation)
 
     # for score in sorted(weight.items(), key=lambda x: x[1], reverse=True):
     #     print("%-50s: %.5f" % (score[0], score[1]))
@@ -545,29 +536,39 @@ def online_anomaly_detect_RCA(slo, operation_list):
         time.sleep(60)
 
 
-def get_operation_slo(span_df):
-    """ Calculate the mean of duration and variance of each operation
-    :arg
-        span_df: span data with operations and duration columns
-    :return
-        operation dict of the mean of and variance 
-        {
-            # operation: {mean, variance}
-            "Currencyservice_Convert": [600, 3]}
-        }   
+def build_span_graph(df):
     """
-    operation_slo = {}
-    for op in span_df["operation"].dropna().unique():
-        #get mean and std of Duration column of the corresponding operation
-        mean = round(span_df[span_df["operation"] == op]["duration"].mean() / 1_000, 2)
-        std = round(span_df[span_df["operation"] == op]["duration"].std() / 1_000, 2)
-
-        # operation_slo[op] = [mean, std]
-        operation_slo[op] = { "mean": mean, "std": std }
+    The span graph of MicroRank as integer arrays
 
-    # print(json.dumps(operation_slo, sort_keys=True, indent=2))
-    return operation_slo
+    Operations and traces are numbered in their order of first appearance in df.
+    :return
+        operations: (operations,) operation names
+        traces: (traces,) trace ids
+        calls: (parents, children) arrays of the operation call edges, without duplicates
+        coverage: (traces, operations) CSR matrix of the number of spans of each
+            operation in each trace
+    """
+    op_codes, operations = pd.factorize(df["operation"], use_na_sentinel=False)
+    trace_codes, traces = pd.factorize(df["traceID"], use_na_sentinel=False)
+    coverage = sparse.csr_matrix(
+        (np.ones(len(df), dtype=np.int64), (trace_codes, op_codes)),
+        shape=(len(traces), len(operations)),
+    )
 
+    span_ids = df["spanID"].to_numpy()
+    # the operation of a span id is the one of its last span
+    last_span = ~df["spanID"].duplicated(keep="last").to_numpy()
+    span_op = pd.Series(op_codes[last_span], index=span_ids[last_span])
+    children = pd.DataFrame(
+        {"spanID": df["parentSpanID"].to_numpy(), "child": span_op[span_ids].to_numpy()}
+    ).dropna(subset=["spanID"])
+    # as the former loop, which reset the children of an operation at each of
+    # its spans, an operation calls the children of its last span
+    last_op = ~pd.Series(op_codes).duplicated(keep="last").to_numpy()
+    parents = pd.DataFrame({"parent": op_codes[last_op], "spanID": span_ids[last_op]})
+    calls = parents.merge(children, on="spanID")[["parent", "child"]].drop_duplicates()
+    calls = (calls["parent"].to_numpy(dtype=np.int64), calls["child"].to_numpy(dtype=np.int64))
+    return np.asarray(operations), np.asarray(traces), calls, coverage
 
 
 def get_pagerank_graph(df):
@@ -587,84 +588,52 @@ def get_pagerank_graph(df):
         pr_trace: 存储trace id 经过了哪些operation，不去重
         pr_trace[traceid] = [operation_name1 , operation_name2]
     """
-    operation_operation = {}
-    operation_trace = {}
-    trace_operation = {}
-    pr_trace = {}
-    
-    # loop df
-    parent_operation = {}
-    op_dict = {}  # spanid -> ops
-    par_dict = {}  # spanid -> parent_spanid
-    child_dict = {}  # spanid -> child_spanids
-    for idx, row in tqdm(df.iterrows()):
-        traceid = row["traceID"]
-        spanid = row["spanID"]
-        op = row["operation"]
-        parent_span_id = row["parentSpanID"]
-
-        op_dict[spanid] = op
-        par_dict[spanid] = parent_span_id
-        if parent_span_id not in child_dict:
-            child_dict[parent_span_id] = []
-        child_dict[parent_span_id].append(spanid)
-
-        # operation_trace[traceid] = []
-        if traceid not in operation_trace:
-            operation_trace[traceid] = []
-        operation_trace[traceid].append(op)
-
-        if op not in trace_operation:
-            trace_operation[op] = []
-        trace_operation[op].append(traceid)
-
-    for idx, row in tqdm(df.iterrows()):
-        spanid = row["spanID"]
-        op = row["operation"]
-        parent_span_id = row["parentSpanID"]
-
-        if op not in operation_trace:
-            operation_operation[op] = []
-
-        
-        # append child operation 
-        if spanid in child_dict and len(child_dict[spanid]) > 0:
-            operation_operation[op].extend([op_dict[child_spanid] for child_spanid in child_dict[spanid]])
-
-    pr_trace = deepcopy(operation_trace)
-    
-    for k, v in operation_operation.items():
-        operation_operation[k] = list(set(v))
-    for k, v in operation_trace.items():
-        operation_trace[k] = list(set(v))
-    for k, v in trace_operation.items():
-        trace_operation[k] = list(set(v))
-    
+    operations, traces, (parents, children), coverage = build_span_graph(df)
+    operation_list = operations.tolist()
+    trace_list = traces.tolist()
+
+    def grouped(keys, values, num_keys):
+        # the values of each key, in the order of values
+        order = np.argsort(keys, kind="stable")
+        bounds = np.cumsum(np.bincount(keys, minlength=num_keys))[:-1]
+        return np.split(np.asarray(values)[order], bounds)
+
+    operation_operation = {
+        operation: operations[group].tolist()
+        for operation, group in zip(operation_list, grouped(parents, children, len(operations)))
+    }
+    operation_trace = {
+        trace_id: operations[coverage.indices[start:end]].tolist()
+        for trace_id, start, end in zip(trace_list, coverage.indptr[:-1], coverage.indptr[1:])
+    }
+    by_operation = coverage.tocsc()
+    trace_operation = {
+        operation: traces[by_operation.indices[start:end]].tolist()
+        for operation, start, end in zip(
+            operation_list, by_operation.indptr[:-1], by_operation.indptr[1:]
+        )
+    }
+    trace_codes = pd.factorize(df["traceID"], use_na_sentinel=False)[0]
+    pr_trace = dict(
+        zip(trace_list, (ops.tolist() for ops in grouped(trace_codes, df["operation"], len(traces))))
+    )
     return operation_operation, operation_trace, trace_operation, pr_trace
 
 
 def microrank(data, inject_time=None, dataset=None, **kwargs):
     # span_df = pd.read_csv("./data/mm-ob/checkoutservice_delay/1/traces.csv")
-    span_df = data
-    span_df["methodName"] = span_df["methodName"].fillna(span_df["operationName"])
-    span_df["operation"] = span_df["serviceName"] + "_" + span_df["methodName"]
+    span_df = add_operation(data)
 
     # inject_time = int(inject_time) * 1_000_000  # convert from seconds to microseconds
 
-    normal_df  = span_df[span_df["startTime"] + span_df["duration"] < inject_time]
-    normal_slo = get_operation_slo(normal_df)
+    normal_df, anomal_df = split_spans(span_df, inject_time)
+    normal_slo = operation_slo(normal_df)
     normal_traceid = normal_df["traceID"].unique()
 
-    anomal_df  = span_df[span_df["startTime"] + span_df["duration"] >= inject_time]
-    
-    normal_df["mean"] = normal_df["operation"].apply(lambda op: normal_slo[op]["mean"])
-    normal_df["std"] = normal_df["operation"].apply(lambda op: normal_slo[op]["std"])
-
-    anomal_df["mean"] = anomal_df["operation"].apply(lambda op: normal_slo[op]["mean"])
-    anomal_df["std"] = anomal_df["operation"].apply(lambda op: normal_slo[op]["std"])
+    anomal_df = add_slo(anomal_df, normal_slo)
 
     normal_traces_df = anomal_df[anomal_df["duration"] / 1_000 < anomal_df["mean"] + 3 * anomal_df["std"]]
-    anomal_traces_df = anomal_df[anomal_df["duration"] / 1_000 >= anomal_df["mean"] + 3 * anomal_df["std"]]
+    anomal_traces_df = anomal_df[abnormal_spans(anomal_df)]
 
     normal_traceid = normal_traces_df["traceID"].unique()
     anomal_traceid = anomal_traces_df["traceID"].unique()
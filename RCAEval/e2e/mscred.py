@@ -27,8 +27,8 @@ from RCAEval.io.time_series import (
     drop_extra,
     drop_near_constant,
     drop_time,
-    preprocess,
     select_useful_cols,
+    split_and_preprocess,
 )
 
 
@@ -387,30 +387,19 @@ def test(dataLoader, model):
 
 
 def mscred(data, inject_time=None, dataset=None, num_loop=None, sli=None, anomalies=None, **kwargs):
-    if anomalies is None:
-        normal_df = data[data["time"] < inject_time]
-        anomal_df = data[data["time"] >= inject_time]
-    else:
-        normal_df = data.head(anomalies[0])
-        # anomal_df is the rest
-        anomal_df = data.tail(len(data) - anomalies[0])
-
-    normal_df = preprocess(
-        data=normal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
-    )
-
-    anomal_df = preprocess(
-        data=anomal_df, dataset=dataset, dk_select_useful=kwargs.get("dk_select_useful", False)
+    normal, anomal, columns = split_and_preprocess(
+        data,
+        inject_time,
+        dataset=dataset,
+        dk_select_useful=kwargs.get("dk_select_useful", False),
+        anomalies=anomalies,
     )
+    normal_df = pd.DataFrame(normal, columns=columns)
+    anomal_df = pd.DataFrame(anomal, columns=columns)
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model = MSCRED(3, 256)
 
-    # intersect
-    intersects = [x for x in normal_df.columns if x in anomal_df.columns]
-    normal_df = normal_df[intersects]
-    anomal_df = anomal_df[intersects]
-
     # select only n time series
     # n = 64
     #data = data.iloc[:, :n+1]
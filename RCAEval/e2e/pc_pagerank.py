@@ -1,11 +1,10 @@
-import networkx as nx
 import numpy as np
-from causallearn.search.ConstraintBased.PC import pc
 from causallearn.utils.cit import chisq, fisherz, gsq, kci, mv_fisherz
-from sknetwork.ranking import PageRank
+from scipy import sparse
 
-from RCAEval.graph_construction.pc import pc_default
-from RCAEval.graph_heads.page_rank import page_rank
+from RCAEval.graph_construction.citest import FisherZ
+from RCAEval.graph_construction.pc import pc, pc_default
+from RCAEval.graph_heads.page_rank import page_rank, sparse_page_rank
 from RCAEval.io.time_series import preprocess
 from RCAEval.e2e import rca
 
@@ -16,20 +15,20 @@ def pc_pagerank(
     data = preprocess(data=data, dataset=dataset, dk_select_useful=dk_select_useful)
     node_names = data.columns.to_list()
 
-    cg = pc(data.to_numpy())
+    cg = pc(
+        data.to_numpy(),
+        indep_test=FisherZ(),
+        n_jobs=kwargs.get("n_jobs", 1),
+        parallel_backend=kwargs.get("parallel_backend", "thread"),
+    )
     adj = cg.G.graph
-    G = nx.DiGraph()
-    for i in range(len(adj)):
-        for j in range(len(adj)):
-            if adj[i, j] == -1:
-                G.add_edge(i, j)
-            if adj[i, j] == 1:
-                G.add_edge(j, i)
-    nodes = sorted(G.nodes())
-    adj = np.asarray(nx.to_numpy_matrix(G, nodelist=nodes))
+    # i --> j for adj[i, j] == -1 or adj[j, i] == 1
+    causes, effects = np.nonzero((adj == -1) | (adj.T == 1))
+    adj = sparse.csr_matrix(
+        (np.ones(len(causes)), (causes, effects)), shape=(len(node_names), len(node_names))
+    )
 
-    pagerank = PageRank()
-    scores = pagerank.fit_transform(adj.T)
+    scores, _ = sparse_page_rank(adj.T)
     ranks = list(zip(node_names, scores))
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
     ranks = [x[0] for x in ranks]
@@ -51,8 +50,7 @@ def cmlp_pagerank(
 
     adj = cmlp(data, max_iter=20000)
 
-    pagerank = PageRank()
-    scores = pagerank.fit_transform(adj.T)
+    scores, _ = sparse_page_rank(adj.T)
     ranks = list(zip(node_names, scores))
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
     ranks = [x[0] for x in ranks]
@@ -73,8 +71,7 @@ def ntlr_pagerank(
     node_names = data.columns.to_list()
 
     adj = notears_low_rank(data)
-    pagerank = PageRank()
-    scores = pagerank.fit_transform(adj.T)
+    scores, _ = sparse_page_rank(adj.T)
     ranks = list(zip(node_names, scores))
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
     ranks = [x[0] for x in ranks]
@@ -18,7 +18,9 @@ def pc_randomwalk(data, inject_time=None, dataset=None, n_iter=None, **kwargs):
     if n_iter is None:
         n_iter = len(node_names)
 
-    adj = pc_default(data)
+    adj = pc_default(
+        data, n_jobs=kwargs.get("n_jobs", 1), parallel_backend=kwargs.get("parallel_backend", "thread")
+    )
     ranks = random_walk(adj, node_names, num_loop=n_iter)
 
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
@@ -109,7 +111,7 @@ def granger_randomwalk(data, inject_time=None, dataset=None, n_iter=None, **kwar
     if n_iter is None:
         n_iter = len(node_names)
 
-    adj = granger(data)
+    adj = granger(data, n_jobs=kwargs.get("n_jobs", 1))
     adj = adj.astype(bool).astype(int)
     ranks = random_walk(adj, node_names, num_loop=n_iter)
     ranks = sorted(ranks, key=lambda x: x[1], reverse=True)
@@ -20,30 +20,13 @@ import numpy as np
 from dateutil.parser import parse
 import pandas as pd
 
-
-
-def get_operation_slo(span_df):
-    """ Calculate the mean of duration and variance of each operation
-    :arg
-        span_df: span data with operations and duration columns
-    :return
-        operation dict of the mean of and variance 
-        {
-            # operation: {mean, variance}
-            "Currencyservice_Convert": [600, 3]}
-        }   
-    """
-    operation_slo = {}
-    for op in span_df["operation"].dropna().unique():
-        #get mean and std of Duration column of the corresponding operation
-        mean = round(span_df[span_df["operation"] == op]["duration"].mean() / 1_000, 2)
-        std = round(span_df[span_df["operation"] == op]["duration"].std() / 1_000, 2)
-
-        # operation_slo[op] = [mean, std]
-        operation_slo[op] = { "mean": mean, "std": std }
-
-    # print(json.dumps(operation_slo, sort_keys=True, indent=2))
-    return operation_slo
+from RCAEval.io.traces import (
+    abnormal_spans,
+    add_operation,
+    add_slo,
+    operation_slo,
+    split_spans,
+)
 
 
 def main():
@@ -54,9 +37,7 @@ def main():
     metric_df = pd.read_csv("./data/mm-ob/checkoutservice_cpu/1/simple_metrics.csv")
     log_df = pd.read_csv("./data/mm-ob/checkoutservice_cpu/1/logs.csv")
     logts_df = pd.read_csv("./data/mm-ob/checkoutservice_cpu/1/logts.csv")
-    span_df = pd.read_csv("./data/mm-ob/checkoutservice_cpu/1/traces.csv")
-    span_df["methodName"] = span_df["methodName"].fillna(span_df["operationName"])
-    span_df["operation"] = span_df["serviceName"] + "_" + span_df["methodName"]
+    span_df = add_operation(pd.read_csv("./data/mm-ob/checkoutservice_cpu/1/traces.csv"))
 
     with open("./data/mm-ob/checkoutservice_cpu/1/inject_time.txt") as f:
         inject_time = int(f.readline())
@@ -96,14 +77,12 @@ def main():
         service_dict[k] += ALPHA * v
 
     # traces
-    normal_span_df  = span_df[span_df["startTime"] + span_df["duration"] < inject_time_log]
-    anomal_span_df  = span_df[span_df["startTime"] + span_df["duration"] >= inject_time_log]
+    normal_span_df, anomal_span_df = split_spans(span_df, inject_time_log)
  
-    normal_slo = get_operation_slo(normal_span_df)
+    normal_slo = operation_slo(normal_span_df)
 
-    anomal_span_df["mean"] = anomal_span_df["operation"].apply(lambda op: normal_slo[op]["mean"])
-    anomal_span_df["std"] = anomal_span_df["operation"].apply(lambda op: normal_slo[op]["std"])
-    anomal_span_df["abnormal"] = anomal_span_df["duration"] / 1_000 >= anomal_span_df["mean"] + 3 * anomal_span_df["std"]
+    anomal_span_df = add_slo(anomal_span_df, normal_slo)
+    anomal_span_df["abnormal"] = abnormal_spans(anomal_span_df)
 
 
     # q = deepcopy(log_q)
@@ -0,0 +1,217 @@
+"""
+Online N-Sigma and BARO for live metric streams
+
+The batch nsigma and baro split a whole case at inject_time. The scorers here
+instead keep per-metric baseline statistics that are updated as samples
+arrive, and score new samples against them, in O(columns) per sample:
+
+    scorer = StreamingBARO(window=300)
+    scorer.update(normal_rows)   # baseline, one row or a micro-batch
+    scorer.score(new_rows)       # z-scores, the max per metric is kept
+    scorer.ranks()               # {"node_names": [...], "ranks": [...]}
+
+Rows are DataFrames (the time column is ignored), dicts or Series for a
+single row, or numpy arrays with the columns given at construction.
+"""
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+class _StreamingScorer(ABC):
+    def __init__(self, window: int = 300, columns: List[str] = None):
+        if window < 1:
+            raise ValueError(f"window must be positive, got {window}")
+        self.window = window
+        self.columns = None if columns is None else list(columns)
+        self.num_samples = 0
+        self._scores = None
+
+    def _to_array(self, rows) -> np.ndarray:
+        if isinstance(rows, (dict, pd.Series)):
+            rows = pd.DataFrame([rows])
+        if isinstance(rows, pd.DataFrame):
+            if self.columns is None:
+                self.columns = [c for c in rows.columns if c not in ("time", "Time")]
+            return rows[self.columns].to_numpy(dtype=np.float64)
+
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if self.columns is None:
+            raise ValueError("columns must be given to stream numpy arrays")
+        if rows.shape[1] != len(self.columns):
+            raise ValueError(f"expected {len(self.columns)} columns, got {rows.shape[1]}")
+        return rows
+
+    @abstractmethod
+    def _center_scale(self):
+        """
+        The center and the scale of the baseline, one value per metric
+        """
+
+    @abstractmethod
+    def _update(self, rows: np.ndarray):
+        """
+        Add a non-empty array of normal samples to the baseline
+        """
+
+    def update(self, rows):
+        """
+        Add normal samples to the baseline
+        """
+        rows = self._to_array(rows)
+        if len(rows) > 0:
+            self._update(rows)
+        return self
+
+    fit = update
+
+    def score(self, rows) -> np.ndarray:
+        """
+        Z-scores of new samples against the baseline, kept as the running max per metric
+        """
+        rows = self._to_array(rows)
+        if self.num_samples == 0:
+            raise ValueError("the baseline is empty, call update() first")
+        center, scale = self._center_scale()
+        zscores = (rows - center) / scale
+        if len(rows) > 0:
+            scores = zscores.max(axis=0)
+            self._scores = scores if self._scores is None else np.fmax(self._scores, scores)
+        return zscores
+
+    def reset(self):
+        """
+        Forget the scores, e.g., once an anomaly is over, but keep the baseline
+        """
+        self._scores = None
+        return self
+
+    def ranks(self) -> dict:
+        """
+        Rank the metrics by their max z-score, as the batch functions do
+        """
+        columns = [] if self.columns is None else self.columns
+        if self._scores is None:
+            return {"node_names": list(columns), "ranks": list(columns)}
+        ranks = sorted(zip(columns, self._scores.tolist()), key=lambda x: x[1], reverse=True)
+        return {"node_names": list(columns), "ranks": [x[0] for x in ranks]}
+
+
+class StreamingNSigma(_StreamingScorer):
+    """
+    N-Sigma over a sliding window of the last `window` normal samples
+
+    The mean and standard deviation are exact, kept with Welford updates as
+    samples enter and leave the window, and recomputed from the window every
+    `window` evictions to stop rounding errors from building up.
+    """
+
+    def __init__(self, window: int = 300, columns: List[str] = None):
+        super().__init__(window=window, columns=columns)
+        self._buffer = None
+        self._mean = None
+        self._m2 = None
+        self._evictions = 0
+
+    def _update(self, rows: np.ndarray):
+        if self._buffer is None:
+            self._buffer = np.zeros((self.window, rows.shape[1]))
+            self._mean = np.zeros(rows.shape[1])
+            self._m2 = np.zeros(rows.shape[1])
+
+        for row in rows:
+            slot = self.num_samples % self.window
+            if self.num_samples >= self.window:
+                old = self._buffer[slot]
+                n = self.window - 1
+                if n == 0:
+                    self._mean[:] = 0
+                    self._m2[:] = 0
+                else:
+                    delta = old - self._mean
+                    self._mean -= delta / n
+                    self._m2 -= delta * (old - self._mean)
+                self._evictions += 1
+            else:
+                n = self.num_samples
+
+            self._buffer[slot] = row
+            delta = row - self._mean
+            self._mean += delta / (n + 1)
+            self._m2 += delta * (row - self._mean)
+            self.num_samples += 1
+
+            if self._evictions >= self.window:
+                self._evictions = 0
+                self._mean = self._buffer.mean(axis=0)
+                self._m2 = ((self._buffer - self._mean) ** 2).sum(axis=0)
+
+    def _center_scale(self):
+        n = min(self.num_samples, self.window)
+        var = np.maximum(self._m2, 0) / n
+        # as StandardScaler does, do not scale near constant metrics
+        scale = np.sqrt(var)
+        scale[var < 10 * np.finfo(var.dtype).eps] = 1.0
+        return self._mean, scale
+
+
+class StreamingBARO(_StreamingScorer):
+    """
+    BARO with streaming estimates of the median and the IQR
+
+    The first `window` normal samples are kept in a preallocated buffer and
+    their quantiles computed exactly, as RobustScaler does, once per change of
+    the buffer. After that, the 25th, 50th and 75th percentiles are tracked by
+    stochastic approximation: each sample moves every estimate by
+    learning_rate * IQR towards it, which follows a drifting baseline in
+    O(columns) per sample without storing it.
+    """
+
+    QUANTILES = np.array([0.25, 0.5, 0.75])
+
+    def __init__(self, window: int = 300, learning_rate: float = 0.01, columns: List[str] = None):
+        super().__init__(window=window, columns=columns)
+        self.learning_rate = learning_rate
+        self._warmup = None
+        self._quantiles = None
+        # the exact quantiles of the warm-up samples, None once they are stale
+        self._warmup_quantiles = None
+
+    def _update(self, rows: np.ndarray):
+        if self._quantiles is None:
+            if self._warmup is None:
+                self._warmup = np.empty((self.window, rows.shape[1]))
+            take = rows[: self.window - self.num_samples]
+            self._warmup[self.num_samples : self.num_samples + len(take)] = take
+            self.num_samples += len(take)
+            self._warmup_quantiles = None
+            rows = rows[len(take) :]
+            if self.num_samples == self.window:
+                self._quantiles = self._exact_quantiles()
+                self._warmup = self._warmup_quantiles = None
+
+        for row in rows:
+            _, scale = self._center_scale()
+            below = (row <= self._quantiles).astype(np.float64)
+            self._quantiles += self.learning_rate * scale * (self.QUANTILES[:, None] - below)
+            # keep the estimates ordered
+            self._quantiles.sort(axis=0)
+            self.num_samples += 1
+
+    def _exact_quantiles(self) -> np.ndarray:
+        if self._warmup_quantiles is None:
+            warmup = self._warmup[: self.num_samples]
+            q_min, q_max = np.percentile(warmup, [25.0, 75.0], axis=0)
+            self._warmup_quantiles = np.stack([q_min, np.median(warmup, axis=0), q_max])
+        return self._warmup_quantiles
+
+    def _center_scale(self):
+        quantiles = self._exact_quantiles() if self._quantiles is None else self._quantiles
+        scale = quantiles[2] - quantiles[0]
+        # as RobustScaler does, do not scale near constant metrics
+        scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0
+        return quantiles[1], scale
@@ -10,76 +10,168 @@ import codecs
 import warnings
 warnings.filterwarnings("ignore")
 from copy import deepcopy
+from itertools import combinations
 
 from tqdm import tqdm
 import numpy as np
 from dateutil.parser import parse
 import pandas as pd
+from scipy import sparse
 
+from RCAEval.io.traces import (
+    abnormal_spans,
+    add_operation,
+    add_slo,
+    operation_slo,
+    split_spans,
+)
 
-def get_operation_slo(span_df):
-    """ Calculate the mean of duration and variance of each operation
+
+# number of set bits of each byte
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+
+def operation_scores(anomal_df):
+    """ Support, confidence and ji of each operation over the spans of the anomalous window
     :arg
-        span_df: span data with operations and duration columns
+        anomal_df: spans with operation and abnormal columns
     :return
-        operation dict of the mean of and variance 
-        {
-            # operation: {mean, variance}
-            "Currencyservice_Convert": [600, 3]}
-        }   
+        frame indexed by operation, in order of first appearance
+        support = |abnormal spans of operation A| / |total abnormal spans|
+        confidence = |abnormal spans of operation A| / |total spans of operation A|
+        ji = 2 * s * c / (s + c)
     """
-    operation_slo = {}
-    for op in span_df["operation"].dropna().unique():
-        #get mean and std of Duration column of the corresponding operation
-        mean = round(span_df[span_df["operation"] == op]["duration"].mean() / 1_000, 2)
-        std = round(span_df[span_df["operation"] == op]["duration"].std() / 1_000, 2)
+    counts = anomal_df.groupby("operation", sort=False)["abnormal"].agg(["sum", "count"])
+    support = counts["sum"] / anomal_df["abnormal"].sum()
+    confidence = counts["sum"] / counts["count"]
+    ji = 2 * support * confidence / (support + confidence)
+    return pd.DataFrame({"support": support, "confidence": confidence, "ji": ji})
 
-        # operation_slo[op] = [mean, std]
-        operation_slo[op] = { "mean": mean, "std": std }
 
-    # print(json.dumps(operation_slo, sort_keys=True, indent=2))
-    return operation_slo
+def trace_operation_matrix(anomal_df):
+    """ The operations of each trace of the anomalous window
+    :return
+        operations: (operations,) names
+        matrix: (traces, operations) CSR matrix, 1 if the trace has a span of the operation
+        abnormal: (traces,) whether the trace has an abnormal span
+    """
+    op_codes, operations = pd.factorize(anomal_df["operation"])
+    trace_codes, traces = pd.factorize(anomal_df["traceID"])
+    keep = (op_codes >= 0) & (trace_codes >= 0)
+    matrix = sparse.csr_matrix(
+        (np.ones(keep.sum()), (trace_codes[keep], op_codes[keep])),
+        shape=(len(traces), len(operations)),
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    abnormal = np.bincount(
+        trace_codes[keep], weights=anomal_df["abnormal"].to_numpy()[keep], minlength=len(traces)
+    ) > 0
+    return np.asarray(operations), matrix, abnormal
+
+
+def mine_itemsets(matrix, abnormal, max_size, min_support=0.1):
+    """ Frequent operation sets of the abnormal traces, by Apriori on trace bitsets
+    :arg
+        matrix: (traces, operations) trace_operation_matrix
+        abnormal: (traces,) mask of the abnormal traces
+        max_size: largest itemset
+        min_support: smallest share of the abnormal traces an itemset must cover
+    :return
+        [(operation indices, support, confidence, ji)] of the frequent itemsets, where
+        support = |abnormal traces with the itemset| / |abnormal traces|
+        confidence = |abnormal traces with the itemset| / |traces with the itemset|
+    """
+    num_traces, num_operations = matrix.shape
+    num_abnormal = int(abnormal.sum())
+    if num_abnormal == 0:
+        return []
+    abnormal_bits = np.packbits(abnormal)
+
+    # one bitset of traces per operation
+    by_operation = matrix.tocsc()
+    level = {}
+    for j in range(num_operations):
+        has = np.zeros(num_traces, dtype=bool)
+        has[by_operation.indices[by_operation.indptr[j] : by_operation.indptr[j + 1]]] = True
+        level[(j,)] = np.packbits(has)
+
+    itemsets = []
+    for size in range(1, max_size + 1):
+        frequent = {}
+        for items, bits in level.items():
+            hits = _POPCOUNT[bits & abnormal_bits].sum()
+            support = hits / num_abnormal
+            if hits == 0 or support < min_support:
+                continue
+            confidence = hits / _POPCOUNT[bits].sum()
+            itemsets.append(
+                (items, support, confidence, 2 * support * confidence / (support + confidence))
+            )
+            frequent[items] = bits
+        if size == max_size:
+            break
+
+        # join the frequent itemsets sharing all but their last item, and
+        # keep the candidates whose subsets are all frequent
+        level = {}
+        keys = sorted(frequent)
+        for i, first in enumerate(keys):
+            for second in keys[i + 1 :]:
+                if first[:-1] != second[:-1]:
+                    break
+                items = first + second[-1:]
+                if all(subset in frequent for subset in combinations(items, size)):
+                    level[items] = frequent[first] & frequent[second]
+    return itemsets
+
+
+def itemset_ranks(anomal_df, max_size, min_support=0.1):
+    """ Rank the operations by the best ji of the frequent itemsets they appear in
+    The operations of no frequent itemset follow, by their own ji of operation_scores,
+    so that every operation of the anomalous window is ranked. As in the default
+    ranking, operations without a ji, i.e., without abnormal spans, are left out.
+    """
+    operations, matrix, abnormal = trace_operation_matrix(anomal_df)
+    itemsets = mine_itemsets(matrix, abnormal, max_size, min_support)
+    itemsets.sort(key=lambda x: x[3], reverse=True)
 
+    ji = operation_scores(anomal_df)["ji"].dropna()
+    ranks = list(dict.fromkeys(operations[j] for items, *_ in itemsets for j in items))
+    ranks = [op for op in ranks if op in ji.index]
+    rest = ji[~ji.index.isin(ranks)]
+    # stable, so ties keep their order of first appearance
+    rest = rest.sort_values(ascending=False, kind="stable")
+    return ranks + rest.index.to_list()
 
 
 def tracerca(data, inject_time=None, dataset=None, **kwargs):
     # span_df = pd.read_csv("./data/mm-ob/checkoutservice_delay/1/traces.csv")
-    span_df = data
-    span_df["methodName"] = span_df["methodName"].fillna(span_df["operationName"])
-    span_df["operation"] = span_df["serviceName"] + "_" + span_df["methodName"]
+    span_df = add_operation(data)
 
     # inject_time = int(inject_time) * 1_000_000  # convert from seconds to microseconds
 
-    normal_df  = span_df[span_df["startTime"] + span_df["duration"] < inject_time]
-    anomal_df  = span_df[span_df["startTime"] + span_df["duration"] >= inject_time]
+    normal_df, anomal_df = split_spans(span_df, inject_time)
     
     # 1. TRACE ANOMALY DETECTION
-    normal_slo = get_operation_slo(normal_df)
+    normal_slo = operation_slo(normal_df)
 
-    anomal_df["mean"] = anomal_df["operation"].apply(lambda op: normal_slo[op]["mean"])
-    anomal_df["std"] = anomal_df["operation"].apply(lambda op: normal_slo[op]["std"])
-    anomal_df["abnormal"] = anomal_df["duration"] / 1_000 >= anomal_df["mean"] + 3 * anomal_df["std"]
+    anomal_df = add_slo(anomal_df, normal_slo)
+    anomal_df["abnormal"] = abnormal_spans(anomal_df)
 
     # 2. SUSPICIOUS MICROSERVICE SET MINING
-    
-    # calculate support and confidence
+    max_itemset_size = kwargs.get("max_itemset_size", 1)
+    if max_itemset_size > 1:
+        # 3. MICROSERVICE RANKING
+        return {
+            "ranks": itemset_ranks(
+                anomal_df, max_itemset_size, kwargs.get("min_support", 0.1)
+            ),
+        }
+
+    # calculate support and confidence, in order of first appearance
     operations = list(anomal_df.operation.unique())
-    support_dict = {op: 0 for op in operations}
-    confidence_dict = {op: 0 for op in operations}
-
-    # support = |abnormal_traces of operation A| / |total abnormal traces|
-    # abnormal traces of operation A is when "abnormal" col is True
-    for op in operations:
-        support_dict[op] = anomal_df[anomal_df["operation"] == op]["abnormal"].sum() / anomal_df["abnormal"].sum()
-    
-    # confidence = |abnormal traces of operation A| / |total traces of operation A|
-    for op in operations:
-        confidence_dict[op] = anomal_df[anomal_df["operation"] == op]["abnormal"].sum() / anomal_df[anomal_df["operation"] == op]["operation"].count()
-
-    ji_dict = {op: 0 for op in operations} 
-    # ji = 2 *s * c / (s + c)
-    for op in operations:
-        ji_dict[op] = 2 * support_dict[op] * confidence_dict[op] / (support_dict[op] + confidence_dict[op])
+    ji_dict = dict(zip(operations, operation_scores(anomal_df)["ji"].reindex(operations)))
 
     # 3. MICROSERVICE RANKING
     # rank by ji 
@@ -0,0 +1,251 @@
+"""
+Caching, parallel running and a batched Fisher-Z of conditional independence (CI) tests
+
+The module depends on numpy and scipy only, so the same file serves both
+environments: script/link.sh links it into the causal-learn of the rcd
+environment as causallearn.utils.CITestCache, where the vendored fas, fci
+and skeleton_discovery import it.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import combinations
+from math import sqrt
+
+import numpy as np
+from scipy.stats import norm
+
+# number of tests whose correlation submatrices FisherZ inverts at once
+BATCH_SIZE = 1 << 15
+
+
+def data_digest(data):
+    """
+    Content digest of a data matrix, to key the p-values of CI tests on it
+
+    hash(str(data)) only sees the few values numpy prints of a large array, so
+    different datasets could share cached p-values.
+    """
+    data = np.asarray(data)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{data.shape}{data.dtype.str}".encode())
+    if data.dtype.hasobject:
+        h.update(repr(data.tolist()).encode())
+    else:
+        h.update(np.ascontiguousarray(data).data)
+    return h.hexdigest()
+
+
+class CITestCache:
+    """
+    LRU cache of CI test p-values keyed by (X, Y, S, data key, test key)
+
+    It holds at most max_size p-values (CITEST_CACHE_SIZE by default), and
+    counts hits and misses of the `key in cache` lookups.
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = int(os.getenv("CITEST_CACHE_SIZE", 1 << 18))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._scope = None
+
+    def __contains__(self, key):
+        if key in self._entries:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def __getitem__(self, key):
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def __setitem__(self, key, p_value):
+        self._entries[key] = p_value
+        self._entries.move_to_end(key)
+        if self._scope is not None:
+            self._scope.add(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def has(self, key):
+        """
+        Whether key is cached, without counting a hit or a miss
+        """
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        The p-value of key, or default, without counting a hit or a miss or refreshing key
+        """
+        return self._entries.get(key, default)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    @contextmanager
+    def scoped(self):
+        """
+        Drop the p-values cached inside the block when it exits, e.g., per search
+
+        A block nested in another one keeps its p-values until the outer one
+        exits. It also decorates a function, e.g., @citest_cache.scoped().
+        """
+        if self._scope is not None:
+            yield self
+            return
+        self._scope = set()
+        try:
+            yield self
+        finally:
+            for key in self._scope:
+                self._entries.pop(key, None)
+            self._scope = None
+
+
+def _ci_test(task, test, data, cardinalities):
+    X, Y, S = task
+    if cardinalities is None:
+        return test(data, X, Y, S)
+    return test(data, X, Y, S, cardinalities)
+
+
+_worker_args = ()
+
+
+def _init_worker(test, data, cardinalities):
+    global _worker_args
+    _worker_args = (test, data, cardinalities)
+
+
+def _worker_ci_test(task):
+    return _ci_test(task, *_worker_args)
+
+
+def run_ci_tests(tasks, test, data, cardinalities=None, n_jobs=1, backend="thread"):
+    """
+    p-values of the CI tests (X, Y, S) in tasks, in order, on a pool of n_jobs workers
+
+    backend: "thread", or "process" for tests that hold the GIL; processes get
+            the data once when they start
+    """
+    if hasattr(test, "batch"):
+        # e.g. FisherZ, one numpy pass beats a pool
+        return list(test.batch(data, tasks))
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count()
+    if n_jobs == 1 or len(tasks) < 2:
+        return [_ci_test(task, test, data, cardinalities) for task in tasks]
+    if backend == "thread":
+        with ThreadPoolExecutor(n_jobs) as pool:
+            return list(pool.map(lambda task: _ci_test(task, test, data, cardinalities), tasks))
+    if backend == "process":
+        with ProcessPoolExecutor(
+            n_jobs, initializer=_init_worker, initargs=(test, data, cardinalities)
+        ) as pool:
+            chunksize = max(1, len(tasks) // (4 * n_jobs))
+            return list(pool.map(_worker_ci_test, tasks, chunksize=chunksize))
+    raise ValueError(f"unknown parallel backend {backend!r}, use 'thread' or 'process'")
+
+
+
+def depth_tests(cg, depth):
+    """
+    The CI tests (x, y, S) of a depth of the skeleton search of PC on cg, in its order
+
+    In the stable search the neighbors do not change within a depth, so the
+    tests are known when the depth starts.
+    """
+    for x in range(cg.G.graph.shape[0]):
+        Neigh_x = cg.neighbors(x)
+        if len(Neigh_x) < depth - 1:
+            continue
+        for y in Neigh_x:
+            Neigh_x_noy = np.delete(Neigh_x, np.where(Neigh_x == y))
+            for S in combinations(Neigh_x_noy, depth):
+                yield x, y, S
+
+
+def prefetch_ci_tests(tasks, cache, test, data, cardinalities=None, n_jobs=1, backend="thread"):
+    """
+    Run the CI tests {key: (X, Y, S)} that are not in cache at once with run_ci_tests, and cache their p-values
+
+    The search then reads them from the cache in its own order, which keeps
+    its removals and sepsets the same as a serial run, and counts the hits.
+    """
+    missing = [key for key in tasks if not cache.has(key)]
+    p_values = run_ci_tests(
+        [tasks[key] for key in missing], test, data, cardinalities, n_jobs=n_jobs, backend=backend
+    )
+    for key, p_value in zip(missing, p_values):
+        cache[key] = p_value
+
+class FisherZ:
+    """
+    Fisher-Z test answered from the correlation matrix of the data
+
+    Use an instance as the independence test of pc and fci, or of the vendored
+    fas and skeleton_discovery, instead of fisherz. The correlation matrix is
+    computed once per data matrix, and each test only inverts the submatrix of
+    X, Y and the conditioning set. With the batch method, the search runs all
+    the tests of a depth at once with numpy. The data must not change in place
+    between calls.
+    """
+
+    method = "fisherz"
+
+    def __init__(self):
+        self._data = None
+        self._correlation = None
+
+    def correlation(self, data):
+        if data is not self._data:
+            if not np.isfinite(data).all():
+                raise ValueError("Input data contains NaN or Inf. Please check.")
+            self._correlation = np.corrcoef(data.T)
+            self._data = data
+        return self._correlation
+
+    def __call__(self, data, X, Y, condition_set=()):
+        return self.batch(data, [(X, Y, condition_set)])[0]
+
+    def batch(self, data, tasks):
+        """
+        p-values of the tests (X, Y, S) in tasks, in order
+        """
+        correlation = self.correlation(data)
+        p_values = np.empty(len(tasks))
+        by_size = {}
+        for index, (X, Y, S) in enumerate(tasks):
+            by_size.setdefault(len(S), []).append(index)
+
+        for size, indices in by_size.items():
+            for start in range(0, len(indices), BATCH_SIZE):
+                chunk = indices[start : start + BATCH_SIZE]
+                var = np.array([(tasks[i][0], tasks[i][1], *tasks[i][2]) for i in chunk], dtype=np.int64)
+                sub_corr_matrix = correlation[var[:, :, None], var[:, None, :]]
+                try:
+                    inv = np.linalg.inv(sub_corr_matrix)
+                except np.linalg.LinAlgError:
+                    raise ValueError(
+                        "Data correlation matrix is singular. Cannot run fisherz test. Please check your data."
+                    )
+                r = -inv[:, 0, 1] / np.sqrt(inv[:, 0, 0] * inv[:, 1, 1])
+                Z = 0.5 * np.log((1 + r) / (1 - r))
+                X = sqrt(data.shape[0] - size - 3) * np.abs(Z)
+                p_values[chunk] = 2 * (1 - norm.cdf(np.abs(X)))
+        return p_values.tolist()
@@ -1,15 +1,125 @@
+import warnings
+
 import pandas as pd
-from causallearn.search.ConstraintBased.FCI import fci
+from causallearn.graph.Endpoint import Endpoint
+from causallearn.graph.GraphNode import GraphNode
+from causallearn.search.ConstraintBased.FCI import (
+    get_color_edges,
+    removeByPossibleDsep,
+    reorientAllWith,
+    rule0,
+    ruleR3,
+    ruleR4B,
+    rulesR1R2cycle,
+)
+from causallearn.utils.cit import fisherz
+from causallearn.utils.PCUtils.BackgroundKnowledge import BackgroundKnowledge
+
+from RCAEval.graph_construction.citest import FisherZ
+from RCAEval.graph_construction.pc import BoundTest, CausalLearnTest, adjacency_search
+
+
+def fci(
+    dataset,
+    independence_test_method=fisherz,
+    alpha=0.05,
+    depth=-1,
+    max_path_length=-1,
+    verbose=False,
+    background_knowledge=None,
+    n_jobs=1,
+    parallel_backend="thread",
+    **kwargs,
+):
+    """
+    The fci of causal-learn, whose fast adjacency search is the stable search of pc
+
+    independence_test_method: the name of a causal-learn CI test, e.g. fisherz,
+            whose options are the kwargs, or a test(data, X, Y, S)
+    depth: the largest conditioning set of the adjacency search, -1 for no limit.
+            causal-learn 0.1.3.3 checks it but searches without a limit, the vendored fas uses it.
+    n_jobs: number of workers running the CI tests of a depth of the adjacency
+            search, -1 for all cores. The graph is the same as with n_jobs=1.
+    parallel_backend: "thread" or "process", the pool running the CI tests
+    """
+    if dataset.shape[0] < dataset.shape[1]:
+        warnings.warn("The number of features is much larger than the sample size!")
+
+    if isinstance(independence_test_method, str):
+        independence_test_method = CausalLearnTest(independence_test_method, **kwargs)
+    independence_test_method = BoundTest(independence_test_method, dataset, n_jobs, parallel_backend)
+
+    if (depth is None) or type(depth) != int:
+        raise TypeError("'depth' must be 'int' type!")
+    if (background_knowledge is not None) and type(background_knowledge) != BackgroundKnowledge:
+        raise TypeError("'background_knowledge' must be 'BackgroundKnowledge' type!")
+    if type(max_path_length) != int:
+        raise TypeError("'max_path_length' must be 'int' type!")
+
+    nodes = []
+    for i in range(dataset.shape[1]):
+        node = GraphNode(f"X{i + 1}")
+        node.add_attribute("id", i)
+        nodes.append(node)
+
+    cg, sep_sets = adjacency_search(
+        dataset,
+        alpha,
+        independence_test_method,
+        background_knowledge=background_knowledge,
+        verbose=verbose,
+        show_progress=verbose,
+        node_names=[node.get_name() for node in nodes],
+        max_depth=depth,
+    )
+    graph = cg.G
+
+    reorientAllWith(graph, Endpoint.CIRCLE)
+    rule0(graph, nodes, sep_sets, background_knowledge, verbose)
+    removeByPossibleDsep(graph, independence_test_method, alpha, sep_sets)
+    reorientAllWith(graph, Endpoint.CIRCLE)
+    rule0(graph, nodes, sep_sets, background_knowledge, verbose)
+
+    change_flag = True
+    first_time = True
+    while change_flag:
+        change_flag = False
+        change_flag = rulesR1R2cycle(graph, background_knowledge, change_flag, verbose)
+        change_flag = ruleR3(graph, sep_sets, background_knowledge, change_flag, verbose)
+
+        if change_flag or (
+            first_time
+            and background_knowledge is not None
+            and len(background_knowledge.forbidden_rules_specs) > 0
+            and len(background_knowledge.required_rules_specs) > 0
+            and len(background_knowledge.tier_map.keys()) > 0
+        ):
+            change_flag = ruleR4B(
+                graph,
+                max_path_length,
+                dataset,
+                independence_test_method,
+                alpha,
+                sep_sets,
+                change_flag,
+                background_knowledge,
+                verbose,
+            )
+            first_time = False
+            if verbose:
+                print("Epoch")
 
+    graph.set_pag(True)
+    edges = get_color_edges(graph)
+    return graph, edges
 
-def fci_default(data: pd.DataFrame):
-    node_names = data.columns.to_list()
 
+def fci_default(data: pd.DataFrame, n_jobs=1, parallel_backend="thread"):
     # fill nan by ffill
     data = data.fillna(method="ffill")
 
     data = data.to_numpy().astype(float)
 
-    output = fci(data, node_names=node_names, verbose=False)
+    output = fci(data, FisherZ(), verbose=False, n_jobs=n_jobs, parallel_backend=parallel_backend)
     adj = output[0].graph
     return adj
@@ -1,35 +1,212 @@
+"""
+Granger causality between all pairs of metrics
+
+granger() gives the same graph as running statsmodels grangercausalitytests
+on every ordered pair, but fits the models of all the pairs of a target at
+once: the lags of the target are projected out of the target and of the lags
+of every other metric with one SVD, then each pair only solves a (lag, lag)
+system. Pairs whose lags are (nearly) collinear with the lags of the target
+are left to statsmodels, whose pinv handles rank deficient designs.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import stats
+from statsmodels.tools.sm_exceptions import InfeasibleTestError
 from statsmodels.tsa.stattools import grangercausalitytests
 
-def granger(data, maxlag=None, p_val_threshold=0.05, test=None):
+from RCAEval.utility import limit_threads
+
+TESTS = ["ssr_ftest", "ssr_chi2test", "lrtest", "params_ftest"]
+
+# pairs whose projected lags keep less than this share of their variance go to statsmodels
+COLLINEAR_TOL = 1e-10
+
+
+def _lagged(values: np.ndarray, lag: int) -> np.ndarray:
+    # (rows - lag, metrics, lag) values of the metrics 1..lag steps before each row from lag on
+    windows = sliding_window_view(values, lag + 1, axis=0)
+    return np.ascontiguousarray(windows[:, :, lag - 1 :: -1])
+
+
+def _granger_pair(data, i, j, maxlag, p_val_threshold, test):
+    # test j -> i with statsmodels
+    node_names = data.columns.to_list()
+    output = grangercausalitytests(data[[node_names[i], node_names[j]]], maxlag, verbose=False)
+    for time_lag, out in output.items():
+        out = out[0]
+        if test is None:
+            avg_p_val = sum([v[1] for k, v in out.items()]) / len(out)
+        else:
+            avg_p_val = out[test][1]
+        if avg_p_val < p_val_threshold:  # average p-value
+            return True
+    return False
+
+
+def _check_feasible(constant: np.ndarray, i: int, pending: np.ndarray):
+    # as statsmodels, reject designs with a constant lag column
+    if pending.any() and (constant[i] or constant[pending].any()):
+        raise InfeasibleTestError(
+            "The x values include a column with constant values and so"
+            " the test statistic cannot be computed."
+        )
+
+
+def _target_pvalues(values, lags, variance, i, pending):
+    """
+    p-values of the tests of each other metric Granger causing metric i at one lag
+
+    Return (p-values as (tests, metrics), mask of the pairs left to statsmodels).
+    """
+    nobs, num_metrics, lag = lags.shape
+    y = values[lag:, i]
+    own = np.column_stack([lags[:, i, :], np.ones(nobs)])
+    u, s, _ = np.linalg.svd(own, full_matrices=False)
+    q = u[:, : int((s > 1e-15 * s[0]).sum())]
+    df_resid = nobs - q.shape[1] - lag
+
+    # restricted model: the lags of the target and a constant
+    resid = y - q @ (q.T @ y)
+    ssr_own = resid @ resid
+
+    # joint models, by the Frisch-Waugh theorem: the lags of the other metric,
+    # without what the restricted design explains, against resid
+    others = lags.reshape(nobs, num_metrics * lag)
+    w = (others - q @ (q.T @ others)).reshape(nobs, num_metrics, lag)
+    gram = np.einsum("tjl,tjm->jlm", w, w)
+    rhs = np.einsum("tjl,t->jl", w, resid)
+
+    collinear = np.linalg.eigvalsh(gram)[:, 0] <= COLLINEAR_TOL * variance
+    collinear[i] = False
+    fit = pending & ~collinear
+    fit[i] = False
+
+    ssr = np.full(num_metrics, np.nan)
+    if fit.any():
+        beta = np.linalg.solve(gram[fit], rhs[fit][..., None])[..., 0]
+        joint_resid = resid[:, None] - np.einsum("tjl,jl->tj", w[:, fit], beta)
+        ssr[fit] = np.einsum("tj,tj->j", joint_resid, joint_resid)
+
+        tss = ((y - y.mean()) ** 2).sum()
+        if tss == 0 or np.any(ssr[fit] == 0) or np.any(ssr[fit] / tss < np.finfo(float).eps):
+            raise InfeasibleTestError(
+                "The Granger causality test statistic cannot be compute "
+                "because the VAR has a perfect fit of the data."
+            )
+
+    f_stat = (ssr_own - ssr) / ssr / lag * df_resid
+    chi2_stat = nobs * (ssr_own - ssr) / ssr
+    lr_stat = nobs * (np.log(ssr_own / nobs) - np.log(ssr / nobs))
+    f_pval = stats.f.sf(f_stat, lag, df_resid)
+    # the F test of the lag coefficients is the ssr F test for nested OLS models
+    p_values = np.stack(
+        [f_pval, stats.chi2.sf(chi2_stat, lag), stats.chi2.sf(lr_stat, lag), f_pval]
+    )
+    return p_values, pending & collinear
+
+
+def _granger_target(i, values, all_lags, p_val_threshold, test):
+    """
+    Return (whether each metric Granger causes metric i, mask of the pairs left to statsmodels)
+    """
+    num_metrics = values.shape[1]
+    caused = np.zeros(num_metrics, dtype=bool)
+    pending = np.ones(num_metrics, dtype=bool)
+    pending[i] = False
+    fallback = np.zeros(num_metrics, dtype=bool)
+
+    # as the pairwise loop, stop testing a pair at its first significant lag
+    for lags, constant, variance in all_lags:
+        if not pending.any():
+            break
+        _check_feasible(constant, i, pending)
+        p_values, collinear = _target_pvalues(values, lags, variance, i, pending)
+        fallback |= collinear
+        pending &= ~collinear
+
+        if test is None:
+            # summed in the order of the statsmodels results, as sum() does
+            p_val = (((0 + p_values[0]) + p_values[1]) + p_values[2]) + p_values[3]
+            p_val = p_val / len(TESTS)
+        else:
+            p_val = p_values[TESTS.index(test)]
+        significant = pending & (p_val < p_val_threshold)
+        caused |= significant
+        pending &= ~significant
+    return caused, fallback
+
+
+_worker_args = ()
+
+
+def _init_worker(values, all_lags, p_val_threshold, test):
+    global _worker_args
+    limit_threads(1)
+    _worker_args = (values, all_lags, p_val_threshold, test)
+
+
+def _worker_granger_target(i):
+    return _granger_target(i, *_worker_args)
+
+
+def granger(data, maxlag=None, p_val_threshold=0.05, test=None, n_jobs=1):
+    """
+    Adjacency matrix with adj[i, j] = 1 when metric j Granger causes metric i
+
+    j causes i when, at some lag up to maxlag, the p-value of test (or the
+    average p-value of the tests of statsmodels if test is None) is below
+    p_val_threshold.
+
+    n_jobs: number of processes sharing the targets, for very wide data, -1 for all cores
+    """
     assert test in [None, 'ssr_ftest', 'ssr_chi2test', 'lrtest', 'params_ftest']
 
-	# data: pandas dataframe
+    # data: pandas dataframe
     if maxlag is None:
         maxlag = 3
     node_names = data.columns.to_list()
-    adj = np.zeros((len(node_names), len(node_names)))
-
-    for i in range(len(node_names)):
-        for j in range(len(node_names)):
-            if i == j:
-                continue
-            # test j -> i
-            output = grangercausalitytests(
-                data[[node_names[i], node_names[j]]], maxlag, verbose=False
-            )
-            caused = False
-            for time_lag, out in output.items():
-                out = out[0]
-
-                if test is None:
-                    avg_p_val = sum([v[1] for k, v in out.items()]) / len(out)
-                else:
-                    avg_p_val = out[test][1]
-
-                if avg_p_val < p_val_threshold:  # average p-value
-                    caused = True
-                    break
-            if caused:
+    num_metrics = len(node_names)
+    adj = np.zeros((num_metrics, num_metrics))
+    if num_metrics < 2:
+        return adj
+
+    values = data.to_numpy(dtype=np.float64)
+    if not np.isfinite(values).all():
+        raise ValueError("x contains NaN or inf values.")
+    if maxlag <= 0:
+        raise ValueError("maxlag must be a positive integer")
+    if values.shape[0] <= 3 * maxlag + 1:
+        raise ValueError(
+            "Insufficient observations. Maximum allowable "
+            "lag is {0}".format(int((values.shape[0] - 1) / 3) - 1)
+        )
+
+    all_lags = []
+    for lag in range(1, maxlag + 1):
+        lags = _lagged(values, lag)
+        constant = (lags.max(axis=0) == lags.min(axis=0)).any(axis=1)
+        centered = lags - lags.mean(axis=0)
+        all_lags.append((lags, constant, np.einsum("tjl,tjl->j", centered, centered)))
+
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count()
+    if n_jobs > 1:
+        # workers get the lagged matrices once when they start
+        with ProcessPoolExecutor(
+            n_jobs, initializer=_init_worker, initargs=(values, all_lags, p_val_threshold, test)
+        ) as pool:
+            results = list(pool.map(_worker_granger_target, range(num_metrics)))
+    else:
+        results = [
+            _granger_target(i, values, all_lags, p_val_threshold, test) for i in range(num_metrics)
+        ]
+
+    for i, (caused, fallback) in enumerate(results):
+        adj[i, caused] = 1
+        for j in np.flatnonzero(fallback):
+            if _granger_pair(data, i, j, maxlag, p_val_threshold, test):
                 adj[i, j] = 1
     return adj
@@ -1,7 +1,18 @@
+import time
+import warnings
+from itertools import combinations
+
+import numpy as np
 import pandas as pd
-from causallearn.search.ConstraintBased.PC import pc
-from causallearn.utils.cit import chisq, fisherz, gsq, kci, mv_fisherz
+from causallearn.graph.GraphClass import CausalGraph
+from causallearn.utils.cit import CIT, chisq, fisherz, gsq, kci, mv_fisherz
+from causallearn.utils.PCUtils import Meek, UCSepset
 from causallearn.utils.PCUtils.BackgroundKnowledge import BackgroundKnowledge
+from causallearn.utils.PCUtils.BackgroundKnowledgeOrientUtils import orient_by_background_knowledge
+from causallearn.utils.PCUtils.Helper import append_value
+from tqdm.auto import tqdm
+
+from RCAEval.graph_construction.citest import CITestCache, FisherZ, depth_tests, prefetch_ci_tests
 
 background_knowledge = BackgroundKnowledge()
 background_knowledge.add_forbidden_by_pattern(".*mem$", ".*lat50$")
@@ -9,55 +20,298 @@ background_knowledge.add_forbidden_by_pattern(".*cpu$", ".*lat50$")
 background_knowledge.add_forbidden_by_pattern(".*", "frontend.*")
 
 
-def pc_default(data, show_progress=False, with_bg=False, **kwargs):
+class CausalLearnTest:
+    """
+    A causal-learn CI test, e.g. fisherz, called as test(data, X, Y, S) like the tests of run_ci_tests
+    """
+
+    def __init__(self, method, **kwargs):
+        self.method = method
+        self.kwargs = kwargs
+        self._data = None
+        self._cit = None
+
+    def __call__(self, data, X, Y, condition_set=()):
+        if data is not self._data:
+            self._cit = CIT(data, self.method, **self.kwargs)
+            self._data = data
+        return self._cit(X, Y, condition_set)
+
+
+class BoundTest:
+    """
+    A test(data, X, Y, S) bound to the data of a search, called as test(X, Y, S) like a causal-learn CIT
+
+    It keeps the p-values of the search in a CITestCache, and prefetch runs
+    the missing ones of a list of tests at once on a pool of n_jobs workers.
+    """
+
+    def __init__(self, test, data, n_jobs=1, parallel_backend="thread"):
+        self.test = test
+        self.data = data
+        self.method = getattr(test, "method", None)
+        self.n_jobs = n_jobs
+        self.parallel_backend = parallel_backend
+        self.p_values = CITestCache()
+
+    @staticmethod
+    def task(X, Y, condition_set):
+        # the same test in any order of X, Y and of the conditioning set
+        X, Y = (int(X), int(Y)) if X < Y else (int(Y), int(X))
+        return X, Y, tuple(sorted(set(map(int, condition_set))))
+
+    def __call__(self, X, Y, condition_set=None):
+        task = self.task(X, Y, () if condition_set is None else condition_set)
+        if task in self.p_values:
+            return self.p_values[task]
+        p_value = self.test(self.data, *task)
+        self.p_values[task] = p_value
+        return p_value
+
+    def prefetch(self, tasks):
+        tasks = {task: task for task in (self.task(*task) for task in tasks)}
+        prefetch_ci_tests(
+            tasks, self.p_values, self.test, self.data, n_jobs=self.n_jobs, backend=self.parallel_backend
+        )
+
+
+def _remove_edge(cg, x, y):
+    edge1 = cg.G.get_edge(cg.G.nodes[x], cg.G.nodes[y])
+    if edge1 is not None:
+        cg.G.remove_edge(edge1)
+    edge2 = cg.G.get_edge(cg.G.nodes[y], cg.G.nodes[x])
+    if edge2 is not None:
+        cg.G.remove_edge(edge2)
+
+
+def adjacency_search(
+    data,
+    alpha,
+    indep_test,
+    stable=True,
+    background_knowledge=None,
+    verbose=False,
+    show_progress=True,
+    node_names=None,
+    max_depth=-1,
+):
+    """
+    The skeleton_discovery of causal-learn, which also returns the sepsets of the removed edges like its fas
+
+    indep_test is a BoundTest. In the stable search, the tests of a depth
+    (depth_tests) are prefetched on the pool of indep_test, or as one batch
+    for tests with a batch method, as the vendored skeleton_discovery does.
+    The graph and the sepsets are the same for any n_jobs. max_depth bounds
+    the size of the conditioning sets, -1 for no bound.
+
+    Returns
+    -------
+    cg : a CausalGraph object, with the skeleton in cg.G and the sepsets in cg.sepset
+    sep_sets : {(x, y): S} of the removed edges, as fas returns them
+    """
+    assert type(data) == np.ndarray
+    assert 0 < alpha < 1
+
+    no_of_var = data.shape[1]
+    cg = CausalGraph(no_of_var, node_names)
+    cg.set_ind_test(indep_test)
+    sep_sets = {}
+    prefetch = stable and (indep_test.n_jobs != 1 or hasattr(indep_test.test, "batch"))
+
+    depth = -1
+    pbar = tqdm(total=no_of_var) if show_progress else None
+    while cg.max_degree() - 1 > depth and (max_depth < 0 or depth < max_depth):
+        depth += 1
+        edge_removal = []
+        if prefetch:
+            indep_test.prefetch(depth_tests(cg, depth))
+        if show_progress:
+            pbar.reset()
+        for x in range(no_of_var):
+            if show_progress:
+                pbar.update()
+                pbar.set_description(f"Depth={depth}, working on node {x}")
+            Neigh_x = cg.neighbors(x)
+            if len(Neigh_x) < depth - 1:
+                continue
+            for y in Neigh_x:
+                sepsets = set()
+                if background_knowledge is not None and (
+                    background_knowledge.is_forbidden(cg.G.nodes[x], cg.G.nodes[y])
+                    and background_knowledge.is_forbidden(cg.G.nodes[y], cg.G.nodes[x])
+                ):
+                    if not stable:
+                        _remove_edge(cg, x, y)
+                        append_value(cg.sepset, x, y, ())
+                        append_value(cg.sepset, y, x, ())
+                        sep_sets[(x, y)] = set()
+                        sep_sets[(y, x)] = set()
+                        break
+                    else:
+                        edge_removal.append((x, y))  # after all conditioning sets at
+                        edge_removal.append((y, x))  # depth l have been considered
+
+                Neigh_x_noy = np.delete(Neigh_x, np.where(Neigh_x == y))
+                for S in combinations(Neigh_x_noy, depth):
+                    p = cg.ci_test(x, y, S)
+                    if p > alpha:
+                        if verbose:
+                            print("%d ind %d | %s with p-value %f\n" % (x, y, S, p))
+                        if not stable:
+                            _remove_edge(cg, x, y)
+                            append_value(cg.sepset, x, y, S)
+                            append_value(cg.sepset, y, x, S)
+                            sep_sets[(x, y)] = set(S)
+                            sep_sets[(y, x)] = set(S)
+                            break
+                        else:
+                            edge_removal.append((x, y))  # after all conditioning sets at
+                            edge_removal.append((y, x))  # depth l have been considered
+                            for s in S:
+                                sepsets.add(s)
+                    else:
+                        if verbose:
+                            print("%d dep %d | %s with p-value %f\n" % (x, y, S, p))
+                append_value(cg.sepset, x, y, tuple(sepsets))
+                append_value(cg.sepset, y, x, tuple(sepsets))
+
+        if show_progress:
+            pbar.refresh()
+
+        for x, y in list(set(edge_removal)):
+            edge1 = cg.G.get_edge(cg.G.nodes[x], cg.G.nodes[y])
+            if edge1 is not None:
+                cg.G.remove_edge(edge1)
+            if cg.sepset[x, y] is not None:
+                sep_set = {s for S in cg.sepset[x, y] for s in S}
+                sep_sets[(x, y)] = sep_set
+                sep_sets[(y, x)] = set(sep_set)
+
+    if show_progress:
+        pbar.close()
+
+    return cg, sep_sets
+
+
+def pc(
+    data,
+    alpha=0.05,
+    indep_test=fisherz,
+    stable=True,
+    uc_rule=0,
+    uc_priority=2,
+    background_knowledge=None,
+    verbose=False,
+    show_progress=True,
+    node_names=None,
+    n_jobs=1,
+    parallel_backend="thread",
+    **kwargs,
+):
+    """
+    The pc of causal-learn, whose stable skeleton search runs the CI tests of a depth at once
+
+    indep_test: the name of a causal-learn CI test, e.g. fisherz, whose options are
+            the kwargs, or a test(data, X, Y, S)
+    n_jobs: number of workers running the CI tests of a depth of the stable search,
+            -1 for all cores. The graph is the same as with n_jobs=1.
+    parallel_backend: "thread" or "process", the pool running the CI tests
+    """
+    if data.shape[0] < data.shape[1]:
+        warnings.warn("The number of features is much larger than the sample size!")
+
+    start = time.time()
+    if isinstance(indep_test, str):
+        indep_test = CausalLearnTest(indep_test, **kwargs)
+    indep_test = BoundTest(indep_test, data, n_jobs, parallel_backend)
+    cg_1, _ = adjacency_search(
+        data,
+        alpha,
+        indep_test,
+        stable,
+        background_knowledge=background_knowledge,
+        verbose=verbose,
+        show_progress=show_progress,
+        node_names=node_names,
+    )
+
+    if background_knowledge is not None:
+        orient_by_background_knowledge(cg_1, background_knowledge)
+
+    priority = () if uc_priority == -1 else (uc_priority,)
+    if uc_rule == 0:
+        cg_2 = UCSepset.uc_sepset(cg_1, *priority, background_knowledge=background_knowledge)
+        cg = Meek.meek(cg_2, background_knowledge=background_knowledge)
+    elif uc_rule == 1:
+        cg_2 = UCSepset.maxp(cg_1, *priority, background_knowledge=background_knowledge)
+        cg = Meek.meek(cg_2, background_knowledge=background_knowledge)
+    elif uc_rule == 2:
+        cg_2 = UCSepset.definite_maxp(cg_1, alpha, *priority, background_knowledge=background_knowledge)
+        cg_before = Meek.definite_meek(cg_2, background_knowledge=background_knowledge)
+        cg = Meek.meek(cg_before, background_knowledge=background_knowledge)
+    else:
+        raise ValueError("uc_rule should be in [0, 1, 2]")
+
+    cg.PC_elapsed = time.time() - start
+    return cg
+
+
+def pc_default(data, show_progress=False, with_bg=False, n_jobs=1, parallel_backend="thread", **kwargs):
     node_names = data.columns.to_list()
 
     cg = pc(
         data.to_numpy().astype(float),
+        indep_test=FisherZ(),
         node_names=node_names,
         show_progress=show_progress,
         background_knowledge=background_knowledge if with_bg else None,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg.G.graph
 
 
-def pc_fisherz(data):
+def pc_fisherz(data, n_jobs=1, parallel_backend="thread"):
     # data: pd.DataFrame
     node_names = data.columns.to_list()
     data = data.to_numpy()
     cg = pc(
         data=data,
         alpha=0.05,
-        indep_test=fisherz,
+        indep_test=FisherZ(),
         stable=False,
         uc_rule=0,
         uc_priority=-1,
         background_knowledge=None,
         show_progress=False,
         node_names=node_names,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg
 
 
-def pc_fisherz_stable(data):
+def pc_fisherz_stable(data, n_jobs=1, parallel_backend="thread"):
     # data: pd.DataFrame
     node_names = data.columns.to_list()
     data = data.to_numpy()
     cg = pc(
         data=data,
         alpha=0.05,
-        indep_test=fisherz,
+        indep_test=FisherZ(),
         stable=True,
         uc_rule=0,
         uc_priority=-1,
         background_knowledge=None,
         show_progress=False,
         node_names=node_names,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg
 
 
-def pc_gsq(data):
+def pc_gsq(data, n_jobs=1, parallel_backend="thread"):
     # data: pd.DataFrame
     node_names = data.columns.to_list()
     data = data.to_numpy()
@@ -71,11 +325,13 @@ def pc_gsq(data):
         background_knowledge=None,
         show_progress=False,
         node_names=node_names,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg
 
 
-def pc_gsq_stable(data):
+def pc_gsq_stable(data, n_jobs=1, parallel_backend="thread"):
     # data: pd.DataFrame
     node_names = data.columns.to_list()
     data = data.to_numpy()
@@ -89,11 +345,13 @@ def pc_gsq_stable(data):
         background_knowledge=None,
         show_progress=False,
         node_names=node_names,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg
 
 
-def pc_chisq(data):
+def pc_chisq(data, n_jobs=1, parallel_backend="thread"):
     # data: pd.DataFrame
     node_names = data.columns.to_list()
     data = data.to_numpy()
@@ -107,11 +365,13 @@ def pc_chisq(data):
         background_knowledge=None,
         show_progress=False,
         node_names=node_names,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg
 
 
-def pc_chisq_stable(data):
+def pc_chisq_stable(data, n_jobs=1, parallel_backend="thread"):
     # data: pd.DataFrame
     node_names = data.columns.to_list()
     data = data.to_numpy()
@@ -125,6 +385,8 @@ def pc_chisq_stable(data):
         background_knowledge=None,
         show_progress=False,
         node_names=node_names,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
     return cg
 
@@ -2,6 +2,104 @@ import numpy as np
 
 # TODO: WIP
 
+# The graph heads read the edge between nodes a and b from its end marks
+# (adj[a, b], adj[b, a]) in causallearn graphs. Each head maps the marks it
+# knows to the edges it draws, "ab" for a -> b and "ba" for b -> a, in order.
+
+# causallearn PC graphs, i.e., no edge, a --- b, a <-- b and a --> b
+CPDAG_CASES = {
+    (0, 0): (),
+    (-1, -1): ("ba",),
+    (1, -1): ("ba",),
+    (-1, 1): ("ab",),
+}
+
+# plus the preprocessed directed edges and a <-> b
+RANDOM_WALK_CASES = {
+    **CPDAG_CASES,
+    (0, 1): ("ab",),
+    (1, 0): ("ba",),
+    (1, 1): ("ab", "ba"),
+}
+
+# plus the circle marks of FCI graphs
+PAGE_RANK_CASES = {
+    (0, 0): (),
+    (-1, -1): ("ab", "ba"),
+    (1, -1): ("ab",),
+    (-1, 1): ("ba",),
+    (0, 1): ("ba",),
+    (1, 0): ("ab",),
+    (1, 1): ("ab", "ba"),
+    (2, 1): ("ab",),
+    (1, 2): ("ba",),
+    (2, 2): ("ab", "ba"),
+}
+
+# finalize_directed_adj, with edges from cause to effect
+DIRECTED_CASES = {
+    (0, 0): (),
+    (-1, 1): ("ba",),
+    (1, -1): ("ab",),
+    (0, 1): ("ba",),
+    (1, 0): ("ab",),
+    (-1, -1): ("ab", "ba"),
+    (1, 1): ("ab", "ba"),
+    (2, 1): ("ba",),
+    (1, 2): ("ab",),
+    (2, 2): ("ab", "ba"),
+}
+
+
+def decode_edges(adj: np.ndarray, cases: dict, message: str = "Unexpected value: {}, {}"):
+    """
+    Decode the edges of adj with the end marks in cases
+
+    Return the (sources, targets) arrays of the edges, in the order a loop over
+    a then b would draw them. Raise ValueError on the first pair of that loop
+    whose marks are not in cases.
+    """
+    adj = np.asarray(adj)
+    num_nodes = len(adj)
+    if (0, 0) in cases:
+        # only the pairs with an end mark, unmarked pairs draw nothing
+        pairs = np.flatnonzero((adj != 0) | (adj.T != 0))
+    else:
+        pairs = np.arange(adj.size)
+    a, b = np.divmod(pairs, max(num_nodes, 1))
+    marks_ab, marks_ba = adj[a, b], adj[b, a]
+
+    known = np.zeros(len(pairs), dtype=bool)
+    edge_pairs, slots, flips = [], [], []
+    for (mark_ab, mark_ba), edges in cases.items():
+        index = np.flatnonzero((marks_ab == mark_ab) & (marks_ba == mark_ba))
+        known[index] = True
+        for slot, edge in enumerate(edges):
+            edge_pairs.append(index)
+            slots.append(np.full(len(index), slot))
+            flips.append(np.full(len(index), edge == "ba"))
+
+    if not known.all():
+        first = np.flatnonzero(~known)[0]
+        raise ValueError(message.format(marks_ab[first], marks_ba[first]))
+
+    if not edge_pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    edge_pairs, slots, flips = np.concatenate(edge_pairs), np.concatenate(slots), np.concatenate(flips)
+    order = np.lexsort((slots, edge_pairs))
+    a, b, flips = a[edge_pairs[order]], b[edge_pairs[order]], flips[order]
+    return np.where(flips, b, a), np.where(flips, a, b)
+
+
+def decode_adj(adj: np.ndarray, cases: dict, message: str = "Unexpected value: {}, {}") -> np.ndarray:
+    """
+    The decoded edges of adj as a matrix, with output[a, b] = 1 for a -> b
+    """
+    output = np.zeros_like(adj)
+    sources, targets = decode_edges(adj, cases, message)
+    output[sources, targets] = 1
+    return output
+
 
 def finalize_directed_adj(adj: np.ndarray) -> np.ndarray:
     """
@@ -25,59 +123,7 @@ def finalize_directed_adj(adj: np.ndarray) -> np.ndarray:
     # edge direction here is from cause --> effect
     # before passing to pagerank, we need to do adj.T to convert cause <-- effect.
     """
-    # # rules for output_adj
-    # - i --> j : adj[j, i] == 1 and adj[i, j] == 0
-    # - i <-- j : adj[j, i] == 0 and adj[i, j] == 1
-    # - i <-> j : adj[j, i] == 1 and adj[i, j] == 1
-    # """
-    output_adj = np.zeros_like(adj)
-    for i in range(adj.shape[0]):
-        for j in range(adj.shape[1]):
-            # case 1: no edge: i j
-            if adj[i, j] == adj[j, i] == 0:
-                pass
-
-            # case 2.1: fully directed i-->j
-            elif adj[j, i] == 1 and adj[i, j] == -1:
-                output_adj[j, i] = 1
-
-            # case 2.2: fully directed i<--j
-            elif adj[j, i] == -1 and adj[i, j] == 1:
-                output_adj[i, j] = 1
-
-            # case 2.3: fully directed i-->j, preprocessed case
-            elif adj[j, i] == 1 and adj[i, j] == 0:
-                output_adj[j, i] = 1
-
-            # case 2.4: fully directed i<--j, preprocessed case
-            elif adj[j, i] == 0 and adj[i, j] == 1:
-                output_adj[i, j] = 1
-
-
-            # case 3: i---j  to  i<->j
-            elif adj[i, j] == adj[j, i] == -1:
-                output_adj[i, j] = output_adj[j, i] = 1
-
-            # case 4: i<->j  to  i<->j
-            elif adj[i, j] == adj[j, i] == 1:
-                output_adj[i, j] = output_adj[j, i] = 1
-
-            # case 5.1: io->j  to  i-->j, in FCI, tricky
-            elif adj[i, j] == 2 and adj[j, i] == 1:
-                output_adj[j, i] = 1
-
-            # case 5.2: i<-oj  to  i<--j, in FCI, tricky
-            elif adj[i, j] == 1 and adj[j, i] == 2:
-                output_adj[i, j] = 1
-
-            # case 6: o-o  to  <->
-            elif adj[i, j] == adj[j, i] == 2:
-                output_adj[i, j] = output_adj[j, i] = 1
-
-            else:
-                raise ValueError(f"Unexpected value: {adj[i, j]=}, {adj[j, i]=}")
-    
-    return output_adj
+    return decode_adj(adj, DIRECTED_CASES, "Unexpected value: adj[i, j]={!r}, adj[j, i]={!r}")
 
 # def finalize_undirected_adj(adj : np.ndarray) -> np.ndarray:
 #     pass
\ No newline at end of file
@@ -1,94 +1,132 @@
 import networkx as nx
 import numpy as np
 from causallearn.graph.GraphClass import CausalGraph
+from scipy import sparse
 from sknetwork.ranking import PageRank
 
+from RCAEval.graph_heads import PAGE_RANK_CASES, decode_adj, decode_edges
+
 
 def page_rank_preprocess(adj):
-    pr_input = np.zeros_like(adj)
-
-    node_num = len(adj)
-
-    for a in range(node_num):
-        for b in range(node_num):
-            # case 1 no edge: a b
-            if adj[a, b] == adj[b, a] == 0:
-                pass
-
-            # case 2 undirected a -- b
-            elif adj[a, b] == adj[b, a] == -1:
-                pr_input[a, b] = pr_input[b, a] = 1
-
-            # case 3 directed a -> b
-            elif adj[a, b] == 1 and adj[b, a] == -1:
-                pr_input[a, b] = 1
-                # pr_input[b, a] = 0
-
-            # case 4 directed a <- b
-            elif adj[a, b] == -1 and adj[b, a] == 1:
-                # pr_input[a, b] = 0
-                pr_input[b, a] = 1
-            elif adj[a, b] == 0 and adj[b, a] == 1:
-                # already ok
-                pr_input[a, b] = 0
-                pr_input[b, a] = 1
-            elif adj[a, b] == 1 and adj[b, a] == 0:
-                # already ok
-                pr_input[a, b] = 1
-                pr_input[b, a] = 0
-            elif adj[a, b] == 1 and adj[b, a] == 1:
-                # a <-> b, in FCI
-                pr_input[a, b] = 1
-                pr_input[b, a] = 1
-            elif adj[a, b] == 2 and adj[b, a] == 1:
-                # a o-> b, in FCI
-                # hmm, we will make it a->b
-                pr_input[a, b] = 1
-                pr_input[b, a] = 0
-            elif adj[a, b] == 1 and adj[b, a] == 2:
-                # a <-0 b, in FCI
-                # hmm, we will make it a<-b
-                pr_input[a, b] = 0
-                pr_input[b, a] = 1
-
-            elif adj[a, b] == 2 and adj[b, a] == 2:
-                # a o-o b, in FCI
-                # hmm, we will make it a<->b
-                pr_input[a, b] = 1
-                pr_input[b, a] = 1
-
-            else:
-                # 1 and 1 ?? what the hell?
-                raise ValueError(f"Unexpected value: {adj[a, b]}, {adj[b, a]}")
-    return pr_input
-
-
-def page_rank(adj, node_names=None, damping_factor=0.85, solver="piteration", n_iter=10, tol=1e-6):
+    return decode_adj(adj, PAGE_RANK_CASES)
+
+
+def page_rank_matrix(adj) -> sparse.csr_matrix:
+    """
+    The page_rank_preprocess matrix of a causallearn adj as a CSR matrix, one entry per edge
+    """
+    adj = np.asarray(adj)
+    sources, targets = decode_edges(adj, PAGE_RANK_CASES)
+    data = np.ones(len(sources), dtype=adj.dtype)
+    matrix = sparse.csr_matrix((data, (sources, targets)), shape=adj.shape)
+    # both pairs of an edge draw it, keep it once
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def _probabilities(weights, num_nodes: int, name: str) -> np.ndarray:
+    # a distribution over the nodes from an array, or a {node index: weight} dict
+    if isinstance(weights, dict):
+        values = np.zeros(num_nodes)
+        values[list(weights.keys())] = list(weights.values())
+    else:
+        values = np.array(weights, dtype=float)
+        if values.shape != (num_nodes,):
+            raise ValueError(f"{name} has shape {values.shape}, expected ({num_nodes},)")
+    if np.any(values < 0) or not values.sum() > 0:
+        raise ValueError(f"{name} must be non negative with a positive sum")
+    return values / values.sum()
+
+
+def sparse_page_rank(
+    adjacency, personalization=None, damping_factor=0.85, n_iter=10, tol=1e-6, x0=None
+):
+    """
+    PageRank of the nodes of a sparse adjacency matrix, by power iteration
+
+    It runs the same iterations as the "piteration" solver of sknetwork's
+    PageRank, on CSR matrices only, so memory stays linear in the number of
+    edges. A walk leaving a node without out edges restarts from the
+    personalization. Raise ValueError on a graph without edges, as sknetwork.
+
+    adjacency: (n, n) matrix with adjacency[i, j] the weight of the edge i -> j
+    personalization: restart distribution, uniform if None, as an (n,) array
+            or a {node index: weight} dict, e.g. {sli: 1}
+    x0: initial scores, e.g. the scores of a previous window, instead of the restart vector
+    Return (scores, stats), stats holding the number of iterations, the L1
+            change of the last iteration and whether it fell below tol.
+    """
+    adjacency = sparse.csr_matrix(adjacency, dtype=float)
+    if adjacency.nnz == 0:
+        # as sknetwork does
+        raise ValueError("The input matrix is empty.")
+    num_nodes = adjacency.shape[0]
+    if personalization is None:
+        seeds = np.full(num_nodes, 1 / num_nodes)
+    else:
+        seeds = _probabilities(personalization, num_nodes, "personalization")
+
+    out_degrees = adjacency.dot(np.ones(num_nodes))
+    inverse = np.zeros(num_nodes)
+    np.divide(1, out_degrees, out=inverse, where=out_degrees != 0)
+    transition = sparse.diags(inverse, format="csr").dot(adjacency)
+    walk = (damping_factor * transition).T.tocsr()
+    restart = (np.ones(num_nodes) - damping_factor * out_degrees.astype(bool)) * seeds
+
+    scores = restart if x0 is None else _probabilities(x0, num_nodes, "x0")
+    stats = {"iterations": 0, "residual": np.inf, "converged": False}
+    for _ in range(n_iter):
+        next_scores = walk.dot(scores) + restart * scores.sum()
+        next_scores /= next_scores.sum()
+        stats["iterations"] += 1
+        stats["residual"] = np.linalg.norm(scores - next_scores, ord=1)
+        if stats["residual"] < tol:
+            stats["converged"] = True
+            break
+        scores = next_scores
+    return scores / scores.sum(), stats
+
+
+def page_rank(
+    adj,
+    node_names=None,
+    damping_factor=0.85,
+    solver="piteration",
+    n_iter=10,
+    tol=1e-6,
+    personalization=None,
+    x0=None,
+    return_stats=False,
+):
+    """
+    Rank the nodes of a causallearn adj by their PageRank, highest first
+
+    personalization: restart distribution, a {node name: weight} dict, e.g. {sli: 1}, or an array
+    x0: initial scores to warm start the "piteration" solver
+    return_stats: also return the convergence stats of sparse_page_rank
+    """
     if node_names is None:
         node_names = [f"X{i}" for i in range(len(adj))]
+    if isinstance(personalization, dict):
+        index = {name: i for i, name in enumerate(node_names)}
+        personalization = {index[name]: weight for name, weight in personalization.items()}
 
-    pr_input = page_rank_preprocess(adj)
-    # # Change the adj to graph
-    # G = nx.DiGraph()
-    # for i in range(len(adj)):
-    #     for j in range(len(adj)):
-    #         if adj[i,j] == -1:
-    #             G.add_edge(i,j)
-    #         if adj[i,j] == 1:
-    #             G.add_edge(j,i)
-    # nodes = sorted(G.nodes())
-    # pr_input = np.asarray(nx.to_numpy_matrix(G, nodelist=nodes))
-    # print(f"Number of element equal to -1, 0, 1 in pr_input: ")
-    # print(np.sum(pr_input == -1), np.sum(pr_input == 0), np.sum(pr_input == 1))
-    # print(pr_input.shape)
-
-    pr = PageRank(damping_factor=damping_factor, solver=solver, n_iter=n_iter, tol=tol)
-    # pr = PageRank()
-
-    # transpose before fit
-    scores = pr.fit_transform(pr_input)
+    pr_input = page_rank_matrix(adj)
+    stats = None
+    if solver == "piteration":
+        scores, stats = sparse_page_rank(
+            pr_input, personalization, damping_factor=damping_factor, n_iter=n_iter, tol=tol, x0=x0
+        )
+    else:
+        pr = PageRank(damping_factor=damping_factor, solver=solver, n_iter=n_iter, tol=tol)
+        if personalization is not None:
+            personalization = _probabilities(personalization, len(node_names), "personalization")
+        scores = pr.fit_transform(pr_input, personalization)
 
     # merge scores and node names, sort by scores
     output = list(zip(node_names, scores))
     output.sort(key=lambda x: x[1], reverse=True)
+    if return_stats:
+        return output, stats
     return output
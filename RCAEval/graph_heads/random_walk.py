@@ -1,13 +1,14 @@
 from abc import ABC
-from collections import defaultdict
 from typing import Callable, Dict, List, Sequence, Union
 
 import networkx as nx
 import numpy as np
 import pandas as pd
+from scipy.sparse.csgraph import connected_components
 
 from RCAEval.classes.data import CaseData
 from RCAEval.classes.graph import Graph, MemoryGraph, Node
+from RCAEval.graph_heads import CPDAG_CASES, RANDOM_WALK_CASES, decode_edges
 
 
 def _times(num: int, multiplier: int = 10) -> int:
@@ -131,6 +132,12 @@ class Scorer(ABC):
 class RandomWalkScorer(Scorer):
     """
     Scorer based on random walk
+
+    The walk runs on a (nodes, nodes) array of transition probabilities.
+    num_walkers walkers start from the SLI and move in lock-step until they
+    took num_loop steps together, so num_walkers=1 is the single walk of
+    num_loop steps. method="stationary" scores nodes by the exact long run
+    share of visits of the walk instead of sampling it.
     """
 
     def __init__(
@@ -138,52 +145,125 @@ class RandomWalkScorer(Scorer):
         rho: float = 0.5,
         remove_sli: bool = False,
         num_loop: Union[int, Callable[[int], int]] = None,
+        num_walkers: int = 1,
+        method: str = "sample",
         **kwargs,
     ):
         # pylint: disable=too-many-arguments
         super().__init__(**kwargs)
+        if method not in ("sample", "stationary"):
+            raise ValueError(f"unknown method {method!r}, use 'sample' or 'stationary'")
         self._rho = rho
         self._remove_sli = remove_sli
         self._num_loop = num_loop if num_loop is not None else _times
+        self._num_walkers = num_walkers
+        self._method = method
         self._rng = np.random.default_rng(self._seed)
 
-    def generate_transition_matrix(
+    def transition_probabilities(
         self, graph: Graph, data: CaseData, scores: Dict[Node, Score]
-    ) -> pd.DataFrame:
+    ) -> np.ndarray:
         """
-        Generate the transition matrix
+        Transition probabilities, with [i, j] the probability to move from the
+        i-th node of scores to the j-th one
         """
         nodes = list(scores.keys())
         size = len(nodes)
-        matrix = pd.DataFrame(np.zeros([size, size]), index=nodes, columns=nodes)
-        for node in scores:
-            for child in graph.children(node):
-                if child in scores:
-                    matrix[node][child] = self._rho * abs(scores[child].score)
+        index = {node: i for i, node in enumerate(nodes)}
+        weights = np.array([abs(score.score) for score in scores.values()], dtype=float)
 
+        child_edges, parent_edges = [], []
+        for i, node in enumerate(nodes):
+            child_edges.extend((i, index[child]) for child in graph.children(node) if child in index)
             parents = graph.parents(node)
             if self._remove_sli:
                 parents -= {data.sli}
-            for parent in parents:
-                if parent in scores:
-                    matrix[node][parent] = abs(scores[parent].score)
+            parent_edges.extend((i, index[parent]) for parent in parents if parent in index)
+
+        matrix = np.zeros([size, size])
+        for edges, factor in [(child_edges, self._rho), (parent_edges, 1)]:
+            if edges:
+                rows, cols = np.array(edges).T
+                matrix[rows, cols] = factor * weights[cols]
+        # max and sum skip nan as pandas does
+        diagonal = np.maximum(weights - np.fmax.reduce(matrix, axis=1), 0)
+        matrix[np.arange(size), np.arange(size)] = diagonal
+
+        total_weight = np.nansum(matrix, axis=1)
+        positive = total_weight > 0
+        matrix[positive] /= total_weight[positive, None]
+        matrix[~positive] = 1 / size
+        return matrix
 
-            matrix[node][node] = max(abs(scores[node].score) - matrix[node].max(), 0)
+    def generate_transition_matrix(
+        self, graph: Graph, data: CaseData, scores: Dict[Node, Score]
+    ) -> pd.DataFrame:
+        """
+        Generate the transition matrix, with matrix[node] the probabilities to move from node
+        """
+        nodes = list(scores.keys())
+        matrix = self.transition_probabilities(graph=graph, data=data, scores=scores)
+        return pd.DataFrame(matrix.T, index=nodes, columns=nodes)
 
-            total_weight = matrix[node].sum()
-            if total_weight > 0:
-                matrix[node] /= total_weight
-            else:
-                matrix[node] = 1 / size
-        return matrix
+    def _walk(self, start: int, num_loop: int, matrix: np.ndarray) -> np.ndarray:
+        """
+        Number of visits of each node in num_loop steps from start
+        """
+        if np.isnan(matrix).any():
+            raise ValueError("probabilities contain NaN")
+        # as Generator.choice, the first node whose cumulative probability exceeds a uniform sample
+        cdf = np.cumsum(matrix, axis=1)
+        cdf /= cdf[:, -1:]
+
+        counts = np.zeros(len(matrix), dtype=np.int64)
+        nodes = np.full(self._num_walkers, start)
+        for step in range(0, num_loop, self._num_walkers):
+            nodes = nodes[: num_loop - step]
+            samples = self._rng.random(len(nodes))
+            nodes = (cdf[nodes] <= samples[:, None]).sum(axis=1)
+            counts += np.bincount(nodes, minlength=len(matrix))
+        return counts
+
+    @staticmethod
+    def stationary_distribution(matrix: np.ndarray, start: int) -> np.ndarray:
+        """
+        Long run share of the visits of each node by a walk from start, solved exactly
 
-    def _walk(self, start: Node, num_loop: int, matrix: pd.DataFrame) -> Dict[Node, int]:
-        node: Node = start
-        counter = defaultdict(int)
-        for _ in range(num_loop):
-            node = self._rng.choice(matrix.index, p=matrix[node])
-            counter[node] += 1
-        return counter
+        The walk ends up in one of the closed classes of nodes, which it never
+        leaves: the share is the stationary distribution of each class,
+        weighted by the probability that the walk from start enters it.
+        """
+        size = len(matrix)
+        edges = matrix > 0
+        _, labels = connected_components(edges, directed=True, connection="strong")
+        rows, cols = np.nonzero(edges)
+        leaving = np.unique(labels[rows][labels[rows] != labels[cols]])
+        closed = ~np.isin(labels, leaving)
+
+        entering = np.zeros(size)
+        if closed[start]:
+            entering[start] = 1
+        else:
+            # expected visits of the transient nodes, then the probability to enter each closed node
+            transient = np.flatnonzero(~closed)
+            source = (transient == start).astype(float)
+            visits = np.linalg.solve(
+                (np.eye(len(transient)) - matrix[np.ix_(transient, transient)]).T, source
+            )
+            entering[closed] = visits @ matrix[np.ix_(transient, np.flatnonzero(closed))]
+
+        distribution = np.zeros(size)
+        for label in np.unique(labels[closed & (entering > 0)]):
+            members = np.flatnonzero(labels == label)
+            # pi = pi @ matrix within the class, with pi summing to 1
+            system = np.vstack(
+                [matrix[np.ix_(members, members)].T - np.eye(len(members)), np.ones(len(members))]
+            )
+            target = np.zeros(len(members) + 1)
+            target[-1] = 1
+            stationary = np.linalg.lstsq(system, target, rcond=None)[0]
+            distribution[members] = entering[members].sum() * stationary
+        return distribution
 
     def score(
         self,
@@ -195,55 +275,178 @@ class RandomWalkScorer(Scorer):
         if not scores:
             return scores
 
-        matrix = self.generate_transition_matrix(graph=graph, data=data, scores=scores)
-        if isinstance(self._num_loop, int):
-            num_loop = self._num_loop
+        matrix = self.transition_probabilities(graph=graph, data=data, scores=scores)
+        start = list(scores.keys()).index(data.sli)
+        if self._method == "stationary":
+            pagerank = self.stationary_distribution(matrix, start)
         else:
-            num_loop = self._num_loop(len(scores))
-
-        # print("==== matrix ===")
-        # print(matrix)
-        # print("==== end matrix ===")
-        counter = self._walk(start=data.sli, num_loop=num_loop, matrix=matrix)
-        # print(f"{num_loop=}")
-        # print(dict(counter))
+            if isinstance(self._num_loop, int):
+                num_loop = self._num_loop
+            else:
+                num_loop = self._num_loop(len(scores))
+            pagerank = self._walk(start=start, num_loop=num_loop, matrix=matrix) / num_loop
 
-        for node, score in scores.items():
-            score["pagerank"] = score.score = counter[node] / num_loop
+        for score, value in zip(scores.values(), pagerank.tolist()):
+            score["pagerank"] = score.score = value
         return scores
 
 
+def padded_rows(rows: np.ndarray, values: np.ndarray, num_rows: int, fill=0) -> np.ndarray:
+    """
+    (num_rows, widest row) array of the values of each row, from flat (row, value) pairs sorted by row
+    """
+    counts = np.bincount(rows, minlength=num_rows)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    output = np.full((num_rows, counts.max(initial=0)), fill, dtype=np.asarray(values).dtype)
+    output[rows, offsets] = values
+    return output
+
+
+class SecondOrderWalk:
+    """
+    Second-order random walk, whose next node depends on the previous and the current node
+
+    Only the transitions the walk can take are stored, as rows of candidate
+    nodes (padded with -1) and their weights. The state (previous, current)
+    moves with the row state_rows[k] when previous * num_nodes + current is
+    state_keys[k], and with default_rows[current] otherwise, so states
+    sharing their transitions share a row. A walker on a row without weight
+    stops.
+    """
+
+    def __init__(
+        self,
+        num_nodes: int,
+        candidates: np.ndarray,
+        weights: np.ndarray,
+        state_keys: np.ndarray,
+        state_rows: np.ndarray,
+        default_rows: np.ndarray,
+    ):
+        # pylint: disable=too-many-arguments
+        self.num_nodes = num_nodes
+        self.candidates = candidates
+        order = np.argsort(state_keys)
+        self.state_keys = state_keys[order]
+        self.state_rows = state_rows[order]
+        self.default_rows = default_rows
+
+        # as Generator.choice, on the weights normalized by their running sum
+        total = np.cumsum(weights, axis=1)[:, -1:] if weights.shape[1] else np.zeros((len(weights), 1))
+        self.stuck = total[:, 0] <= 0
+        probabilities = np.divide(weights, total, out=np.zeros_like(weights), where=~self.stuck[:, None])
+        self.cdf = np.cumsum(probabilities, axis=1)
+        self.cdf /= np.where(self.stuck[:, None], 1, self.cdf[:, -1:])
+        self.cdf[candidates < 0] = np.inf
+
+    def rows(self, previous: np.ndarray, current: np.ndarray) -> np.ndarray:
+        """
+        Row of the transitions of each (previous, current) state
+        """
+        if len(self.state_keys) == 0:
+            return self.default_rows[current]
+        keys = previous * self.num_nodes + current
+        index = np.minimum(np.searchsorted(self.state_keys, keys), len(self.state_keys) - 1)
+        found = self.state_keys[index] == keys
+        return np.where(found, self.state_rows[index], self.default_rows[current])
+
+    def walk(
+        self,
+        previous: np.ndarray,
+        current: np.ndarray,
+        num_steps: int,
+        rng: np.random.Generator,
+        num_visits: int = None,
+        trace: bool = False,
+    ):
+        """
+        Move walkers from their (previous, current) states for num_steps steps in lock-step
+
+        num_visits: stop after that many moves in total, the first walkers
+                moving last
+        Return the number of visits of each node, and with trace the (steps,
+        walkers) visited nodes, -1 once a walker stopped.
+        """
+        # pylint: disable=too-many-arguments
+        previous, current = np.array(previous), np.array(current)
+        counts = np.zeros(self.num_nodes, dtype=np.int64)
+        path = np.full((num_steps, len(current)), -1, dtype=np.int64) if trace else None
+        walkers = np.arange(len(current))
+        for step in range(num_steps):
+            if num_visits is not None:
+                walkers, previous, current = (
+                    array[: num_visits - counts.sum()] for array in (walkers, previous, current)
+                )
+            rows = self.rows(previous, current)
+            moving = ~self.stuck[rows]
+            walkers, previous, rows = walkers[moving], current[moving], rows[moving]
+            if len(walkers) == 0:
+                break
+            samples = rng.random(len(walkers))
+            current = self.candidates[rows, (self.cdf[rows] <= samples[:, None]).sum(axis=1)]
+            counts += np.bincount(current, minlength=self.num_nodes)
+            if trace:
+                path[step, walkers] = current
+        return counts, path
+
+
 class SecondOrderRandomWalkScorer(RandomWalkScorer):
     """
     Scorer based on second-order random walk
+
+    From previous to current, the walk moves to each node with a positive
+    first-order transition probability from current, weighted by
+    (1 - beta) * probability(previous, current) + beta * probability(current, next).
     """
 
     def __init__(self, beta: float = 0.5, **kwargs):
         super().__init__(**kwargs)
+        if self._method != "sample":
+            raise ValueError("the second-order walk can only be sampled")
         self._beta = beta
 
-    def _walk(self, start: Node, num_loop: int, matrix: pd.DataFrame) -> Dict[Node, int]:
-        node: Node = start
-        node_pre: Node = start
-        counter = defaultdict(int)
-        for _ in range(num_loop):
-            prob_pre = matrix[node_pre][node]
-            node_pre = node
-
-            candidates: List[Node] = []
-            weights: List[float] = []
-            # for key, value in matrix[node].iteritems():
-            for key, value in matrix[node].items():
-                if value > 0:
-                    candidates.append(key)
-                    weights.append((1 - self._beta) * prob_pre + self._beta * value)
-            total_weight = sum(weights)
-            if total_weight == 0:
-                node = self._rng.choice(candidates)
-            else:
-                node = self._rng.choice(candidates, p=[weight / total_weight for weight in weights])
-            counter[node] += 1
-        return counter
+    def second_order_walk(self, matrix: np.ndarray) -> SecondOrderWalk:
+        """
+        The second-order walk on first-order transition probabilities
+        """
+        size = len(matrix)
+        nodes, next_nodes = np.nonzero(matrix > 0)
+        candidates = padded_rows(nodes, next_nodes, size, fill=-1)
+
+        # the weights only depend on probability(previous, current): one row
+        # per (current, probability), and one per current for the others
+        previous, current = nodes, next_nodes
+        row_keys, state_rows = np.unique(
+            np.rec.fromarrays([current, matrix[previous, current]]), return_inverse=True
+        )
+        row_current = np.concatenate([row_keys.f0, np.arange(size)])
+        row_values = np.concatenate([row_keys.f1, np.zeros(size)])
+
+        candidates = candidates[row_current]
+        valid = candidates >= 0
+        weights = (1 - self._beta) * row_values[:, None] + self._beta * matrix[
+            row_current[:, None], np.where(valid, candidates, 0)
+        ]
+        weights[~valid] = 0
+        # without any weight, the walk picks a candidate uniformly
+        no_weight = weights.sum(axis=1) == 0
+        weights[no_weight] = valid[no_weight]
+
+        return SecondOrderWalk(
+            size,
+            candidates,
+            weights,
+            previous * size + current,
+            state_rows.astype(np.int64),
+            len(row_keys) + np.arange(size),
+        )
+
+    def _walk(self, start: int, num_loop: int, matrix: np.ndarray) -> np.ndarray:
+        walk = self.second_order_walk(matrix)
+        starts = np.full(self._num_walkers, start)
+        num_steps = -(-num_loop // self._num_walkers)
+        counts, _ = walk.walk(starts, starts, num_steps, self._rng, num_visits=num_loop)
+        return counts
 
 
 def random_walk(
@@ -252,10 +455,14 @@ def random_walk(
     sli: Node = None,
     num_loop=None,
     previous_scores=None,
+    num_walkers: int = 1,
+    method: str = "sample",
+    seed: int = 0,
 ):
     """
     adj: np.ndarray
     node_names:
+    num_walkers, method, seed: see RandomWalkScorer
     """
     if node_names is None:
         node_names = [f"X{i}" for i in range(len(adj))]
@@ -265,33 +472,8 @@ def random_walk(
     graph = nx.DiGraph()
 
     # convert adj to edges
-    node_num = len(adj)
-    for a in range(node_num):
-        for b in range(node_num):
-            # case 1 no edge: a b
-            if adj[a, b] == adj[b, a] == 0:
-                pass
-            # case 2 undirected a -- b
-            elif adj[a, b] == adj[b, a] == -1:
-                # eck eck, what should we do???
-                # afaik, RW doesn't care about direction?
-                # just add an edge
-                graph.add_edge(nodes[b], nodes[a])
-            # case 3 directed a->b
-            elif adj[a, b] == 1 and adj[b, a] == -1:
-                graph.add_edge(nodes[b], nodes[a])
-            # case 4 directed b->a
-            elif adj[a, b] == -1 and adj[b, a] == 1:
-                graph.add_edge(nodes[a], nodes[b])
-            elif adj[a, b] == 0 and adj[b, a] == 1:
-                graph.add_edge(nodes[a], nodes[b])
-            elif adj[a, b] == 1 and adj[b, a] == 0:
-                graph.add_edge(nodes[b], nodes[a])
-            elif adj[a, b] == 1 and adj[b, a] == 1:
-                graph.add_edge(nodes[a], nodes[b])
-                graph.add_edge(nodes[b], nodes[a])
-            else:
-                raise ValueError(f"Unexpected value: {adj[a, b]}, {adj[b, a]}")
+    sources, targets = decode_edges(adj, RANDOM_WALK_CASES)
+    graph.add_edges_from((nodes[a], nodes[b]) for a, b in zip(sources, targets))
 
     graph = graph.reverse()
     mem_graph = MemoryGraph(graph)
@@ -308,7 +490,7 @@ def random_walk(
         scores = {node: Score(previous_scores[node.entity]) for node in nodes}
 
     # init the scorer
-    rw = RandomWalkScorer(num_loop=num_loop)
+    rw = RandomWalkScorer(num_loop=num_loop, num_walkers=num_walkers, method=method, seed=seed)
 
     # run the scorer
     scores = rw.score(mem_graph, data, current=0, scores=scores)
@@ -327,7 +509,12 @@ def second_order_random_walk(
     sli: Node = None,
     num_loop=None,
     previous_scores=None,
+    num_walkers: int = 1,
+    seed: int = 0,
 ):
+    """
+    num_walkers, seed: see RandomWalkScorer
+    """
     if node_names is None:
         node_names = [f"X{i}" for i in range(len(adj))]
 
@@ -336,34 +523,8 @@ def second_order_random_walk(
     graph = nx.DiGraph()
 
     # convert adj to edges
-    node_num = len(adj)
-    for a in range(node_num):
-        for b in range(node_num):
-            # case 1 no edge: a b
-            if adj[a, b] == adj[b, a] == 0:
-                pass
-            # case 2 undirected a -- b
-            elif adj[a, b] == adj[b, a] == -1:
-                # eck eck, what should we do???
-                # afaik, RW doesn't care about direction?
-                # just add an edge
-                graph.add_edge(nodes[b], nodes[a])
-            # case 3 directed a->b
-            elif adj[a, b] == 1 and adj[b, a] == -1:
-                graph.add_edge(nodes[b], nodes[a])
-            # case 4 directed b->a
-            elif adj[a, b] == -1 and adj[b, a] == 1:
-                graph.add_edge(nodes[a], nodes[b])
-            # elif adj[a, b] == 0 and adj[b, a] == 1:
-            #     # already ok
-            #     pr_input[a, b] = 0
-            #     pr_input[b, a] = 1
-            # elif adj[a, b] == 1 and adj[b, a] == 0:
-            #     # already ok
-            #     pr_input[a, b] = 1
-            #     pr_input[b, a] = 0
-            else:
-                raise ValueError(f"Unexpected value: {adj[a, b]}, {adj[b, a]}")
+    sources, targets = decode_edges(adj, CPDAG_CASES)
+    graph.add_edges_from((nodes[a], nodes[b]) for a, b in zip(sources, targets))
 
     graph = graph.reverse()
     mem_graph = MemoryGraph(graph)
@@ -380,7 +541,7 @@ def second_order_random_walk(
         scores = {node: Score(previous_scores[node.entity]) for node in nodes}
 
     # init the scorer
-    rw = SecondOrderRandomWalkScorer(num_loop=num_loop)
+    rw = SecondOrderRandomWalkScorer(num_loop=num_loop, num_walkers=num_walkers, seed=seed)
 
     # run the scorer
     scores = rw.score(mem_graph, data, current=0, scores=scores)
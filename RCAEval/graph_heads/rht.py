@@ -3,6 +3,8 @@ Causal Inference-based Root Cause Analysis (CIRCA)
 """
 import logging
 from abc import ABC
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from typing import Callable, Dict, Sequence, Tuple
 
@@ -14,8 +16,9 @@ from sklearn.linear_model import LinearRegression
 from sklearn.linear_model._base import LinearModel
 from sklearn.preprocessing import StandardScaler
 
-from RCAEval.classes.data import CaseData, MemoryDataLoader
+from RCAEval.classes.data import ArrayDataLoader, CaseData
 from RCAEval.classes.graph import Graph, MemoryGraph, Node
+from RCAEval.graph_heads import CPDAG_CASES, decode_edges
 from RCAEval.graph_heads.random_walk import Score, Scorer
 
 
@@ -28,6 +31,24 @@ def zscore(train_y: np.ndarray, test_y: np.ndarray) -> np.ndarray:
     return scaler.transform(test_y.reshape(-1, 1))[:, 0]
 
 
+def batch_zscore(train_y: np.ndarray, test_y: np.ndarray) -> np.ndarray:
+    """
+    zscore of each row of test_y against the same row of train_y
+
+    As StandardScaler, NaN are left out of the statistics, and rows whose
+    train values are indistinguishable from a constant are only centered.
+    """
+    observed = ~np.isnan(train_y)
+    num_samples = observed.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(observed, train_y, 0).sum(axis=1, keepdims=True) / num_samples
+        var = np.where(observed, (train_y - mean) ** 2, 0).sum(axis=1, keepdims=True) / num_samples
+    # sklearn.preprocessing._data._is_constant_feature
+    eps = np.finfo(np.float64).eps
+    constant = var <= num_samples * eps * var + (num_samples * mean * eps) ** 2
+    return (test_y - mean) / np.where(constant, 1, np.sqrt(var))
+
+
 def zscore_conf(score: float) -> float:
     """
     Convert z-score into confidence about the hypothesis the score is abnormal
@@ -123,6 +144,26 @@ class Regressor(ABC):
             self._logger.warning(err, exc_info=True)
             return self._zscore(train_y=train_y, test_y=test_y)
 
+    def score_batch(
+        self,
+        train_x: np.ndarray,
+        test_x: np.ndarray,
+        train_y: np.ndarray,
+        test_y: np.ndarray,
+    ) -> np.ndarray:
+        """
+        score of a batch of regressions sharing their shapes
+
+        train_x: (batch, train, features) and train_y: (batch, train), same for test
+        Return the (batch, test) z-scores.
+        """
+        return np.array(
+            [
+                self.score(train_x=x, test_x=x_test, train_y=y, test_y=y_test)
+                for x, x_test, y, y_test in zip(train_x, test_x, train_y, test_y)
+            ]
+        ).reshape(test_y.shape)
+
 
 class ANMRegressor(Regressor):
     """
@@ -146,12 +187,66 @@ class ANMRegressor(Regressor):
         test_err: np.ndarray = test_y - self._regressor.predict(test_x)
         return self._zscore(train_y=train_err, test_y=test_err)
 
+    @property
+    def _ordinary_least_squares(self) -> bool:
+        regressor = self._regressor
+        return (
+            type(regressor) is LinearRegression  # pylint: disable=unidiomatic-typecheck
+            and regressor.fit_intercept
+            and not regressor.positive
+        )
+
+    def score_batch(
+        self,
+        train_x: np.ndarray,
+        test_x: np.ndarray,
+        train_y: np.ndarray,
+        test_y: np.ndarray,
+    ) -> np.ndarray:
+        """
+        score of a batch of regressions, with one batched SVD for LinearRegression
+
+        Batches with non finite values go through score, which logs sklearn's error.
+        """
+        finite = np.ones(len(train_y), dtype=bool)
+        for values in (train_x, test_x, train_y, test_y):
+            finite &= np.isfinite(values.reshape(len(values), -1)).all(axis=1)
+        if not self._ordinary_least_squares or train_x.shape[2] == 0 or not finite.any():
+            return super().score_batch(train_x, test_x, train_y, test_y)
+
+        z_scores = np.empty(test_y.shape)
+        if not finite.all():
+            z_scores[~finite] = super().score_batch(
+                train_x[~finite], test_x[~finite], train_y[~finite], test_y[~finite]
+            )
+        train_x, test_x, train_y, test_y = (
+            values[finite] for values in (train_x, test_x, train_y, test_y)
+        )
+
+        # as LinearRegression: least squares on the centered data, with the
+        # singular values below eps times the largest dropped as scipy lstsq
+        x_offset = train_x.mean(axis=1, keepdims=True)
+        y_offset = train_y.mean(axis=1, keepdims=True)
+        u, s, vt = np.linalg.svd(train_x - x_offset, full_matrices=False)
+        keep = s > np.finfo(np.float64).eps * s[:, :1]
+        inverse = np.divide(1, s, out=np.zeros_like(s), where=keep)
+        projected = np.einsum("btk,bt->bk", u, train_y - y_offset)
+        coef = np.einsum("bkf,bk->bf", vt, inverse * projected)
+
+        train_err = train_y - y_offset - np.einsum("btf,bf->bt", train_x - x_offset, coef)
+        test_err = test_y - y_offset - np.einsum("btf,bf->bt", test_x - x_offset, coef)
+        z_scores[finite] = batch_zscore(train_err, test_err)
+        return z_scores
+
 
 class RHTScorer(DecomposableScorer):
     """
     Scorer with regression-based hypothesis testing
     """
 
+    # nodes per regression batch, bounding the memory of the lagged parents
+    batch_size = 256
+
     def __init__(
         self,
         tau_max: int = 0,
@@ -216,6 +311,9 @@ class RHTScorer(DecomposableScorer):
         z_scores = self._regressor.score(
             train_x=train_x, test_x=test_x, train_y=train_y, test_y=test_y
         )
+        return self._node_score(z_scores)
+
+    def _node_score(self, z_scores: np.ndarray) -> Score:
         z_score = self._aggregator(abs(z_scores))
         confidence = zscore_conf(z_score)
         if self._use_confidence:
@@ -228,6 +326,94 @@ class RHTScorer(DecomposableScorer):
 
         return score
 
+    def _score_group(self, values, columns, parents, case_data: CaseData) -> np.ndarray:
+        """
+        z-scores of the nodes in columns, each with the same number of parents
+
+        values: (time, series) array, columns: (nodes,) and parents: (nodes,
+        parents) indices of its series
+        """
+        length = len(values)
+        train_window = case_data.train_window - self._tau_max
+        # split_data, with the lags of all the nodes at once
+        series_x = np.concatenate(
+            [values[self._tau_max - i : length - i][:, parents] for i in range(self._tau_max + 1)],
+            axis=2,
+        ).transpose(1, 0, 2)
+        series_y = values[self._tau_max :, columns].T
+        train_y, test_y = series_y[:, :train_window], series_y[:, -case_data.test_window :]
+        if parents.shape[1] == 0:
+            return batch_zscore(train_y, test_y)
+        return self._regressor.score_batch(
+            train_x=series_x[:, :train_window],
+            test_x=series_x[:, -case_data.test_window :],
+            train_y=train_y,
+            test_y=test_y,
+        )
+
+    def _score(
+        self,
+        candidates: Sequence[Node],
+        series: Dict[Node, Sequence[float]],
+        graph: Graph,
+        data: CaseData,
+    ):
+        """
+        Score the nodes grouped by their number of parents, one regression batch per group
+
+        Nodes whose series do not all share the common length go through
+        score_node. With max_workers > 1, the batches run on a thread pool,
+        as numpy releases the GIL in LAPACK.
+        """
+        lengths = [len(values) for values in series.values()]
+        length = max(set(lengths), key=lengths.count, default=0)
+        index = {node: i for i, node in enumerate(series)}
+        aligned = {node for node, size in zip(series, lengths) if size == length}
+        batchable = length > self._tau_max and data.train_window > self._tau_max
+
+        groups = defaultdict(list)
+        for node in candidates:
+            parents = [parent for parent in graph.parents(node) if parent in series]
+            if batchable and node in aligned and aligned.issuperset(parents):
+                groups[len(parents)].append((node, [index[parent] for parent in parents]))
+
+        values = np.array(
+            [values if node in aligned else np.zeros(length) for node, values in series.items()],
+            dtype=float,
+        ).T.reshape(length, len(series))
+        tasks = []
+        for members in groups.values():
+            num_chunks = max(-(-len(members) // self.batch_size), min(self._max_workers, len(members)))
+            for chunk in np.array_split(np.arange(len(members)), num_chunks):
+                nodes = [members[i][0] for i in chunk]
+                columns = np.array([index[node] for node in nodes])
+                parents = np.array([members[i][1] for i in chunk], dtype=int)
+                parents = parents.reshape(len(chunk), -1)
+                tasks.append((nodes, columns, parents))
+
+        def run(task):
+            nodes, columns, parents = task
+            return nodes, self._score_group(values, columns, parents, data)
+
+        z_scores: Dict[Node, np.ndarray] = {}
+        if self._max_workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(self._max_workers) as executor:
+                batches = list(executor.map(run, tasks))
+        else:
+            batches = [run(task) for task in tasks]
+        for nodes, batch in batches:
+            z_scores.update(zip(nodes, batch))
+
+        results: Dict[Node, Score] = {}
+        for node in candidates:
+            if node in z_scores:
+                score = self._node_score(z_scores[node])
+            else:
+                score = self.score_node(graph, series, node, data)
+            if score is not None:
+                results[node] = score
+        return results
+
 
 class DAScorer(Scorer):
     """
@@ -309,34 +495,8 @@ def rht(
     graph = nx.DiGraph()
 
     # convert adj to edges
-    node_num = len(adj)
-    for a in range(node_num):
-        for b in range(node_num):
-            # case 1 no edge: a b
-            if adj[a, b] == adj[b, a] == 0:
-                pass
-            # case 2 undirected a -- b
-            elif adj[a, b] == adj[b, a] == -1:
-                # eck eck, what should we do???
-                # afaik, RW doesn't care about direction?
-                # just add an edge
-                graph.add_edge(nodes[b], nodes[a])
-            # case 3 directed a->b
-            elif adj[a, b] == 1 and adj[b, a] == -1:
-                graph.add_edge(nodes[b], nodes[a])
-            # case 4 directed b->a
-            elif adj[a, b] == -1 and adj[b, a] == 1:
-                graph.add_edge(nodes[a], nodes[b])
-            # elif adj[a, b] == 0 and adj[b, a] == 1:
-            #     # already ok
-            #     pr_input[a, b] = 0
-            #     pr_input[b, a] = 1
-            # elif adj[a, b] == 1 and adj[b, a] == 0:
-            #     # already ok
-            #     pr_input[a, b] = 1
-            #     pr_input[b, a] = 0
-            else:
-                raise ValueError(f"Unexpected value: {adj[a, b]}, {adj[b, a]}")
+    sources, targets = decode_edges(adj, CPDAG_CASES)
+    graph.add_edges_from((nodes[a], nodes[b]) for a, b in zip(sources, targets))
 
     graph = graph.reverse()
     mem_graph = MemoryGraph(graph)
@@ -345,21 +505,11 @@ def rht(
     scorer = RHTScorer()
     scores: Dict[Node, Score] = None
 
-    timestamps = data["time"]
     sli = np.random.choice(nodes)
-    services = list(set([c.split("_")[0] for c in data.columns if c != "time"]))
-    metrics = list(set([c.split("_")[1] for c in data.columns if c != "time"]))
-    out_data = {s: {} for s in services}
-    for s in services:
-        for m in metrics:
-            try:
-                out_data[s][m] = list(zip(timestamps, data[f"{s}_{m}"]))
-            except Exception:
-                pass
-    mem_data_loader = MemoryDataLoader(out_data)
+    data_loader = ArrayDataLoader.from_frame(data, time_col="time")
 
     data = CaseData(
-        data_loader=mem_data_loader, sli=sli, detect_time=inject_time, interval=timedelta(seconds=1)
+        data_loader=data_loader, sli=sli, detect_time=inject_time, interval=timedelta(seconds=1)
     )
 
     scores = scorer.score(graph=mem_graph, data=data, current=inject_time + 300, scores=scores)
@@ -0,0 +1,175 @@
+"""
+Catalog of the cases in a dataset directory
+
+The catalog is built once per dataset directory and stores, for each case, its
+service, fault, inject time, file paths, columns, row count and time range in
+catalog.json. The case matrices are appended into a single float64 file,
+catalog.bin, in column-major order. Each case records its offset, so any
+process can memory map the file and open a case zero-copy instead of parsing
+its CSV again.
+"""
+import glob
+import os
+from os.path import basename, dirname, join, relpath
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from RCAEval.io.columnar import read_csv
+from RCAEval.utility import dump_json, load_json
+
+CATALOG_NAME = "catalog.json"
+MATRIX_NAME = "catalog.bin"
+
+
+def find_case_paths(dataset_dir: str) -> List[str]:
+    """
+    Find the metric CSV of each case, as main.py does
+    """
+    for name in ["data.csv", "simple_metrics.csv"]:
+        paths = glob.glob(join(dataset_dir, "**", name), recursive=True)
+        if paths:
+            return sorted(paths)
+    return []
+
+
+def _source_stat(dataset_dir: str, data_paths: List[str]) -> List[list]:
+    stat = []
+    for data_path in data_paths:
+        inject_path = join(dirname(data_path), "inject_time.txt")
+        stat.append(
+            [
+                relpath(data_path, dataset_dir),
+                os.path.getsize(data_path),
+                os.path.getmtime(data_path),
+                os.path.getmtime(inject_path) if os.path.exists(inject_path) else None,
+            ]
+        )
+    return stat
+
+
+def build_catalog(dataset_dir: str, force: bool = False) -> "Catalog":
+    """
+    Build the catalog of a dataset directory, unless an up-to-date one exists
+    """
+    data_paths = find_case_paths(dataset_dir)
+    source = _source_stat(dataset_dir, data_paths)
+    catalog_path = join(dataset_dir, CATALOG_NAME)
+    if not force and os.path.exists(catalog_path):
+        if load_json(catalog_path).get("source") == source:
+            return Catalog(dataset_dir)
+
+    cases = []
+    offset = 0
+    tmp_matrix_path = join(dataset_dir, f"{MATRIX_NAME}.{os.getpid()}.tmp")
+    with open(tmp_matrix_path, "wb") as matrix_file:
+        for data_path in data_paths:
+            data_dir = dirname(data_path)
+            service, fault = basename(dirname(data_dir)).split("_")[:2]
+            case = basename(data_dir)
+
+            inject_time = None
+            inject_path = join(data_dir, "inject_time.txt")
+            if os.path.exists(inject_path):
+                with open(inject_path) as f:
+                    inject_time = int(f.readlines()[0].strip())
+
+            data = read_csv(data_path)
+            values = np.asfortranarray(data.to_numpy(dtype=np.float64))
+            matrix_file.write(values.tobytes(order="F"))
+
+            cases.append(
+                {
+                    "id": f"{service}_{fault}_{case}",
+                    "service": service,
+                    "fault": fault,
+                    "case": case,
+                    "inject_time": inject_time,
+                    "data_path": relpath(data_path, dataset_dir),
+                    "inject_time_path": relpath(inject_path, dataset_dir),
+                    "columns": data.columns.to_list(),
+                    "int_columns": [c for c in data.columns if data[c].dtype.kind in "iu"],
+                    "rows": len(data),
+                    "time_start": data["time"].min().item() if "time" in data and len(data) else None,
+                    "time_end": data["time"].max().item() if "time" in data and len(data) else None,
+                    "offset": offset,
+                }
+            )
+            offset += values.size
+
+    os.replace(tmp_matrix_path, join(dataset_dir, MATRIX_NAME))
+    dump_json(filename=catalog_path, data={"source": source, "cases": cases})
+    return Catalog(dataset_dir)
+
+
+class Catalog:
+    """
+    Read access to a built catalog
+
+    The matrix file is memory mapped on first use, so a catalog created before
+    forking workers costs nothing until a case is opened.
+    """
+
+    def __init__(self, dataset_dir: str):
+        self._dataset_dir = dataset_dir
+        self._cases: List[Dict] = load_json(join(dataset_dir, CATALOG_NAME))["cases"]
+        self._by_id = {case["id"]: case for case in self._cases}
+        self._by_path = {
+            os.path.normpath(join(dataset_dir, case["data_path"])): case for case in self._cases
+        }
+        self._matrix: np.memmap = None
+
+    @property
+    def cases(self) -> List[Dict]:
+        """
+        Entries of all cases
+        """
+        return self._cases
+
+    def __len__(self) -> int:
+        return len(self._cases)
+
+    def __iter__(self):
+        return iter(self._cases)
+
+    def data_path(self, case: Union[str, Dict]) -> str:
+        """
+        Path to the CSV a case was built from
+        """
+        return join(self._dataset_dir, self.entry(case)["data_path"])
+
+    def entry(self, case: Union[str, Dict]) -> Dict:
+        """
+        Look a case up by its id or the path to its CSV
+        """
+        if isinstance(case, dict):
+            return case
+        if case in self._by_id:
+            return self._by_id[case]
+        return self._by_path[os.path.normpath(case)]
+
+    def matrix(self, case: Union[str, Dict]) -> np.ndarray:
+        """
+        Zero-copy, read-only (rows, columns) view of a case
+        """
+        entry = self.entry(case)
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                join(self._dataset_dir, MATRIX_NAME), dtype=np.float64, mode="r"
+            )
+        size = entry["rows"] * len(entry["columns"])
+        flat = self._matrix[entry["offset"] : entry["offset"] + size]
+        return flat.reshape((entry["rows"], len(entry["columns"])), order="F")
+
+    def load(self, case: Union[str, Dict]) -> pd.DataFrame:
+        """
+        Load a case as a frame backed by the memory map
+
+        Only integer columns (e.g., time) are copied to restore their dtype.
+        """
+        entry = self.entry(case)
+        data = pd.DataFrame(self.matrix(entry), columns=entry["columns"], copy=False)
+        for col in entry["int_columns"]:
+            data[col] = data[col].astype(np.int64)
+        return data
@@ -0,0 +1,263 @@
+"""
+Columnar on-disk cache of the dataset CSVs
+
+A CSV such as data.csv is converted once into data.npy, a float64 matrix in
+column-major order, plus data.columns.json with the column names. Loading it
+back is a single read instead of a full CSV parse. float64 keeps the values
+(including unix timestamps) exact, and integer columns are restored as int64.
+"""
+import glob
+import os
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from RCAEval.utility import dump_json, load_json
+
+CSV_NAMES = ["data.csv", "simple_data.csv", "simple_metrics.csv"]
+
+
+def cache_paths(csv_path: str) -> Tuple[str, str]:
+    """
+    Return the (matrix, metadata) cache paths of a CSV
+    """
+    root, _ = os.path.splitext(csv_path)
+    return f"{root}.npy", f"{root}.columns.json"
+
+
+def is_cache_fresh(csv_path: str) -> bool:
+    """
+    Whether the cache of a CSV exists and is newer than the CSV
+    """
+    npy_path, meta_path = cache_paths(csv_path)
+    if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+        return False
+    csv_mtime = os.path.getmtime(csv_path)
+    return os.path.getmtime(npy_path) >= csv_mtime and os.path.getmtime(meta_path) >= csv_mtime
+
+
+def convert_csv(csv_path: str, force: bool = False) -> bool:
+    """
+    Convert a CSV into its columnar cache
+
+    Return whether the cache is usable, i.e., it is fresh or has been written.
+    CSVs with non-numeric columns (e.g., traces and logs) are not cached.
+    """
+    if not force and is_cache_fresh(csv_path):
+        return True
+
+    data = pd.read_csv(csv_path)
+    if not all(dtype.kind in "iuf" for dtype in data.dtypes):
+        return False
+
+    npy_path, meta_path = cache_paths(csv_path)
+    meta = {
+        "columns": data.columns.to_list(),
+        "int_columns": [c for c in data.columns if data[c].dtype.kind in "iu"],
+        "rows": len(data),
+    }
+
+    # write then rename so readers never see a half written cache
+    tmp_npy_path = f"{npy_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_npy_path, np.asfortranarray(data.to_numpy(dtype=np.float64)))
+    os.replace(tmp_npy_path, npy_path)
+    tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+    dump_json(filename=tmp_meta_path, data=meta)
+    os.replace(tmp_meta_path, meta_path)
+    return True
+
+
+def convert_dataset(dataset_dir: str, names: List[str] = None, force: bool = False) -> int:
+    """
+    Convert the metric CSVs of all cases in a dataset directory
+
+    Return the number of usable caches.
+    """
+    names = CSV_NAMES if names is None else names
+    num_cached = 0
+    for name in names:
+        for csv_path in sorted(glob.glob(os.path.join(dataset_dir, "**", name), recursive=True)):
+            num_cached += int(convert_csv(csv_path, force=force))
+    return num_cached
+
+
+def read_cache(csv_path: str, mmap: bool = False) -> pd.DataFrame:
+    """
+    Read the columnar cache of a CSV
+
+    mmap: back the frame with a read-only memory map instead of loading it
+    """
+    npy_path, meta_path = cache_paths(csv_path)
+    meta = load_json(meta_path)
+    values = np.load(npy_path, mmap_mode="r" if mmap else None)
+    data = pd.DataFrame(values, columns=meta["columns"], copy=False)
+    for col in meta["int_columns"]:
+        data[col] = data[col].astype(np.int64)
+    return data
+
+
+def read_csv(csv_path: str, mmap: bool = False) -> pd.DataFrame:
+    """
+    Drop-in for pd.read_csv(csv_path) that reads the columnar cache when it is fresh
+    """
+    if is_cache_fresh(csv_path):
+        return read_cache(csv_path, mmap=mmap)
+    return pd.read_csv(csv_path)
+
+
+def _project(columns: List[str], drop_suffixes: Sequence[str], usecols: Callable[[str], bool]):
+    return [
+        c
+        for c in columns
+        if not any(c.endswith(suffix) for suffix in drop_suffixes) and (usecols is None or usecols(c))
+    ]
+
+
+def _fill(window: pd.DataFrame, carry: pd.Series) -> pd.DataFrame:
+    """
+    Replace inf by nan, forward fill starting from carry, then fill the rest with 0
+
+    carry holds the last finite value of each column before the window, so the
+    result matches filling the whole case before slicing the window out.
+    """
+    int_dtypes = {c: t for c, t in window.dtypes.items() if t.kind in "iu"}
+    window = window.replace([np.inf, -np.inf], np.nan)
+    if carry is not None and window.shape[0] > 0 and window.iloc[0].isna().any():
+        window = pd.concat([carry.to_frame().T, window], ignore_index=True).ffill().iloc[1:]
+    else:
+        window = window.ffill()
+    return window.fillna(0).astype(int_dtypes).reset_index(drop=True)
+
+
+def slice_window(data: pd.DataFrame, inject_time: int, before: int, after: int) -> pd.DataFrame:
+    """
+    Fill a whole case and keep `before` rows before inject_time and `after` rows from it
+    """
+    data = data.replace([np.inf, -np.inf], np.nan).ffill().fillna(0)
+    normal_df = data[data["time"] < inject_time].tail(before)
+    anomal_df = data[data["time"] >= inject_time].head(after)
+    return pd.concat([normal_df, anomal_df], ignore_index=True)
+
+
+def _load_matrix_window(
+    matrix: np.ndarray,
+    columns: List[str],
+    int_columns: List[str],
+    inject_time: int,
+    before: int,
+    after: int,
+    drop_suffixes: Sequence[str],
+    usecols: Callable[[str], bool],
+) -> pd.DataFrame:
+    selected = _project(columns, drop_suffixes, usecols)
+    index = [columns.index(c) for c in selected]
+    time = np.asarray(matrix[:, columns.index("time")])
+
+    if np.any(time[1:] < time[:-1]):
+        # unsorted time, the window is not a row range
+        data = pd.DataFrame(matrix[:, index], columns=selected)
+        window = slice_window(data, inject_time, before, after)
+    else:
+        split = int(np.searchsorted(time, inject_time, side="left"))
+        start, stop = max(split - before, 0), min(split + after, len(time))
+        window = pd.DataFrame(np.array(matrix[start:stop, index]), columns=selected)
+
+        carry = None
+        if 0 < start < stop:
+            carry = pd.Series(np.nan, index=selected)
+            for i, col in enumerate(window.columns):
+                if np.isfinite(window.iat[0, i]):
+                    continue
+                # look back for the value ffill would carry into the window
+                previous = np.asarray(matrix[:start, index[i]])
+                valid = np.flatnonzero(np.isfinite(previous))
+                if len(valid) > 0:
+                    carry[col] = previous[valid[-1]]
+        window = _fill(window, carry)
+
+    for col in int_columns:
+        if col in window:
+            window[col] = window[col].astype(np.int64)
+    return window
+
+
+def _scan_csv_window(
+    csv_path: str,
+    inject_time: int,
+    before: int,
+    after: int,
+    drop_suffixes: Sequence[str],
+    usecols: Callable[[str], bool],
+    chunksize: int,
+) -> pd.DataFrame:
+    selected = _project(pd.read_csv(csv_path, nrows=0).columns.to_list(), drop_suffixes, usecols)
+
+    normal_df = None
+    anomal_df = None
+    carry = pd.Series(np.nan, index=selected)
+    last_time = -np.inf
+    for chunk in pd.read_csv(csv_path, usecols=selected, chunksize=chunksize):
+        chunk = chunk[selected]
+        time = chunk["time"].to_numpy()
+        if len(time) > 0 and (time[0] < last_time or np.any(time[1:] < time[:-1])):
+            # unsorted time, fall back to reading the whole case
+            data = pd.read_csv(csv_path, usecols=selected)[selected]
+            return slice_window(data, inject_time, before, after)
+        if len(time) > 0:
+            last_time = time[-1]
+
+        normal = chunk[chunk["time"] < inject_time]
+        normal_df = normal if normal_df is None else pd.concat([normal_df, normal])
+        if len(normal_df) > before:
+            # rows leaving the window only matter through what ffill carries out of them
+            evicted = normal_df.iloc[: len(normal_df) - before]
+            evicted = evicted.replace([np.inf, -np.inf], np.nan).ffill().iloc[-1]
+            carry = evicted.fillna(carry)
+            normal_df = normal_df.iloc[len(normal_df) - before :]
+
+        anomal = chunk[chunk["time"] >= inject_time]
+        anomal_df = anomal if anomal_df is None else pd.concat([anomal_df, anomal])
+        if len(anomal_df) >= after:
+            # time is sorted, no later row can fall into the window
+            break
+
+    window = pd.concat([normal_df, anomal_df.head(after)], ignore_index=True)
+    return _fill(window, carry)
+
+
+def load_case_window(
+    csv_path: str,
+    inject_time: int,
+    before: int,
+    after: int,
+    drop_suffixes: Sequence[str] = ("_latency-50",),
+    usecols: Callable[[str], bool] = None,
+    catalog=None,
+    chunksize: int = 10000,
+) -> pd.DataFrame:
+    """
+    Load only the analysis window of a case
+
+    It returns the same frame as reading the whole CSV, dropping the columns
+    ending with drop_suffixes (and those rejected by usecols), replacing inf by
+    nan, forward filling, filling the rest with 0, then concatenating the last
+    `before` rows before inject_time with the first `after` rows from it.
+
+    The rows are located with a binary search on the time column of the
+    catalog or the columnar cache, so only the window is read from them.
+    Otherwise the CSV is scanned in chunks and only the window is kept.
+    """
+    if catalog is not None:
+        entry = catalog.entry(csv_path)
+        matrix, columns, int_columns = catalog.matrix(entry), entry["columns"], entry["int_columns"]
+    elif is_cache_fresh(csv_path):
+        npy_path, meta_path = cache_paths(csv_path)
+        meta = load_json(meta_path)
+        matrix, columns, int_columns = np.load(npy_path, mmap_mode="r"), meta["columns"], meta["int_columns"]
+    else:
+        return _scan_csv_window(csv_path, inject_time, before, after, drop_suffixes, usecols, chunksize)
+
+    return _load_matrix_window(
+        matrix, columns, int_columns, inject_time, before, after, drop_suffixes, usecols
+    )
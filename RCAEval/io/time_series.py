@@ -1,12 +1,38 @@
+import numpy as np
 import pandas as pd
 
 
+def _is_numeric(df: pd.DataFrame) -> bool:
+    return all(dtype.kind in "iufb" for dtype in df.dtypes)
+
+
+def _changed(df: pd.DataFrame) -> np.ndarray:
+    # (rows, columns) mask of the values that differ from the first row, nan included
+    if not _is_numeric(df):
+        return (df != df.iloc[0]).to_numpy()
+    values = df.to_numpy()
+    return values != values[0]
+
+
+def _std(values: np.ndarray) -> np.ndarray:
+    # std of each column, with the same rounding as Series.std
+    values = np.ascontiguousarray(np.asarray(values, dtype=np.float64).T)
+    mask = np.isnan(values)
+    count = values.shape[1] - mask.sum(axis=1).astype(np.float64)
+    count[count <= 1] = np.nan
+    values = np.where(mask, 0, values)
+    avg = values.sum(axis=1, dtype=np.float64) / count
+    sqr = (avg[:, None] - values) ** 2
+    sqr[mask] = 0
+    return np.sqrt(sqr.sum(axis=1, dtype=np.float64) / (count - 1))
+
+
 def drop_constant(df: pd.DataFrame):
-    return df.loc[:, (df != df.iloc[0]).any()]
+    return df.loc[:, _changed(df).any(axis=0)]
 
 
 def drop_near_constant(df: pd.DataFrame, threshold: float = 0.1):
-    return df.loc[:, (df != df.iloc[0]).mean() > threshold]
+    return df.loc[:, _changed(df).mean(axis=0) > threshold]
 
 
 def drop_time(df: pd.DataFrame):
@@ -17,38 +43,48 @@ def drop_time(df: pd.DataFrame):
     return df
 
 
-def drop_extra(df: pd.DataFrame):
-    if "time.1" in df:
-        df = df.drop(columns=["time.1"])
+EXTRA_PREFIXES = (
+    "main_",
+    "PassthroughCluster_",
+    "redis_",
+    "rabbitmq",
+    "queue",
+    "session",
+    "istio-proxy",
+)
 
+
+def _is_extra(col: str) -> bool:
     # remove cols has "frontend-external" in name
     # remove cols start with "main_" or "PassthroughCluster_", etc.
-    for col in df.columns:
-        if (
-            "frontend-external" in col
-            or col.startswith("main_")
-            or col.startswith("PassthroughCluster_")
-            or col.startswith("redis_")
-            or col.startswith("rabbitmq")
-            or col.startswith("queue")
-            or col.startswith("session")
-            or col.startswith("istio-proxy")
-        ):
-            df = df.drop(columns=[col])
+    return col == "time.1" or "frontend-external" in col or col.startswith(EXTRA_PREFIXES)
+
+
+def drop_extra(df: pd.DataFrame):
+    return df.loc[:, [not _is_extra(c) for c in df.columns]]
+
 
+def _select(df: pd.DataFrame, index: list, mem: list) -> pd.DataFrame:
+    # df.iloc[:, index] with the columns at positions mem converted to MBs, in one copy
+    columns = df.columns[index]
+    if all(dtype == np.float64 for dtype in df.dtypes.iloc[index]):
+        values = df.iloc[:, index].to_numpy()
+        if mem:
+            values[:, mem] /= 1e6
+        return pd.DataFrame(values, index=df.index, columns=columns)
+
+    df = df.iloc[:, index]
+    for i in mem:
+        df.isetitem(i, df.iloc[:, i] / 1e6)
     return df
 
 
 def convert_mem_mb(df: pd.DataFrame):
     # Convert memory to MBs
-    def update_mem(x):
-        if not x.name.endswith("_mem"):
-            return x
-        x /= 1e6
-        # x = x.astype(int)
-        return x
-
-    return df.apply(update_mem)
+    if df.shape[0] == 0:
+        return df.copy()
+    mem = [i for i, c in enumerate(df.columns) if c.endswith("_mem")]
+    return _select(df, list(range(df.shape[1])), mem)
 
 
 def preprocess_sock_shop(df: pd.DataFrame):
@@ -62,7 +98,37 @@ def preprocess_sock_shop(df: pd.DataFrame):
     return df
 
 
+def _useful(columns: list, values: np.ndarray) -> list:
+    # positions of the columns select_useful_cols keeps, repeated as it repeats them
+    cpu_mem = [i for i, c in enumerate(columns) if c.endswith("_cpu") or c.endswith("_mem")]
+    # latency
+    # if ("lat50" in c or "latency" in c) and (data[c] * 1000).std() > 10:
+    lat = [i for i, c in enumerate(columns) if "lat50" in c]
+    std = np.zeros(len(columns))
+    std[cpu_mem] = _std(values[:, cpu_mem])
+    lat_std = np.zeros(len(columns))
+    lat_std[lat] = _std(values[:, lat] * 1000)
+
+    selected = []
+    for i, c in enumerate(columns):
+        # keep time
+        if "time" in c:
+            selected.append(i)
+        # cpu, mem
+        if (c.endswith("_cpu") or c.endswith("_mem")) and std[i] > 1:
+            selected.append(i)
+        if "lat50" in c and lat_std[i] > 10:
+            selected.append(i)
+    return selected
+
+
 def select_useful_cols(data):
+    if not _is_numeric(data):
+        return _select_useful_cols_frame(data)
+    return [data.columns[i] for i in _useful(data.columns, data.to_numpy(dtype=np.float64))]
+
+
+def _select_useful_cols_frame(data):
     selected_cols = []
     for c in data.columns:
         # keep time
@@ -94,19 +160,98 @@ def normalize_ts(data: pd.DataFrame):
 
 
 def preprocess(data, dataset=None, dk_select_useful=False):
-    before_cols_num = len(data.columns)
+    """
+    Drop time and constant columns, convert memory to MBs, and optionally keep useful columns
 
+    It computes the column masks with numpy and materializes the result once,
+    keeping the same columns as chaining drop_time, drop_constant,
+    convert_mem_mb, drop_extra, drop_near_constant and select_useful_cols.
+    """
     if dataset == "causalrca-sock-shop":
-        data = drop_time(data)
-    elif dataset is not None:
-        data = drop_constant(drop_time(data))
-        data = convert_mem_mb(data)
-
-        if dk_select_useful is True:
-            data = drop_extra(data)
-            data = drop_near_constant(data)
-            data = data[select_useful_cols(data)]
-
-    after_cols_num = len(data.columns)
-    # print(f"Drop {before_cols_num - after_cols_num} cols. Left {after_cols_num} cols.")
-    return data
\ No newline at end of file
+        return drop_time(data)
+    elif dataset is None:
+        return data
+    if not _is_numeric(data):
+        return _preprocess_frame(data, dk_select_useful=dk_select_useful)
+
+    columns = data.columns
+    keep = _changed(data).any(axis=0)
+    if "time" in data:
+        keep &= columns != "time"
+    elif "Time" in data:
+        keep &= columns != "Time"
+    index = np.flatnonzero(keep).tolist()
+    mem = [i for i, c in enumerate(columns[index]) if c.endswith("_mem")]
+
+    if dk_select_useful is True:
+        index = [i for i in index if not _is_extra(columns[i])]
+        # near constant and useful columns are found on the converted values
+        values = data.to_numpy(dtype=np.float64)[:, index]
+        values[:, [i for i, c in enumerate(columns[index]) if c.endswith("_mem")]] /= 1e6
+        near = (values != values[0]).mean(axis=0) > 0.1
+        index = [i for i, keep in zip(index, near) if keep]
+        index = [index[i] for i in _useful(columns[index], values[:, near])]
+        mem = [i for i, c in enumerate(columns[index]) if c.endswith("_mem")]
+
+    return _select(data, index, mem)
+
+
+def split_and_preprocess(data, inject_time=None, dataset=None, dk_select_useful=False, anomalies=None):
+    """
+    Split data into its normal and anomalous windows and preprocess both
+
+    The windows are split at inject_time, or after the first anomalies[0] rows.
+    Return (normal, anomal, columns): two float64 (rows, columns) arrays over
+    the columns kept in both windows, in the order of the normal window, as
+    preprocessing each window and intersecting their columns does.
+    """
+    positions = pd.Series(np.arange(len(data)))
+    if anomalies is None:
+        normal_rows = np.flatnonzero((data["time"] < inject_time).to_numpy())
+        anomal_rows = np.flatnonzero((data["time"] >= inject_time).to_numpy())
+    else:
+        normal_rows = positions.head(anomalies[0]).to_numpy()
+        # anomal is the rest
+        anomal_rows = positions.tail(len(data) - anomalies[0]).to_numpy()
+
+    if dataset == "causalrca-sock-shop" or dk_select_useful is True or not _is_numeric(data):
+        normal_df = preprocess(data.iloc[normal_rows], dataset=dataset, dk_select_useful=dk_select_useful)
+        anomal_df = preprocess(data.iloc[anomal_rows], dataset=dataset, dk_select_useful=dk_select_useful)
+        anomal_columns = set(anomal_df.columns)
+        columns = [c for c in normal_df.columns if c in anomal_columns]
+        return (
+            normal_df[columns].to_numpy(dtype=np.float64),
+            anomal_df[columns].to_numpy(dtype=np.float64),
+            columns,
+        )
+
+    values = data.to_numpy(dtype=np.float64)
+    normal, anomal = values[normal_rows], values[anomal_rows]
+    columns = data.columns
+    keep = np.ones(len(columns), dtype=bool)
+    if dataset is not None:
+        # drop_constant on each window
+        keep &= (normal != normal[0]).any(axis=0) & (anomal != anomal[0]).any(axis=0)
+        if "time" in data:
+            keep &= columns != "time"
+        elif "Time" in data:
+            keep &= columns != "Time"
+
+    columns = columns[keep].to_list()
+    normal, anomal = normal[:, keep], anomal[:, keep]
+    if dataset is not None:
+        mem = [i for i, c in enumerate(columns) if c.endswith("_mem")]
+        normal[:, mem] /= 1e6
+        anomal[:, mem] /= 1e6
+    return normal, anomal, columns
+
+
+def _preprocess_frame(data, dk_select_useful=False):
+    data = drop_constant(drop_time(data))
+    data = convert_mem_mb(data)
+
+    if dk_select_useful is True:
+        data = drop_extra(data)
+        data = drop_near_constant(data)
+        data = data[select_useful_cols(data)]
+    return data
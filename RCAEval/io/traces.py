@@ -0,0 +1,52 @@
+"""
+Per-operation statistics of span frames, shared by the trace-based methods
+
+MicroRank, TraceRCA and PDiagnose split the spans of a case at the inject
+time and flag the spans slower than the SLO of their operation, the mean plus
+a few standard deviations of its duration in the normal window. The SLOs come
+from one groupby over the spans.
+"""
+from typing import Tuple
+
+import pandas as pd
+
+
+def add_operation(span_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the operation column, {serviceName}_{methodName} or the operationName, in place
+    """
+    span_df["methodName"] = span_df["methodName"].fillna(span_df["operationName"])
+    span_df["operation"] = span_df["serviceName"] + "_" + span_df["methodName"]
+    return span_df
+
+
+def split_spans(span_df: pd.DataFrame, inject_time) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split the spans into the ones ending before inject_time and the others
+    """
+    normal = (span_df["startTime"] + span_df["duration"] < inject_time).to_numpy()
+    return span_df[normal], span_df[~normal]
+
+
+def operation_slo(span_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mean and standard deviation of the duration of each operation, in ms rounded to 0.01
+
+    Return a frame indexed by operation, in order of first appearance.
+    """
+    slo = span_df.groupby("operation", sort=False)["duration"].agg(["mean", "std"])
+    return (slo / 1_000).round(2)
+
+
+def add_slo(spans: pd.DataFrame, slo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy of spans with the mean and std of the SLO of their operation, NaN if it has none
+    """
+    return spans.join(slo[["mean", "std"]], on="operation")
+
+
+def abnormal_spans(spans: pd.DataFrame, k: float = 3) -> pd.Series:
+    """
+    Whether each span of add_slo lasted at least mean + k * std ms
+    """
+    return spans["duration"] / 1_000 >= spans["mean"] + k * spans["std"]
@@ -1,13 +1,14 @@
 import json
+import random
 import sys
 import os
+import zlib
 from os.path import join
 import requests
 import zipfile
 from tqdm import tqdm
 
 import numpy as np
-import pandas as pd
 from sklearn.preprocessing import StandardScaler
 
 ENCODING = "utf-8"
@@ -21,6 +22,51 @@ def is_py38():
     return sys.version_info.major == 3 and sys.version_info.minor == 8
 
 
+def set_seed(seed: int):
+    """
+    Seed python, numpy and (if installed) torch random generators
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        import torch
+        torch.manual_seed(seed)
+    except ImportError:
+        pass
+
+
+def case_seed(case: str, seed: int = 0) -> int:
+    """
+    Derive a stable seed for a case, independent of the order cases are run in
+    """
+    return (seed + zlib.crc32(case.encode(ENCODING))) % (2**32)
+
+
+def limit_threads(num_threads: int = 1):
+    """
+    Cap the BLAS/OpenMP/torch thread pools of the current process
+    """
+    for var in [
+        "OMP_NUM_THREADS",
+        "OPENBLAS_NUM_THREADS",
+        "MKL_NUM_THREADS",
+        "NUMEXPR_NUM_THREADS",
+        "VECLIB_MAXIMUM_THREADS",
+    ]:
+        os.environ[var] = str(num_threads)
+    try:
+        # env vars are only read when the BLAS is loaded, patch the live pools too
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=num_threads)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
 def dump_json(filename: str, data):
     """
     Dump data into a json file
@@ -345,7 +391,9 @@ def download_re3_dataset(local_path=None):
     
 def read_data(data_path, strip=True):
     """Read CSV data for root cause analysis."""
-    data = pd.read_csv(data_path)
+    from RCAEval.io.columnar import read_csv
+
+    data = read_csv(data_path)
     data_dir = os.path.dirname(data_path)
 
     ############# PREPROCESSING ###############
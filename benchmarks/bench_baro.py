@@ -0,0 +1,85 @@
+"""
+Benchmark the BARO scoring on RE2-TT sized inputs
+
+    python benchmarks/bench_baro.py --rows 600 --cols 1200 --repeat 5
+    python benchmarks/bench_baro.py --cases 100 --cols 200
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import RobustScaler
+
+from RCAEval.e2e.baro import baro, baro_batch, robust_scores
+
+
+def loop_scores(normal, anomal):
+    """The former per-column RobustScaler loop"""
+    scores = []
+    for i in range(normal.shape[1]):
+        scaler = RobustScaler().fit(normal[:, i].reshape(-1, 1))
+        zscores = scaler.transform(anomal[:, i].reshape(-1, 1))[:, 0]
+        scores.append(max(zscores))
+    return scores
+
+
+def bench(func, normal, anomal, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        st = time.perf_counter()
+        scores = func(normal, anomal)
+        best = min(best, time.perf_counter() - st)
+    return best, scores
+
+
+def bench_cases(args):
+    rng = np.random.default_rng(0)
+    cases = []
+    for _ in range(args.cases):
+        data = pd.DataFrame(
+            rng.lognormal(size=(args.rows, args.cols)), columns=[f"svc{i}_cpu" for i in range(args.cols)]
+        )
+        data.insert(0, "time", np.arange(args.rows))
+        cases.append((data, args.rows // 2))
+
+    st = time.perf_counter()
+    expected = [baro(data, inject_time, dataset="re2-tt") for data, inject_time in cases]
+    loop_time = time.perf_counter() - st
+    st = time.perf_counter()
+    actual = baro_batch(cases, dataset="re2-tt")
+    batch_time = time.perf_counter() - st
+    assert expected == actual
+
+    print(f"input: {args.cases} cases of {args.rows} rows x {args.cols} columns")
+    print(f"baro:       {loop_time * 1000:.1f} ms")
+    print(f"baro_batch: {batch_time * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BARO scoring")
+    # RE2-TT: 10 minutes of 1s metrics around the injection, ~1.2k metrics
+    parser.add_argument("--rows", type=int, default=600)
+    parser.add_argument("--cols", type=int, default=1200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", type=int, default=None, help="Compare baro and baro_batch on many cases")
+    args = parser.parse_args()
+    if args.cases is not None:
+        return bench_cases(args)
+
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(size=(args.rows, args.cols))
+    normal, anomal = values[: args.rows // 2], values[args.rows // 2 :]
+
+    loop_time, expected = bench(loop_scores, normal, anomal, args.repeat)
+    vec_time, actual = bench(robust_scores, normal, anomal, args.repeat)
+    assert np.array_equal(expected, actual)
+
+    print(f"input: {args.rows} rows x {args.cols} columns")
+    print(f"loop:       {loop_time * 1000:.1f} ms")
+    print(f"vectorized: {vec_time * 1000:.1f} ms")
+    print(f"speedup:    {loop_time / vec_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark granger against testing every pair with statsmodels
+
+    python benchmarks/bench_granger.py --rows 600 --cols 40
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.stattools import grangercausalitytests
+
+from RCAEval.graph_construction.granger import granger
+
+
+def pairwise_granger(data, maxlag=3, p_val_threshold=0.05):
+    """The former loop, one statsmodels test per ordered pair"""
+    node_names = data.columns.to_list()
+    adj = np.zeros((len(node_names), len(node_names)))
+    for i in range(len(node_names)):
+        for j in range(len(node_names)):
+            if i == j:
+                continue
+            output = grangercausalitytests(data[[node_names[i], node_names[j]]], maxlag, verbose=False)
+            for time_lag, out in output.items():
+                out = out[0]
+                if sum([v[1] for k, v in out.items()]) / len(out) < p_val_threshold:
+                    adj[i, j] = 1
+                    break
+    return adj
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark granger")
+    parser.add_argument("--rows", type=int, default=600)
+    parser.add_argument("--cols", type=int, default=40)
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(args.rows, args.cols))
+    for t in range(1, args.rows):
+        values[t, 1:] += 0.3 * values[t - 1, :-1]
+    data = pd.DataFrame(values, columns=[f"svc{i}_cpu" for i in range(args.cols)])
+
+    print(f"input: {args.rows} rows x {args.cols} columns")
+    st = time.perf_counter()
+    expected = pairwise_granger(data)
+    pairwise_time = time.perf_counter() - st
+    st = time.perf_counter()
+    actual = granger(data, n_jobs=args.jobs)
+    batched_time = time.perf_counter() - st
+    assert (actual == expected).all()
+    print(f"pairwise: {pairwise_time:.2f} s")
+    print(f"batched:  {batched_time:.2f} s")
+    print(f"speedup:  {pairwise_time / batched_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark the sparse page rank head against sknetwork on the dense preprocessed matrix
+
+    python benchmarks/bench_page_rank.py --nodes 3000 --degree 4
+"""
+import argparse
+import time
+
+import numpy as np
+from sknetwork.ranking import PageRank
+
+from RCAEval.graph_heads.page_rank import page_rank_matrix, sparse_page_rank
+
+
+def random_cpdag(num_nodes, degree, seed=0):
+    """A causallearn adj with about degree edges per node, from lower to higher index"""
+    rng = np.random.default_rng(seed)
+    adj = np.zeros((num_nodes, num_nodes), dtype=np.int64)
+    causes = rng.integers(0, num_nodes, num_nodes * degree)
+    effects = rng.integers(0, num_nodes, num_nodes * degree)
+    causes, effects = np.minimum(causes, effects), np.maximum(causes, effects)
+    keep = causes != effects
+    adj[causes[keep], effects[keep]] = -1
+    adj[effects[keep], causes[keep]] = 1
+    return adj
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page rank")
+    parser.add_argument("--nodes", type=int, default=3000)
+    parser.add_argument("--degree", type=int, default=4)
+    parser.add_argument("--n-iter", type=int, default=100)
+    args = parser.parse_args()
+
+    adj = random_cpdag(args.nodes, args.degree)
+    print(f"input: {args.nodes} nodes, {(adj == -1).sum()} edges")
+
+    st = time.perf_counter()
+    dense = np.zeros_like(adj)
+    dense[page_rank_matrix(adj).nonzero()] = 1
+    expected = PageRank(n_iter=args.n_iter).fit_transform(dense)
+    dense_time = time.perf_counter() - st
+
+    st = time.perf_counter()
+    matrix = page_rank_matrix(adj)
+    actual, stats = sparse_page_rank(matrix, n_iter=args.n_iter)
+    sparse_time = time.perf_counter() - st
+    assert np.array_equal(actual, expected)
+
+    st = time.perf_counter()
+    _, warm_stats = sparse_page_rank(matrix, n_iter=args.n_iter, x0=actual)
+    warm_time = time.perf_counter() - st
+
+    print(f"dense:  {dense_time:.3f} s, {dense.nbytes / 2**20:.1f} MiB matrix")
+    print(f"sparse: {sparse_time:.3f} s, {stats['iterations']} iterations, {matrix.data.nbytes / 2**20:.1f} MiB matrix data")
+    print(f"warm:   {warm_time:.3f} s, {warm_stats['iterations']} iterations")
+
+
+if __name__ == "__main__":
+    main()
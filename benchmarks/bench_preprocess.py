@@ -0,0 +1,87 @@
+"""
+Benchmark preprocess on RE2-TT sized windows
+
+    python benchmarks/bench_preprocess.py --rows 600 --cols 1200 --repeat 5
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from RCAEval.io.time_series import preprocess
+
+
+def chained_preprocess(data, dk_select_useful=False):
+    """The former pipeline, one pandas step after the other"""
+
+    def update_mem(x):
+        if not x.name.endswith("_mem"):
+            return x
+        x /= 1e6
+        return x
+
+    data = data.drop(columns=["time"])
+    data = data.loc[:, (data != data.iloc[0]).any()]
+    data = data.apply(update_mem)
+
+    if dk_select_useful is True:
+        if "time.1" in data:
+            data = data.drop(columns=["time.1"])
+        for col in data.columns:
+            if "frontend-external" in col or col.startswith("main_") or col.startswith("istio-proxy"):
+                data = data.drop(columns=[col])
+        data = data.loc[:, (data != data.iloc[0]).mean() > 0.1]
+        selected_cols = []
+        for c in data.columns:
+            if "time" in c:
+                selected_cols.append(c)
+            if c.endswith("_cpu") and data[c].std() > 1:
+                selected_cols.append(c)
+            if c.endswith("_mem") and data[c].std() > 1:
+                selected_cols.append(c)
+            if "lat50" in c and (data[c] * 1000).std() > 10:
+                selected_cols.append(c)
+        data = data[selected_cols]
+    return data
+
+
+def bench(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        st = time.perf_counter()
+        out = func()
+        best = min(best, time.perf_counter() - st)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocess")
+    parser.add_argument("--rows", type=int, default=600)
+    parser.add_argument("--cols", type=int, default=1200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    metrics = ["cpu", "mem", "lat50", "latency-90", "main_cpu", "istio-proxy_mem"]
+    columns = [f"svc{i}_{metrics[i % len(metrics)]}" for i in range(args.cols)]
+    values = rng.lognormal(size=(args.rows, args.cols)) * 100
+    values[:, ::7] = 1.0  # constant columns
+    data = pd.DataFrame(values, columns=columns)
+    data.insert(0, "time", np.arange(args.rows))
+
+    print(f"input: {args.rows} rows x {args.cols} columns")
+    for dk_select_useful in [False, True]:
+        chained_time, expected = bench(lambda: chained_preprocess(data, dk_select_useful), args.repeat)
+        fused_time, actual = bench(
+            lambda: preprocess(data, dataset="re2-tt", dk_select_useful=dk_select_useful), args.repeat
+        )
+        pd.testing.assert_frame_equal(actual, expected)
+        print(f"dk_select_useful={dk_select_useful}")
+        print(f"  chained: {chained_time * 1000:.1f} ms")
+        print(f"  fused:   {fused_time * 1000:.1f} ms")
+        print(f"  speedup: {chained_time / fused_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark RandomWalkScorer against the walk on a pandas transition matrix
+
+    python benchmarks/bench_random_walk.py --nodes 200 --num-loop 20000
+"""
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from RCAEval.classes.data import CaseData
+from RCAEval.classes.graph import MemoryGraph, Node
+from RCAEval.graph_heads.random_walk import RandomWalkScorer, Score
+
+
+def pandas_walk(matrix: pd.DataFrame, start, num_loop, seed=0):
+    """The former walk, one Generator.choice on a DataFrame column per step"""
+    rng = np.random.default_rng(seed)
+    node, counter = start, {node: 0 for node in matrix.index}
+    for _ in range(num_loop):
+        node = rng.choice(matrix.index, p=matrix[node])
+        counter[node] += 1
+    return [counter[node] / num_loop for node in matrix.index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark random walk")
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--degree", type=int, default=3)
+    parser.add_argument("--num-loop", type=int, default=20000)
+    parser.add_argument("--walkers", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    nodes = [Node(f"svc{i}", "cpu") for i in range(args.nodes)]
+    graph = nx.gnm_random_graph(args.nodes, args.nodes * args.degree, seed=0, directed=True)
+    graph = MemoryGraph(nx.relabel_nodes(graph, dict(enumerate(nodes))))
+    values = rng.uniform(size=args.nodes)
+    data = CaseData(data_loader=None, sli=nodes[0], detect_time=0)
+
+    def run(**kwargs):
+        scores = {node: Score(value) for node, value in zip(nodes, values)}
+        st = time.perf_counter()
+        scores = RandomWalkScorer(num_loop=args.num_loop, **kwargs).score(graph, data, 0, scores)
+        return [score.score for score in scores.values()], time.perf_counter() - st
+
+    matrix = RandomWalkScorer().generate_transition_matrix(
+        graph, data, {node: Score(value) for node, value in zip(nodes, values)}
+    )
+    st = time.perf_counter()
+    expected = pandas_walk(matrix, nodes[0], args.num_loop)
+    pandas_time = time.perf_counter() - st
+
+    actual, array_time = run()
+    assert actual == expected
+    _, walkers_time = run(num_walkers=args.walkers)
+    _, stationary_time = run(method="stationary")
+    print(f"input: {args.nodes} nodes, {args.num_loop} steps")
+    print(f"pandas:     {pandas_time:.3f} s")
+    print(f"array:      {array_time:.3f} s")
+    print(f"walkers:    {walkers_time:.3f} s ({args.walkers} in lock-step)")
+    print(f"stationary: {stationary_time:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
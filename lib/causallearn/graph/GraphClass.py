@@ -11,6 +11,7 @@ from causallearn.graph.Edge import Edge
 from causallearn.graph.Endpoint import Endpoint
 from causallearn.graph.GeneralGraph import GeneralGraph
 from causallearn.graph.GraphNode import GraphNode
+from causallearn.utils.CITestCache import CITestCache
 from causallearn.utils.GraphUtils import GraphUtils
 from causallearn.utils.PCUtils.Helper import list_union, powerset
 
@@ -49,7 +50,8 @@ class CausalGraph:
         self.mvpc = None
         self.cardinalities = None  # only works when self.data is discrete, i.e. self.test is chisq or gsq
         self.is_discrete = False
-        self.citest_cache = dict()
+        # bounded like the one of fas, the prefetched p-values of a depth are read back right away
+        self.citest_cache = CITestCache()
         self.data_hash_key = None
         self.ci_test_hash_key = None
         self.no_ci_tests = 0  # number of ci tests done for this causal graph
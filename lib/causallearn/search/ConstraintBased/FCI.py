@@ -6,6 +6,7 @@ from causallearn.graph.Edge import Edge
 from causallearn.graph.Endpoint import Endpoint
 from causallearn.graph.GraphNode import GraphNode
 from causallearn.utils.ChoiceGenerator import ChoiceGenerator
+from causallearn.utils.CITestCache import data_digest
 from causallearn.utils.cit import *
 from causallearn.utils.Fas import citest_cache, fas
 from causallearn.utils.PCUtils.BackgroundKnowledge import BackgroundKnowledge
@@ -45,7 +46,7 @@ class SepsetsPossibleDsep:
             else:
                 cardinalities = None
             cache_variables_map = {
-                "data_hash_key": hash(str(data)),
+                "data_hash_key": data_digest(data),
                 "ci_test_hash_key": hash(independence_test),
                 "cardinalities": cardinalities,
             }
@@ -989,6 +990,7 @@ def get_color_edges(graph):
     return edges
 
 
+@citest_cache.scoped()
 def fci(
     dataset,
     independence_test_method=fisherz,
@@ -998,6 +1000,8 @@ def fci(
     verbose=False,
     background_knowledge=None,
     cache_variables_map=None,
+    n_jobs=1,
+    parallel_backend="thread",
 ):
     """
     Perform Fast Causal Inference (FCI) algorithm for causal discovery
@@ -1019,6 +1023,9 @@ def fci(
     background_knowledge: background knowledge
     cache_variables_map: This variable a map which contains the variables relate with cache. If it is not None,
                             it should contain 'data_hash_key' 、'ci_test_hash_key' and 'cardinalities'.
+    n_jobs: number of workers running the CI tests of a depth of the fast adjacency search, -1 for all cores.
+            The result is the same as with n_jobs=1.
+    parallel_backend: "thread" or "process", the pool running the CI tests of the fast adjacency search
 
     Returns
     -------
@@ -1060,7 +1067,7 @@ def fci(
         else:
             cardinalities = None
         cache_variables_map = {
-            "data_hash_key": hash(str(dataset)),
+            "data_hash_key": data_digest(dataset),
             "ci_test_hash_key": hash(independence_test_method),
             "cardinalities": cardinalities,
         }
@@ -1082,6 +1089,8 @@ def fci(
         verbose=verbose,
         show_progress=verbose,
         cache_variables_map=cache_variables_map,
+        n_jobs=n_jobs,
+        parallel_backend=parallel_backend,
     )
 
     # reorient all edges with CIRCLE Endpoint
@@ -3,11 +3,14 @@ from copy import deepcopy
 from causallearn.graph.Edges import Edges
 from causallearn.graph.GeneralGraph import GeneralGraph
 from causallearn.utils.ChoiceGenerator import ChoiceGenerator
+from causallearn.utils.CITestCache import CITestCache, data_digest, prefetch_ci_tests
 from causallearn.utils.cit import *
 from causallearn.utils.PCUtils.BackgroundKnowledge import BackgroundKnowledge
 from tqdm.auto import tqdm
 
-citest_cache = dict()
+# shared by fas and fci, bounded and keyed on the content of the data; a search
+# drops the p-values it cached when it returns, so a sweep does not grow it
+citest_cache = CITestCache()
 
 
 def possible_parents(node_x, adjx, knowledge=None):
@@ -63,10 +66,12 @@ def searchAtDepth0(
     knowledge=None,
     pbar=None,
     cache_variables_map=None,
+    n_jobs=1,
+    parallel_backend="thread",
 ):
     empty = []
     if cache_variables_map is None:
-        data_hash_key = hash(str(data))
+        data_hash_key = data_digest(data)
         ci_test_hash_key = hash(independence_test_method)
         if independence_test_method == chisq or independence_test_method == gsq:
             cardinalities = np.max(data, axis=0) + 1
@@ -77,6 +82,22 @@ def searchAtDepth0(
         ci_test_hash_key = cache_variables_map["ci_test_hash_key"]
         cardinalities = cache_variables_map["cardinalities"]
 
+    if n_jobs != 1 or hasattr(independence_test_method, "batch"):
+        tasks = {
+            (i, j, frozenset(), data_hash_key, ci_test_hash_key): (i, j, tuple(empty))
+            for i in range(len(nodes))
+            for j in range(i + 1, len(nodes))
+        }
+        prefetch_ci_tests(
+            tasks,
+            citest_cache,
+            independence_test_method,
+            data,
+            cardinalities,
+            n_jobs,
+            parallel_backend,
+        )
+
     show_progress = not pbar is None
     if show_progress:
         pbar.reset()
@@ -143,6 +164,8 @@ def searchAtDepth(
     knowledge=None,
     pbar=None,
     cache_variables_map=None,
+    n_jobs=1,
+    parallel_backend="thread",
 ):
     def edge(adjx, i, adjacencies_completed_edge):
         for j in range(len(adjx)):
@@ -156,10 +179,10 @@ def searchAtDepth(
                 choice = cg.next()
                 flag = False
                 while choice is not None:
-                    cond_set = [nodes.index(ppx[index]) for index in choice]
+                    cond_set = [node_index[ppx[index]] for index in choice]
                     choice = cg.next()
 
-                    Y = nodes.index(adjx[j])
+                    Y = node_index[adjx[j]]
                     X, Y = (i, Y) if (i < Y) else (Y, i)
                     XYS_key = (
                         X,
@@ -207,12 +230,12 @@ def searchAtDepth(
                             adjacencies[adjx[j]].remove(nodes[i])
 
                         if cond_set is not None:
-                            if sep_sets.keys().__contains__((i, nodes.index(adjx[j]))):
-                                sep_set = sep_sets[(i, nodes.index(adjx[j]))]
+                            if sep_sets.keys().__contains__((i, node_index[adjx[j]])):
+                                sep_set = sep_sets[(i, node_index[adjx[j]])]
                                 for cond_set_item in cond_set:
                                     sep_set.add(cond_set_item)
                             else:
-                                sep_sets[(i, nodes.index(adjx[j]))] = set(cond_set)
+                                sep_sets[(i, node_index[adjx[j]])] = set(cond_set)
 
                         flag = True
                 if flag:
@@ -220,7 +243,7 @@ def searchAtDepth(
         return True
 
     if cache_variables_map is None:
-        data_hash_key = hash(str(data))
+        data_hash_key = data_digest(data)
         ci_test_hash_key = hash(independence_test_method)
         if independence_test_method == chisq or independence_test_method == gsq:
             cardinalities = np.max(data, axis=0) + 1
@@ -233,8 +256,85 @@ def searchAtDepth(
 
     count = 0
 
+    # nodes.index, without comparing the node names one by one
+    node_index = {}
+    for k, node in enumerate(nodes):
+        node_index.setdefault(node, k)
+
     adjacencies_completed = deepcopy(adjacencies)
 
+    if n_jobs != 1 or hasattr(independence_test_method, "batch"):
+        # the conditioning sets come from adjacencies_completed, which is fixed
+        # within the depth. Node i runs all the tests of its edges to the nodes
+        # after it, then those of its edges to the nodes before it that they
+        # kept. Run the former on a pool first, then the latter.
+        def edge_tasks(i, node_y):
+            _adjx = list(adjacencies_completed[nodes[i]])
+            _adjx.remove(node_y)
+            ppx = possible_parents(nodes[i], _adjx, knowledge)
+            tasks = {}
+            if len(ppx) >= depth:
+                cg = ChoiceGenerator(len(ppx), depth)
+                choice = cg.next()
+                while choice is not None:
+                    cond_set = [node_index[ppx[index]] for index in choice]
+                    choice = cg.next()
+
+                    Y = node_index[node_y]
+                    X, Y = (i, Y) if (i < Y) else (Y, i)
+                    XYS_key = (X, Y, frozenset(cond_set), data_hash_key, ci_test_hash_key)
+                    tasks.setdefault(XYS_key, (X, Y, tuple(cond_set)))
+            return tasks
+
+        edges = [
+            (i, node_index[node_y], node_y)
+            for i in range(len(nodes))
+            for node_y in adjacencies_completed[nodes[i]]
+        ]
+        forward = {(i, y): edge_tasks(i, node_y) for i, y, node_y in edges if i < y}
+        tasks = {}
+        for edge_task in forward.values():
+            for XYS_key, task in edge_task.items():
+                tasks.setdefault(XYS_key, task)
+        prefetch_ci_tests(
+            tasks,
+            citest_cache,
+            independence_test_method,
+            data,
+            cardinalities,
+            n_jobs,
+            parallel_backend,
+        )
+
+        tasks = {}
+        for i, y, node_y in edges:
+            if i < y:
+                continue
+            # an evicted p-value only costs the prefetch of the reverse tests
+            independent = any(
+                citest_cache.get(XYS_key, 0.0) > alpha for XYS_key in forward[(y, i)]
+            )
+            no_edge_required = (
+                True
+                if knowledge is None
+                else (
+                    (not knowledge.is_required(node_y, nodes[i]))
+                    or knowledge.is_required(nodes[i], node_y)
+                )
+            )
+            if not (independent and no_edge_required):
+                for XYS_key, task in edge_tasks(i, node_y).items():
+                    tasks.setdefault(XYS_key, task)
+        prefetch_ci_tests(
+            tasks,
+            citest_cache,
+            independence_test_method,
+            data,
+            cardinalities,
+            n_jobs,
+            parallel_backend,
+        )
+
     show_progress = not pbar is None
     if show_progress:
         pbar.reset()
@@ -284,10 +384,10 @@ def searchAtDepth_not_stable(
                 choice = cg.next()
 
                 while choice is not None:
-                    cond_set = [nodes.index(ppx[index]) for index in choice]
+                    cond_set = [node_index[ppx[index]] for index in choice]
                     choice = cg.next()
 
-                    Y = nodes.index(adjx[j])
+                    Y = node_index[adjx[j]]
                     X, Y = (i, Y) if (i < Y) else (Y, i)
                     XYS_key = (
                         X,
@@ -326,12 +426,12 @@ def searchAtDepth_not_stable(
                             adjacencies[adjx[j]].remove(nodes[i])
 
                         if cond_set is not None:
-                            if sep_sets.keys().__contains__((i, nodes.index(adjx[j]))):
-                                sep_set = sep_sets[(i, nodes.index(adjx[j]))]
+                            if sep_sets.keys().__contains__((i, node_index[adjx[j]])):
+                                sep_set = sep_sets[(i, node_index[adjx[j]])]
                                 for cond_set_item in cond_set:
                                     sep_set.add(cond_set_item)
                             else:
-                                sep_sets[(i, nodes.index(adjx[j]))] = set(cond_set)
+                                sep_sets[(i, node_index[adjx[j]])] = set(cond_set)
 
                         if verbose:
                             message = (
@@ -351,7 +451,7 @@ def searchAtDepth_not_stable(
         return True
 
     if cache_variables_map is None:
-        data_hash_key = hash(str(data))
+        data_hash_key = data_digest(data)
         ci_test_hash_key = hash(independence_test_method)
         if independence_test_method == chisq or independence_test_method == gsq:
             cardinalities = np.max(data, axis=0) + 1
@@ -364,6 +464,11 @@ def searchAtDepth_not_stable(
 
     count = 0
 
+    # nodes.index, without comparing the node names one by one
+    node_index = {}
+    for k, node in enumerate(nodes):
+        node_index.setdefault(node, k)
+
     show_progress = not pbar is None
     if show_progress:
         pbar.reset()
@@ -388,6 +493,7 @@ def searchAtDepth_not_stable(
     return freeDegree(nodes, adjacencies) > depth
 
 
+@citest_cache.scoped()
 def fas(
     data,
     nodes,
@@ -399,6 +505,8 @@ def fas(
     stable=True,
     show_progress=True,
     cache_variables_map=None,
+    n_jobs=1,
+    parallel_backend="thread",
 ):
     """
     Implements the "fast adjacency search" used in several causal algorithm in this file. In the fast adjacency
@@ -428,6 +536,10 @@ def fas(
     show_progress: whether to use tqdm to show progress bar
     cache_variables_map: This variable a map which contains the variables relate with cache. If it is not None,
                             it should contain 'data_hash_key' 、'ci_test_hash_key' and 'cardinalities'.
+    n_jobs: number of workers running the CI tests of a depth at once, -1 for all cores. Beyond depth 0, only the
+            stable search runs in parallel. The result is the same as with n_jobs=1.
+    parallel_backend: "thread" or "process", the pool running the CI tests. Tests with a batch method, such as
+            FisherZ, run all the tests of a depth at once instead.
 
     Returns
     -------
@@ -461,7 +573,7 @@ def fas(
         else:
             cardinalities = None
         cache_variables_map = {
-            "data_hash_key": hash(str(data)),
+            "data_hash_key": data_digest(data),
             "ci_test_hash_key": hash(independence_test_method),
             "cardinalities": cardinalities,
         }
@@ -486,6 +598,8 @@ def fas(
                 knowledge,
                 pbar=pbar,
                 cache_variables_map=cache_variables_map,
+                n_jobs=n_jobs,
+                parallel_backend=parallel_backend,
             )
         else:
             if stable:
@@ -501,6 +615,8 @@ def fas(
                     knowledge,
                     pbar=pbar,
                     cache_variables_map=cache_variables_map,
+                    n_jobs=n_jobs,
+                    parallel_backend=parallel_backend,
                 )
             else:
                 more = searchAtDepth_not_stable(
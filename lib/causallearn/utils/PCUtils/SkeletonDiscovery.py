@@ -2,6 +2,7 @@ from itertools import combinations
 
 import numpy as np
 from causallearn.graph.GraphClass import CausalGraph
+from causallearn.utils.CITestCache import data_digest, depth_tests, prefetch_ci_tests
 from causallearn.utils.cit import chisq, gsq
 from causallearn.utils.PCUtils.Helper import append_value
 from tqdm.auto import tqdm
@@ -16,6 +17,8 @@ def skeleton_discovery(
     labels={},
     verbose=False,
     show_progress=True,
+    n_jobs=1,
+    parallel_backend="thread",
 ):
     """
     Perform skeleton discovery
@@ -35,6 +38,10 @@ def skeleton_discovery(
     background_knowledge : background knowledge
     verbose : True iff verbose output should be printed.
     show_progress : True iff the algorithm progress should be show in console.
+    n_jobs : number of workers running the CI tests of a depth of the stable search at once, -1 for all
+            cores. The graph is the same as with n_jobs=1.
+    parallel_backend : "thread" or "process", the pool running the CI tests. Tests with a batch method, such
+            as FisherZ, run all the tests of a depth of the stable search at once instead.
 
     Returns
     -------
@@ -50,7 +57,7 @@ def skeleton_discovery(
     n_features = data.shape[1]
     cg = CausalGraph(n_features, labels=labels)
     cg.set_ind_test(indep_test)
-    cg.data_hash_key = hash(str(data))
+    cg.data_hash_key = data_digest(data)
     if indep_test == chisq or indep_test == gsq:
         # if dealing with discrete data, data is numpy.ndarray with n rows m columns,
         # for each column, translate the discrete values to int indexs starting from 0,
@@ -72,6 +79,8 @@ def skeleton_discovery(
     while cg.max_degree() - 1 > depth:
         depth += 1
         edge_removal = []
+        if stable and (n_jobs != 1 or hasattr(indep_test, "batch")) and not cg.mvpc:
+            prefetch_depth(cg, depth, n_jobs, parallel_backend)
         if show_progress:
             pbar.reset()
         for x in range(n_features):
@@ -149,6 +158,26 @@ def skeleton_discovery(
     return cg
 
 
+def prefetch_depth(cg, depth, n_jobs, parallel_backend="thread"):
+    """
+    Run the CI tests of a depth of the stable search on a pool and cache their p-values
+    """
+    tasks = {}
+    for x, y, S in depth_tests(cg, depth):
+        i, j = (x, y) if (x < y) else (y, x)
+        tasks.setdefault((i, j, frozenset(S), cg.data_hash_key, cg.ci_test_hash_key), (i, j, S))
+
+    prefetch_ci_tests(
+        tasks,
+        cg.citest_cache,
+        cg.test,
+        cg.data,
+        cg.cardinalities if cg.is_discrete else None,
+        n_jobs=n_jobs,
+        backend=parallel_backend,
+    )
+
+
 def local_skeleton_discovery(
     data, local_node, alpha, indep_test, mi=[], labels={}, verbose=False
 ):
@@ -159,7 +188,7 @@ def local_skeleton_discovery(
     no_of_var = data.shape[1]
     cg = CausalGraph(no_of_var, labels=labels)
     cg.set_ind_test(indep_test)
-    cg.data_hash_key = hash(str(data))
+    cg.data_hash_key = data_digest(data)
     if indep_test == chisq or indep_test == gsq:
 
         def _unique(column):
@@ -1,29 +1,41 @@
 import argparse
 import glob
-import json
 import os
 import shutil
 import warnings
 from datetime import datetime, timedelta
-from multiprocessing import Pool
+from multiprocessing import get_context
 from os.path import abspath, basename, dirname, exists, join
 
 # turn off all warnings
 warnings.filterwarnings("ignore")
 
-import numpy as np
-import pandas as pd
 from tqdm import tqdm
 
+from RCAEval import __version__
 from RCAEval.benchmark.evaluation import Evaluator
+from RCAEval.benchmark.store import (
+    STATUS_FAILED,
+    STATUS_OK,
+    STATUS_TIMEOUT,
+    CaseTimeout,
+    ResultStore,
+    result_key,
+    time_limit,
+)
 from RCAEval.classes.graph import Node
 
+from RCAEval.io.catalog import build_catalog
+from RCAEval.io.columnar import convert_dataset, load_case_window
 from RCAEval.io.time_series import drop_constant, drop_time, preprocess
 from RCAEval.utility import (
+    case_seed,
     dump_json,
     is_py38,
     is_py310,
+    limit_threads,
     load_json,
+    set_seed,
     download_online_boutique_dataset,
     download_sock_shop_1_dataset,
     download_sock_shop_2_dataset,
@@ -73,7 +85,6 @@ else:
 try:
     import torch
     os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
-    from RCAEval.e2e.causalrca import causalrca
 except ImportError:
     pass
 
@@ -88,8 +99,19 @@ def parse_args():
     parser.add_argument("--length", type=int, default=20, help="Time series length (RQ4)")
     parser.add_argument("--tdelta", type=int, default=0, help="Specify $t_delta$ to simulate delay in anomaly detection")
     parser.add_argument("--test", action="store_true", help="Perform smoke test on certain methods without fully run on all data")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes to run cases in parallel")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed, each case is seeded from it and its name")
+    parser.add_argument("--n-jobs", type=int, default=1, help="Number of workers running the CI tests of PC/FCI methods, -1 for all cores")
+    parser.add_argument("--parallel-backend", type=str, default="thread", choices=["thread", "process"], help="Pool running the CI tests of PC/FCI methods")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-case time limit in seconds")
+    parser.add_argument("--rerun", action="store_true", help="Recompute cases that already have a stored result")
+    parser.add_argument("--cache", action="store_true", help="Convert dataset CSVs to a columnar cache before running")
+    parser.add_argument("--catalog", action="store_true", help="Discover and load cases through a memory-mapped dataset catalog")
     args = parser.parse_args()
 
+    if args.workers > 1 and args.n_jobs != 1 and args.parallel_backend == "process":
+        parser.error("--parallel-backend process needs --workers 1, worker processes cannot start their own")
+
     if args.method not in globals():
         raise ValueError(f"{args.method=} not defined. Please check imported methods.")
 
@@ -131,11 +153,21 @@ DATASET_MAP = {
 }
 dataset = DATASET_MAP[args.dataset]
 
+# one-time conversion, cases then transparently load the cache instead of the CSVs
+if args.cache is True:
+    convert_dataset(dataset)
+
 
 # prepare input paths
-data_paths = list(glob.glob(os.path.join(dataset, "**/data.csv"), recursive=True))
-if not data_paths: 
-    data_paths = list(glob.glob(os.path.join(dataset, "**/simple_metrics.csv"), recursive=True))
+catalog = None
+if args.catalog is True:
+    # built once per dataset directory, workers then map cases zero-copy
+    catalog = build_catalog(dataset)
+    data_paths = [catalog.data_path(case) for case in catalog]
+else:
+    data_paths = list(glob.glob(os.path.join(dataset, "**/data.csv"), recursive=True))
+    if not data_paths: 
+        data_paths = list(glob.glob(os.path.join(dataset, "**/simple_metrics.csv"), recursive=True))
 # new_data_paths = []
 # for p in data_paths: 
 #     if os.path.exists(p.replace("data.csv", "simple_data.csv")):
@@ -156,6 +188,17 @@ output_path = "output"
 report_path = join(output_path, f"report.xlsx")
 result_path = join(output_path, "results")
 os.makedirs(result_path, exist_ok=True)
+store = ResultStore(join(output_path, "store"))
+
+# everything a case result depends on, besides its data
+method_kwargs = dict(
+    dataset=args.dataset,
+    anomalies=None,
+    dk_select_useful=False,
+    verbose=False,
+)
+# how the case runs, which does not change its result
+run_kwargs = dict(n_jobs=args.n_jobs, parallel_backend=args.parallel_backend)
 
 
 def process(data_path):
@@ -174,32 +217,45 @@ def process(data_path):
     case = basename(dirname(data_path))
 
     rp = join(result_path, f"{service}_{metric}_{case}.json")
+    failed_rp = join(result_path, f"{service}_{metric}_{case}_failed.json")
+
+    # == Skip cases with a valid stored result ==
+    key = result_key(
+        method=args.method,
+        kwargs=method_kwargs,
+        data=store.fingerprint(data_path),
+        inject_time=store.fingerprint(join(data_dir, "inject_time.txt")),
+        length=args.length,
+        tdelta=args.tdelta,
+        seed=args.seed,
+        version=__version__,
+    )
+    if not args.rerun and store.is_done(key):
+        if not exists(rp):
+            dump_json(filename=rp, data={0: store.get(key)["ranks"]})
+        return "skipped"
 
     # == Load and Preprocess data ==
-    data = pd.read_csv(data_path)
-    
-    # remove lat-50, only selecte lat-90 
-    data = data.loc[:, ~data.columns.str.endswith("_latency-50")]
-    
+    with open(join(data_dir, "inject_time.txt")) as f:
+        inject_time = int(f.readlines()[0].strip()) + args.tdelta
+
+    # remove lat-50, only selecte lat-90, handle inf and na, then keep
+    # data_length rows on each side of inject_time (for metrics, minutes -> seconds // 2)
+    # only the window is read from the catalog or the columnar cache
+    data = load_case_window(
+        data_path,
+        inject_time,
+        before=data_length,
+        after=data_length,
+        drop_suffixes=("_latency-50",),
+        usecols=(lambda c: c == "time" or c.startswith("ts-")) if "mm-tt" in data_path else None,
+        catalog=catalog,
+    )
+
     if "mm-tt" in data_path:
         time_col = data["time"]
         data = data.loc[:, data.columns.str.startswith("ts-")]
         data["time"] = time_col
-        
-    # handle inf
-    data = data.replace([np.inf, -np.inf], np.nan)
-
-    # handle na
-    data = data.fillna(method="ffill")
-    data = data.fillna(0)
-
-    with open(join(data_dir, "inject_time.txt")) as f:
-        inject_time = int(f.readlines()[0].strip()) + args.tdelta
-    # for metrics, minutes -> seconds // 2
-    normal_df = data[data["time"] < inject_time].tail(args.length * 60 // 2)
-    anomal_df = data[data["time"] >= inject_time].head(args.length * 60 // 2)
-
-    data = pd.concat([normal_df, anomal_df], ignore_index=True)
 
     # num column, exclude time
     num_node = len(data.columns) - 1
@@ -239,38 +295,62 @@ def process(data_path):
     # == PROCESS ==
     func = globals()[args.method]
 
+    # seed per case so results do not depend on which worker runs it, or when
+    set_seed(case_seed(f"{service}_{metric}_{case}", args.seed))
+
+    st = datetime.now()
+    record = {"case": f"{service}_{metric}_{case}", "data_path": data_path}
     try:
-        st = datetime.now()
-        
-        out = func(
-            data,
-            inject_time,
-            dataset=args.dataset,
-            anomalies=None,
-            dk_select_useful=False,
-            sli=sli,
-            verbose=False,
-            n_iter=num_node,
-            args=run_args,
-        )
+        with time_limit(args.timeout):
+            out = func(
+                data,
+                inject_time,
+                sli=sli,
+                n_iter=num_node,
+                args=run_args,
+                **method_kwargs,
+                **run_kwargs,
+            )
         root_causes = out.get("ranks")
-        # print("==============")
-        # print(f"{data_path=}")
-        # print(root_causes[:5])
-        dump_json(filename=rp, data={0: root_causes})
+        record.update(status=STATUS_OK, ranks=root_causes)
+    except CaseTimeout as e:
+        record.update(status=STATUS_TIMEOUT, error=str(e))
     except Exception as e:
-        raise e
-        print(f"{args.method=} failed on {data_path=}")
-        print(e)
-        rp = join(result_path, f"{service}_{metric}_{case}_failed.json")
-        with open(rp, "w") as f:
-            json.dump({"error": str(e)}, f)
+        record.update(status=STATUS_FAILED, error=repr(e))
+    record["elapsed"] = (datetime.now() - st).total_seconds()
+    store.put(key, record)
+
+    # keep output/results in sync with the latest run of the case
+    if record["status"] == STATUS_OK:
+        dump_json(filename=rp, data={0: record["ranks"]})
+        if exists(failed_rp):
+            os.remove(failed_rp)
+    else:
+        print(f"{args.method=} {record['status']} on {data_path=}: {record['error']}")
+        dump_json(filename=failed_rp, data={"error": record["error"], "status": record["status"]})
+        if exists(rp):
+            os.remove(rp)
+    return record["status"]
+
+
+def init_worker():
+    # each worker gets one core, otherwise N workers x M BLAS threads oversubscribe the box
+    limit_threads(1)
 
 
 start_time = datetime.now()
 
-for data_path in tqdm(sorted(data_paths)):
-    process(data_path)
+statuses = []
+if args.workers > 1:
+    # fork, so workers inherit the parsed args and imported methods of this script
+    with get_context("fork").Pool(args.workers, initializer=init_worker) as pool:
+        for status in tqdm(pool.imap_unordered(process, sorted(data_paths)), total=len(data_paths)):
+            statuses.append(status)
+else:
+    for data_path in tqdm(sorted(data_paths)):
+        statuses.append(process(data_path))
+
+print(", ".join(f"{statuses.count(s)} {s}" for s in ["skipped", STATUS_OK, STATUS_FAILED, STATUS_TIMEOUT]))
 
 end_time = datetime.now()
 time_taken = end_time - start_time
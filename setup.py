@@ -1,6 +1,11 @@
+import re
 from os.path import join, dirname, abspath
 from setuptools import setup
 
+# the version is kept in RCAEval/__init__.py
+with open(join("RCAEval", "__init__.py")) as f:
+    version = re.search(r'^__version__ = "(.+)"', f.read(), re.M).group(1)
+
 # parse requirements.txt to requirement list
 with open("requirements.txt") as f:
     requirements = f.read().splitlines()
@@ -13,7 +18,7 @@ with open("README.md", encoding="utf-8") as f:
     
 setup(
     name="RCAEval",
-    version="1.1.2",
+    version=version,
     packages=["RCAEval"],
     include_package_data=True,
     description="RCAEval: A Benchmark for Root Cause Analysis of Microservice Systems",
@@ -0,0 +1,115 @@
+"""Tests."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import RobustScaler, StandardScaler
+
+from RCAEval.e2e import nsigma
+from RCAEval.e2e.baro import (
+    _score_batch,
+    baro,
+    baro_batch,
+    nsigma_batch,
+    robust_scores,
+    standard_scores,
+)
+from RCAEval.io.time_series import preprocess
+
+
+def reference_scores(normal, anomal, scaler_function=RobustScaler):
+    """The per-column scaler loop baro and nsigma used to run"""
+    scores = []
+    for i in range(normal.shape[1]):
+        scaler = scaler_function().fit(normal[:, i].reshape(-1, 1))
+        zscores = scaler.transform(anomal[:, i].reshape(-1, 1))[:, 0]
+        scores.append(max(zscores))
+    return scores
+
+
+def make_metrics(num_rows=200, num_cols=40, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(num_rows, num_cols)) * rng.uniform(0.1, 100, num_cols)
+    values[:, 0] = 5.0  # constant
+    values[:, 1] = np.round(values[:, 1])  # ties
+    values[:, 2] = values[:, 3]  # duplicated columns tie on score
+    values[num_rows // 2 :, 4] += 1e3  # the root cause
+    return values
+
+
+@pytest.mark.parametrize("num_rows", [10, 201, 1400])
+def test_robust_scores(num_rows):
+    values = make_metrics(num_rows=num_rows, seed=num_rows)
+    values[3, 6] = np.nan
+    normal, anomal = values[: num_rows // 2], values[num_rows // 2 :]
+    anomal[1, 7] = np.nan
+
+    np.testing.assert_array_equal(robust_scores(normal, anomal), reference_scores(normal, anomal))
+    np.testing.assert_array_equal(
+        standard_scores(normal, anomal), reference_scores(normal, anomal, StandardScaler)
+    )
+
+    # a batch of cases gives the same scores as each case alone
+    for score_func in [robust_scores, standard_scores]:
+        batch = score_func(np.stack([normal, normal * 3]), np.stack([anomal, anomal * 3]))
+        assert batch == [score_func(normal, anomal), score_func(normal * 3, anomal * 3)]
+
+        assert score_func(normal[:, :0], anomal[:, :0]) == []
+        with pytest.raises(ValueError):
+            score_func(normal[:0], anomal)
+
+
+def test_baro_ranks():
+    values = make_metrics(num_rows=600, num_cols=30, seed=1)
+    columns = [f"svc{i}_{m}" for i, m in enumerate(["cpu", "mem", "latency"] * 10)]
+    data = pd.DataFrame(values, columns=columns)
+    data.insert(0, "time", np.arange(len(data)))
+    inject_time = 300
+
+    out = baro(data, inject_time)
+    normal = preprocess(data[data["time"] < inject_time])[out["node_names"]].to_numpy()
+    anomal = preprocess(data[data["time"] >= inject_time])[out["node_names"]].to_numpy()
+    scores = reference_scores(normal, anomal)
+    ranks = sorted(zip(out["node_names"], scores), key=lambda x: x[1], reverse=True)
+
+    assert out["ranks"] == [x[0] for x in ranks]
+    assert out["ranks"][0] == "svc4_mem"
+
+
+def test_batch():
+    cases = []
+    for seed in range(6):
+        values = make_metrics(num_rows=400, num_cols=12, seed=seed)
+        data = pd.DataFrame(values, columns=[f"svc{i}_{['cpu', 'mem'][i % 2]}" for i in range(12)])
+        data.insert(0, "time", np.arange(len(data)))
+        # constant in the anomalous window only
+        data.loc[200:, "svc8_cpu"] = 1.0
+        if seed % 3 == 2:
+            # another schema
+            data = data.drop(columns=["svc7_mem"])
+        cases.append((data, 150 + 50 * (seed % 2)))
+
+    for batch_func, func in [(baro_batch, baro), (nsigma_batch, nsigma)]:
+        for dataset in [None, "re2-ob", "causalrca-sock-shop"]:
+            outputs = batch_func(cases, dataset=dataset)
+            assert outputs == [func(data, inject_time, dataset=dataset) for data, inject_time in cases]
+
+
+def test_batch_stacks_cases():
+    # RE2-TT sized cases: 10 minutes of 1s metrics, 1200 metrics
+    rng = np.random.default_rng(0)
+    cases = []
+    for _ in range(3):
+        data = pd.DataFrame(rng.lognormal(size=(600, 1200)), columns=[f"svc{i}_cpu" for i in range(1200)])
+        data.insert(0, "time", np.arange(600))
+        cases.append((data, 300))
+
+    passes = []
+
+    def counted_scores(normal, anomal):
+        passes.append(normal.shape)
+        return robust_scores(normal, anomal)
+
+    outputs = _score_batch(cases, counted_scores, dataset="re2-tt")
+    # all the cases in one pass
+    assert passes == [(3, 300, 1200)]
+    assert outputs == [baro(data, inject_time, dataset="re2-tt") for data, inject_time in cases]
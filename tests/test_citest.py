@@ -0,0 +1,101 @@
+"""Tests."""
+from itertools import combinations
+
+import numpy as np
+import pytest
+from causallearn.utils.cit import CIT, fisherz
+
+from RCAEval.graph_construction.citest import CITestCache, FisherZ, data_digest, prefetch_ci_tests
+
+
+def test_cache_keeps_the_latest_used():
+    cache = CITestCache(max_size=3)
+    for key in "abc":
+        cache[key] = ord(key)
+    assert cache["a"] == ord("a")  # a is now the latest used
+    cache["d"] = ord("d")
+    assert len(cache) == 3
+    assert "b" not in cache
+    assert all(key in cache for key in "acd")
+
+
+def test_cache_counts_lookups():
+    cache = CITestCache(max_size=10)
+    assert "a" not in cache
+    cache["a"] = 0.5
+    assert "a" in cache
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats() == {"hits": 2, "misses": 2, "size": 1}
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 0}
+
+
+def test_cache_size_from_env(monkeypatch):
+    monkeypatch.setenv("CITEST_CACHE_SIZE", "5")
+    assert CITestCache().max_size == 5
+
+
+def test_scoped_drops_its_p_values():
+    cache = CITestCache(max_size=10)
+    cache["kept"] = 0.1
+    with cache.scoped():
+        cache["a"] = 0.2
+        with cache.scoped():
+            cache["b"] = 0.3
+        assert "b" in cache  # nested blocks keep theirs until the outer one exits
+    assert "kept" in cache
+    assert "a" not in cache and "b" not in cache
+
+    @cache.scoped()
+    def search():
+        cache["c"] = 0.4
+        return len(cache)
+
+    assert search() == 2
+    assert "c" not in cache
+
+
+def test_data_digest():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(2000, 10))
+    assert data_digest(data) == data_digest(data.copy())
+    assert data_digest(data) == data_digest(np.asfortranarray(data))
+
+    other = data.copy()
+    other[1000, 5] += 1.0
+    assert str(other) == str(data)  # numpy prints only the corners of large arrays
+    assert data_digest(other) != data_digest(data)
+
+    assert data_digest(data) != data_digest(data.reshape(4000, 5))
+    assert data_digest(data) != data_digest(data.astype(np.float32))
+
+
+@pytest.mark.parametrize("size", range(4))
+def test_fisherz_is_causallearn_fisherz(size):
+    rng = np.random.default_rng(size)
+    data = rng.normal(size=(500, 7))
+    data[:, 1] += data[:, 0]
+    data[:, 2] += 0.5 * data[:, 1] - data[:, 3]
+    data[:, 4] += 0.1 * data[:, 2]
+    expected = CIT(data, fisherz)
+    tasks = [
+        (X, Y, S)
+        for X, Y in combinations(range(7), 2)
+        for S in combinations([k for k in range(7) if k not in (X, Y)], size)
+    ]
+    p_values = [expected(X, Y, S) for X, Y, S in tasks]
+
+    test = FisherZ()
+    assert np.allclose(test.batch(data, tasks), p_values, rtol=1e-9, atol=1e-12)
+    assert np.allclose([test(data, X, Y, S) for X, Y, S in tasks], p_values, rtol=1e-9, atol=1e-12)
+
+
+def test_prefetch_does_not_count():
+    cache = CITestCache(max_size=10)
+    cache[(0, 1, ())] = 0.5
+    tasks = {(X, Y, ()): (X, Y, ()) for X, Y in [(0, 1), (0, 2), (1, 2)]}
+    prefetch_ci_tests(tasks, cache, lambda data, X, Y, S: data[X, Y], np.eye(3) + 0.25)
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 3}
+    assert cache[(0, 1, ())] == 0.5  # cached before, not run again
+    assert cache[(1, 2, ())] == 0.25
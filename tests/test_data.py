@@ -0,0 +1,60 @@
+"""Tests."""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from RCAEval.classes.data import ArrayDataLoader, CaseData, MemoryDataLoader
+from RCAEval.classes.graph import Node
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_array_data_loader(seed):
+    rng = np.random.default_rng(seed)
+    num_points = int(rng.integers(1, 60))
+    timestamps = rng.choice(np.arange(1000, 1000 + 4 * num_points), num_points, replace=False)
+    timestamps = np.sort(timestamps)
+    timestamps = timestamps + rng.uniform(0, 1, num_points) * (seed % 2)
+    values = rng.normal(size=(num_points, 3))
+    values[rng.uniform(size=values.shape) < 0.2] = np.nan
+    values[:, 2] = np.nan if seed % 4 == 0 else values[:, 2]
+    nodes = [Node(f"svc{i}", "cpu") for i in range(3)]
+    loader = ArrayDataLoader(timestamps, values, nodes)
+    expected_loader = MemoryDataLoader(
+        {
+            node.entity: {node.metric: list(zip(timestamps, values[:, i]))}
+            for i, node in enumerate(nodes)
+        }
+    )
+
+    interval = timedelta(seconds=float(rng.choice([0.5, 1, 3])))
+    start = float(rng.uniform(950, 1000 + 4 * num_points))
+    end = start + float(rng.uniform(0, 4 * num_points))
+    for node in nodes:
+        expected = expected_loader.load(node.entity, node.metric, start, end, interval)
+        actual = loader.load(node.entity, node.metric, start, end, interval)
+        if expected is None:
+            assert actual is None
+        else:
+            np.testing.assert_allclose(actual, expected)
+    assert loader.load("svc0", "mem", start, end, interval) is None
+
+
+def test_array_data_loader_from_frame():
+    rng = np.random.default_rng(0)
+    columns = ["cart_cpu", "cart_mem", "db_latency_50"]
+    data = pd.DataFrame(rng.normal(size=(200, 3)), columns=columns)
+    data["time"] = np.arange(1000, 1200)
+    loader = ArrayDataLoader.from_frame(data)
+    # as rht, columns whose name has more than two parts are left out
+    assert loader.nodes == [Node("cart", "cpu"), Node("cart", "mem")]
+
+    case = CaseData(
+        loader, sli=Node("cart", "cpu"), detect_time=1150, interval=timedelta(seconds=1)
+    )
+    series = case.load_data(current=1180)
+    window = loader.window(1150 - 120, 1180, timedelta(seconds=1))
+    np.testing.assert_array_equal(series[Node("cart", "mem")], data["cart_mem"].iloc[30:181])
+    # views on one window
+    assert np.shares_memory(series[Node("cart", "cpu")], window)
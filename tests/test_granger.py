@@ -0,0 +1,78 @@
+"""Tests."""
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.stattools import grangercausalitytests
+
+from RCAEval.graph_construction.granger import granger
+
+
+def pairwise_granger(data, maxlag=3, p_val_threshold=0.05, test=None):
+    """One statsmodels test per ordered pair, as granger used to run"""
+    node_names = data.columns.to_list()
+    adj = np.zeros((len(node_names), len(node_names)))
+    for i in range(len(node_names)):
+        for j in range(len(node_names)):
+            if i == j:
+                continue
+            output = grangercausalitytests(data[[node_names[i], node_names[j]]], maxlag, verbose=False)
+            for time_lag, out in output.items():
+                out = out[0]
+                if test is None:
+                    p_val = sum([v[1] for k, v in out.items()]) / len(out)
+                else:
+                    p_val = out[test][1]
+                if p_val < p_val_threshold:
+                    adj[i, j] = 1
+                    break
+    return adj
+
+
+def make_metrics(num_rows=150, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(num_rows, 5))
+    for t in range(2, num_rows):
+        x[t, 1] += 0.4 * x[t - 1, 0]
+        x[t, 2] += 0.3 * x[t - 2, 1]
+    data = pd.DataFrame(x, columns=["a_cpu", "b_cpu", "c_cpu", "d_cpu", "e_cpu"])
+    data["b_mem"] = 2e8 + 1e3 * data["b_cpu"]  # collinear with b_cpu
+    data["f_cpu"] = data["a_cpu"]  # duplicate
+    return data
+
+
+@pytest.mark.filterwarnings("ignore")
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"test": "ssr_chi2test"}, {"maxlag": 5, "p_val_threshold": 0.1}]
+)
+def test_granger(kwargs):
+    data = make_metrics()
+    adj = granger(data, **kwargs)
+    np.testing.assert_array_equal(adj, pairwise_granger(data, **kwargs))
+    np.testing.assert_array_equal(granger(data, n_jobs=2, **kwargs), adj)
+    np.testing.assert_array_equal(granger(data, n_jobs=-1, **kwargs), adj)
+    assert adj[1, 0] == 1 and adj[2, 1] == 1
+
+
+@pytest.mark.filterwarnings("ignore")
+def test_granger_errors():
+    data = make_metrics()
+    with pytest.raises(ValueError):
+        granger(data.head(9))
+    with pytest.raises(Exception, match="constant values"):
+        granger(data.assign(g_cpu=1.0))
+    assert granger(data[["a_cpu"]]).shape == (1, 1)
+
+
+@pytest.mark.filterwarnings("ignore")
+def test_granger_spawn():
+    # the workers get the data from the pool initializer, not from a fork
+    data = make_metrics()
+    context = multiprocessing.get_start_method()
+    try:
+        multiprocessing.set_start_method("spawn", force=True)
+        adj = granger(data, n_jobs=2)
+    finally:
+        multiprocessing.set_start_method(context, force=True)
+    np.testing.assert_array_equal(adj, granger(data))
@@ -0,0 +1,472 @@
+"""Tests."""
+import networkx as nx
+import numpy as np
+import pytest
+
+from RCAEval.classes.graph import MemoryGraph, Node
+from RCAEval.graph_heads import (
+    CPDAG_CASES,
+    RANDOM_WALK_CASES,
+    decode_edges,
+    finalize_directed_adj,
+)
+from RCAEval.graph_heads.page_rank import (
+    page_rank,
+    page_rank_matrix,
+    page_rank_preprocess,
+    sparse_page_rank,
+)
+
+
+def loop_finalize_directed_adj(adj):
+    """finalize_directed_adj as it was written, one pair at a time"""
+    output_adj = np.zeros_like(adj)
+    for i in range(adj.shape[0]):
+        for j in range(adj.shape[1]):
+            if adj[i, j] == adj[j, i] == 0:
+                pass
+            elif adj[j, i] == 1 and adj[i, j] == -1:
+                output_adj[j, i] = 1
+            elif adj[j, i] == -1 and adj[i, j] == 1:
+                output_adj[i, j] = 1
+            elif adj[j, i] == 1 and adj[i, j] == 0:
+                output_adj[j, i] = 1
+            elif adj[j, i] == 0 and adj[i, j] == 1:
+                output_adj[i, j] = 1
+            elif adj[i, j] == adj[j, i] == -1:
+                output_adj[i, j] = output_adj[j, i] = 1
+            elif adj[i, j] == adj[j, i] == 1:
+                output_adj[i, j] = output_adj[j, i] = 1
+            elif adj[i, j] == 2 and adj[j, i] == 1:
+                output_adj[j, i] = 1
+            elif adj[i, j] == 1 and adj[j, i] == 2:
+                output_adj[i, j] = 1
+            elif adj[i, j] == adj[j, i] == 2:
+                output_adj[i, j] = output_adj[j, i] = 1
+            else:
+                raise ValueError(f"Unexpected value: {adj[i, j]=}, {adj[j, i]=}")
+    return output_adj
+
+
+def loop_page_rank_preprocess(adj):
+    """page_rank_preprocess as it was written, one pair at a time"""
+    pr_input = np.zeros_like(adj)
+    for a in range(len(adj)):
+        for b in range(len(adj)):
+            if adj[a, b] == adj[b, a] == 0:
+                pass
+            elif adj[a, b] == adj[b, a] == -1:
+                pr_input[a, b] = pr_input[b, a] = 1
+            elif adj[a, b] == 1 and adj[b, a] == -1:
+                pr_input[a, b] = 1
+            elif adj[a, b] == -1 and adj[b, a] == 1:
+                pr_input[b, a] = 1
+            elif adj[a, b] == 0 and adj[b, a] == 1:
+                pr_input[a, b], pr_input[b, a] = 0, 1
+            elif adj[a, b] == 1 and adj[b, a] == 0:
+                pr_input[a, b], pr_input[b, a] = 1, 0
+            elif adj[a, b] == 1 and adj[b, a] == 1:
+                pr_input[a, b] = pr_input[b, a] = 1
+            elif adj[a, b] == 2 and adj[b, a] == 1:
+                pr_input[a, b], pr_input[b, a] = 1, 0
+            elif adj[a, b] == 1 and adj[b, a] == 2:
+                pr_input[a, b], pr_input[b, a] = 0, 1
+            elif adj[a, b] == 2 and adj[b, a] == 2:
+                pr_input[a, b] = pr_input[b, a] = 1
+            else:
+                raise ValueError(f"Unexpected value: {adj[a, b]}, {adj[b, a]}")
+    return pr_input
+
+
+def loop_random_walk_edges(adj, with_directed=True):
+    """The edges the random walk heads added to their graph, in order"""
+    edges = []
+    for a in range(len(adj)):
+        for b in range(len(adj)):
+            if adj[a, b] == adj[b, a] == 0:
+                pass
+            elif adj[a, b] == adj[b, a] == -1:
+                edges.append((b, a))
+            elif adj[a, b] == 1 and adj[b, a] == -1:
+                edges.append((b, a))
+            elif adj[a, b] == -1 and adj[b, a] == 1:
+                edges.append((a, b))
+            elif with_directed and adj[a, b] == 0 and adj[b, a] == 1:
+                edges.append((a, b))
+            elif with_directed and adj[a, b] == 1 and adj[b, a] == 0:
+                edges.append((b, a))
+            elif with_directed and adj[a, b] == 1 and adj[b, a] == 1:
+                edges.append((a, b))
+                edges.append((b, a))
+            else:
+                raise ValueError(f"Unexpected value: {adj[a, b]}, {adj[b, a]}")
+    return edges
+
+
+def random_adj(num_nodes, marks, seed, dtype=np.int64):
+    """A graph with the end marks of each edge drawn from marks"""
+    rng = np.random.default_rng(seed)
+    adj = np.zeros((num_nodes, num_nodes), dtype=dtype)
+    for a in range(num_nodes):
+        for b in range(a + 1, num_nodes):
+            adj[a, b], adj[b, a] = marks[rng.integers(len(marks))]
+    return adj
+
+
+FCI_MARKS = [(0, 0), (-1, -1), (1, -1), (-1, 1), (0, 1), (1, 0), (1, 1), (2, 1), (1, 2), (2, 2)]
+
+
+@pytest.mark.parametrize("dtype", [np.int64, np.float64])
+@pytest.mark.parametrize("seed", range(5))
+def test_decode_adj(seed, dtype):
+    for num_nodes in [0, 1, 2, 7, 30]:
+        adj = random_adj(num_nodes, FCI_MARKS, seed, dtype)
+        for func, loop in [
+            (finalize_directed_adj, loop_finalize_directed_adj),
+            (page_rank_preprocess, loop_page_rank_preprocess),
+        ]:
+            output = func(adj)
+            assert output.dtype == adj.dtype
+            np.testing.assert_array_equal(output, loop(adj))
+
+    # marks on the diagonal are read as a pair too
+    adj = random_adj(5, FCI_MARKS, seed, dtype)
+    np.fill_diagonal(adj, [0, 1, -1, 2, 1])
+    np.testing.assert_array_equal(finalize_directed_adj(adj), loop_finalize_directed_adj(adj))
+    np.testing.assert_array_equal(page_rank_preprocess(adj), loop_page_rank_preprocess(adj))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_decode_edges_order(seed):
+    adj = random_adj(20, FCI_MARKS[:7], seed)
+    sources, targets = decode_edges(adj, RANDOM_WALK_CASES)
+    assert list(zip(sources, targets)) == loop_random_walk_edges(adj)
+
+    adj = random_adj(20, FCI_MARKS[:4], seed)
+    sources, targets = decode_edges(adj, CPDAG_CASES)
+    assert list(zip(sources, targets)) == loop_random_walk_edges(adj, with_directed=False)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_memory_graph_from_adj(seed):
+    adj = random_adj(12, FCI_MARKS, seed)
+    nodes = [Node("DB", f"X{i}") for i in range(12)]
+    expected = nx.DiGraph()
+    expected.add_nodes_from(nodes)
+    output = loop_finalize_directed_adj(adj)
+    for i in range(12):
+        for j in range(12):
+            if output[i, j] == 1:
+                expected.add_edge(nodes[j], nodes[i])
+
+    graph = MemoryGraph.from_adj(adj, nodes)
+    assert list(graph._graph.edges) == list(expected.edges)
+
+
+def test_decode_unexpected_value():
+    adj = random_adj(6, FCI_MARKS, 0)
+    adj[4, 1], adj[1, 4] = 2, -1
+    adj[3, 5], adj[5, 3] = 3, 0
+    for func, loop in [
+        (finalize_directed_adj, loop_finalize_directed_adj),
+        (page_rank_preprocess, loop_page_rank_preprocess),
+        (lambda adj: decode_edges(adj, CPDAG_CASES), loop_random_walk_edges),
+    ]:
+        with pytest.raises(ValueError) as expected:
+            loop(adj)
+        with pytest.raises(ValueError, match="Unexpected value") as actual:
+            func(adj)
+        assert str(actual.value) == str(expected.value)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_page_rank(seed):
+    from sknetwork.ranking import PageRank
+
+    adj = random_adj(25, FCI_MARKS, seed)
+    node_names = [f"X{i}" for i in range(25)]
+    kwargs = {"damping_factor": 0.7, "n_iter": 30, "tol": 1e-9}
+
+    scores = PageRank(**kwargs).fit_transform(loop_page_rank_preprocess(adj))
+    expected = sorted(zip(node_names, scores), key=lambda x: x[1], reverse=True)
+    assert page_rank(adj, node_names=node_names, **kwargs) == expected
+
+    # seeded on one node
+    weights = np.zeros(25)
+    weights[3] = 1
+    scores = PageRank(**kwargs).fit_transform(loop_page_rank_preprocess(adj), weights)
+    output = dict(page_rank(adj, node_names=node_names, personalization={"X3": 1}, **kwargs))
+    np.testing.assert_allclose([output[name] for name in node_names], scores, rtol=1e-12)
+
+
+def test_sparse_page_rank_warm_start():
+    adj = page_rank_matrix(random_adj(200, FCI_MARKS, 0))
+    scores, stats = sparse_page_rank(adj, n_iter=1000, tol=1e-12)
+    assert stats["converged"] and stats["residual"] < 1e-12
+    assert np.isclose(scores.sum(), 1)
+
+    warm_scores, warm_stats = sparse_page_rank(adj, n_iter=1000, tol=1e-12, x0=scores)
+    assert warm_stats["converged"] and warm_stats["iterations"] < stats["iterations"]
+    np.testing.assert_allclose(warm_scores, scores, atol=1e-12)
+
+    _, stats = sparse_page_rank(adj, n_iter=2, tol=1e-12)
+    assert stats["iterations"] == 2 and not stats["converged"]
+
+    with pytest.raises(ValueError, match="empty"):
+        sparse_page_rank(page_rank_matrix(np.zeros((3, 3))))
+    with pytest.raises(ValueError, match="personalization"):
+        sparse_page_rank(adj, personalization=np.zeros(200))
+
+
+def loop_random_walk_scores(graph, sli, scores, rho, remove_sli, num_loop, seed=0):
+    """RandomWalkScorer as it was written, on a pandas transition matrix"""
+    import pandas as pd
+
+    nodes = list(scores.keys())
+    matrix = pd.DataFrame(np.zeros([len(nodes)] * 2), index=nodes, columns=nodes)
+    for node in scores:
+        for child in graph.children(node):
+            if child in scores:
+                matrix[node][child] = rho * abs(scores[child])
+        parents = graph.parents(node)
+        if remove_sli:
+            parents -= {sli}
+        for parent in parents:
+            if parent in scores:
+                matrix[node][parent] = abs(scores[parent])
+        matrix[node][node] = max(abs(scores[node]) - matrix[node].max(), 0)
+        total_weight = matrix[node].sum()
+        if total_weight > 0:
+            matrix[node] /= total_weight
+        else:
+            matrix[node] = 1 / len(nodes)
+
+    rng = np.random.default_rng(seed)
+    node, counter = sli, {node: 0 for node in nodes}
+    for _ in range(num_loop):
+        node = rng.choice(matrix.index, p=matrix[node])
+        counter[node] += 1
+    return matrix, [counter[node] / num_loop for node in nodes]
+
+
+def random_graph(num_nodes, num_edges, seed):
+    """A MemoryGraph on Node X0..., with the last node isolated and self loops allowed"""
+    rng = np.random.default_rng(seed)
+    nodes = [Node(f"X{i}", None) for i in range(num_nodes)]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes[:-1])
+    for _ in range(num_edges):
+        graph.add_edge(nodes[rng.integers(num_nodes - 1)], nodes[rng.integers(num_nodes - 1)])
+    return MemoryGraph(graph), nodes
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_random_walk_scorer(seed):
+    from RCAEval.classes.data import CaseData
+    from RCAEval.graph_heads.random_walk import RandomWalkScorer, Score
+
+    rng = np.random.default_rng(seed)
+    graph, nodes = random_graph(12, 30, seed)
+    values = rng.normal(size=12) * (rng.uniform(size=12) < 0.7)
+    sli = nodes[seed]
+    kwargs = {"rho": rng.uniform(), "remove_sli": bool(seed % 2)}
+    data = CaseData(data_loader=None, sli=sli, detect_time=0)
+
+    expected_matrix, expected = loop_random_walk_scores(
+        graph, sli, dict(zip(nodes, values)), num_loop=300, **kwargs
+    )
+    scorer = RandomWalkScorer(num_loop=300, **kwargs)
+    scores = {node: Score(value) for node, value in zip(nodes, values)}
+    np.testing.assert_array_equal(
+        scorer.generate_transition_matrix(graph, data, scores), expected_matrix
+    )
+    scores = scorer.score(graph, data, current=0, scores=scores)
+    assert [score.score for score in scores.values()] == expected
+    assert [score["pagerank"] for score in scores.values()] == expected
+
+
+def test_random_walk_scorer_walkers():
+    from RCAEval.classes.data import CaseData
+    from RCAEval.graph_heads.random_walk import RandomWalkScorer, Score
+
+    graph, nodes = random_graph(30, 120, 0)
+    values = np.random.default_rng(0).uniform(size=30)
+    data = CaseData(data_loader=None, sli=nodes[0], detect_time=0)
+
+    def run(**kwargs):
+        scores = {node: Score(value) for node, value in zip(nodes, values)}
+        scores = RandomWalkScorer(**kwargs).score(graph, data, current=0, scores=scores)
+        return np.array([score.score for score in scores.values()])
+
+    stationary = run(method="stationary")
+    matrix = RandomWalkScorer().transition_probabilities(
+        graph, data, {node: Score(value) for node, value in zip(nodes, values)}
+    )
+    np.testing.assert_allclose(stationary @ matrix, stationary, atol=1e-12)
+    assert np.isclose(stationary.sum(), 1)
+    # the graph splits into closed classes, the walk from the SLI stays in one of them
+    assert 0 < (stationary > 0).sum() < 30
+
+    sampled = run(num_loop=400_003, num_walkers=200, seed=1)
+    assert np.isclose(sampled.sum(), 1)
+    np.testing.assert_allclose(sampled, stationary, atol=0.01)
+    # seeded
+    np.testing.assert_array_equal(sampled, run(num_loop=400_003, num_walkers=200, seed=1))
+    assert not np.array_equal(sampled, run(num_loop=400_003, num_walkers=200, seed=2))
+
+    # from the isolated node without score, which moves anywhere, the walk may enter any class
+    values[-1] = 0
+    data = CaseData(data_loader=None, sli=nodes[-1], detect_time=0)
+    stationary = run(method="stationary")
+    assert np.isclose(stationary.sum(), 1) and stationary[-1] == 0
+    np.testing.assert_allclose(run(num_loop=400_000, num_walkers=4000), stationary, atol=0.01)
+
+
+def loop_second_order_walk(matrix, start, beta, num_loop, seed=0):
+    """SecondOrderRandomWalkScorer as it was written, on the transition probabilities"""
+    rng = np.random.default_rng(seed)
+    node = node_pre = start
+    counts = np.zeros(len(matrix))
+    for _ in range(num_loop):
+        prob_pre = matrix[node_pre, node]
+        node_pre = node
+        candidates = [key for key in range(len(matrix)) if matrix[node, key] > 0]
+        weights = [(1 - beta) * prob_pre + beta * matrix[node, key] for key in candidates]
+        total_weight = sum(weights)
+        if total_weight == 0:
+            node = rng.choice(candidates)
+        else:
+            node = rng.choice(candidates, p=[weight / total_weight for weight in weights])
+        counts[node] += 1
+    return counts / num_loop
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_second_order_random_walk_scorer(seed):
+    from RCAEval.classes.data import CaseData
+    from RCAEval.graph_heads.random_walk import SecondOrderRandomWalkScorer, Score
+
+    rng = np.random.default_rng(seed)
+    graph, nodes = random_graph(12, 30, seed)
+    values = rng.normal(size=12) * (rng.uniform(size=12) < 0.7)
+    data = CaseData(data_loader=None, sli=nodes[seed], detect_time=0)
+    kwargs = {"rho": rng.uniform(), "remove_sli": bool(seed % 2), "beta": rng.uniform()}
+
+    scorer = SecondOrderRandomWalkScorer(num_loop=300, **kwargs)
+    matrix = scorer.transition_probabilities(
+        graph, data, {node: Score(value) for node, value in zip(nodes, values)}
+    )
+    expected = loop_second_order_walk(matrix, seed, kwargs["beta"], 300)
+    scores = {node: Score(value) for node, value in zip(nodes, values)}
+    scores = scorer.score(graph, data, current=0, scores=scores)
+    assert [score.score for score in scores.values()] == list(expected)
+
+    with pytest.raises(ValueError, match="sampled"):
+        SecondOrderRandomWalkScorer(method="stationary")
+
+
+def loop_cloudranger_transitions(rela, access, frontend, beta, rho):
+    """The (previous, current, next) transition tensor of relaToRank as it was written"""
+    n = len(access)
+    S = rela[frontend - 1]
+    P = np.array([[abs(S[j]) if access[i][j] != 0 else 0 for j in range(n)] for i in range(n)])
+    line_sum = P.sum(axis=1, keepdims=True)
+    P = np.divide(P, line_sum, out=np.zeros_like(P), where=line_sum != 0)
+    M = np.zeros([n, n, n])
+    for i in range(n):
+        for j in range(n):
+            if access[i][j] > 0:
+                for k in range(n):
+                    M[k, i, j] = (1 - beta) * P[k][i] + beta * P[i][j]
+    for k in range(n):
+        for i in range(n):
+            if np.sum(M[k, i]) > 0:
+                M[k, i] = M[k, i] / np.sum(M[k, i])
+    for k in range(n):
+        for i in range(n):
+            in_inds = []
+            for j in range(n):
+                if access[i][j] == 0 and access[j][i] != 0:
+                    M[k, i, j] = rho * ((1 - beta) * P[k][i] + beta * P[j][i])
+                    in_inds.append(j)
+            if np.sum(M[k, i, in_inds]) > 0:
+                M[k, i, in_inds] /= np.sum(M[k, i, in_inds])
+    for k in range(n):
+        for i in range(n):
+            if M[k, i, i] == 0:
+                in_out_node = list(range(n))
+                in_out_node.remove(i)
+                M[k, i, i] = max(0, S[i] - max(M[k, i, in_out_node]))
+    for k in range(n):
+        for i in range(n):
+            if np.sum(M[k, i]) > 0:
+                M[k, i] /= np.sum(M[k, i])
+    return P, M
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cloudranger_transitions(seed):
+    from RCAEval.e2e.cloudranger import relaToRank
+
+    rng = np.random.default_rng(seed)
+    n = 2 + seed
+    access = rng.choice([-1, 0, 0, 1, 1], size=(n, n))
+    rela = rng.uniform(-1, 1, (n, n))
+    frontend = int(rng.integers(n))
+
+    expected_P, expected_M = loop_cloudranger_transitions(rela, access, frontend, 0.3, 0.2)
+    rank, P, walk = relaToRank(rela, access, 10, frontend, beta=0.3, rho=0.2, seed=seed)
+    np.testing.assert_allclose(P.toarray(), expected_P)
+
+    previous, current = np.divmod(np.arange(n * n), n)
+    rows = walk.rows(previous, current)
+    M = np.zeros([n * n, n + 1])
+    probabilities = np.diff(np.minimum(walk.cdf[rows], 1), axis=1, prepend=0)
+    probabilities[walk.stuck[rows]] = 0
+    # the padding goes to the extra column
+    np.put_along_axis(M, walk.candidates[rows] % (n + 1), probabilities, axis=1)
+    np.testing.assert_allclose(M[:, :n].reshape(n, n, n), expected_M, atol=1e-12)
+
+    assert sorted(label for label, _ in rank) == list(range(1, n + 1))
+    assert rank == relaToRank(rela, access, 10, frontend, beta=0.3, rho=0.2, seed=seed)[0]
+
+
+def test_batch_zscore():
+    from RCAEval.graph_heads.rht import batch_zscore, zscore
+
+    rng = np.random.default_rng(0)
+    train, test = rng.normal(size=(5, 40)), rng.normal(size=(5, 8))
+    train[1] = 3.0
+    train[2, 4] = np.nan
+    expected = [zscore(train_y, test_y) for train_y, test_y in zip(train, test)]
+    np.testing.assert_allclose(batch_zscore(train, test), expected)
+
+
+@pytest.mark.parametrize("tau_max, max_workers", [(0, 1), (1, 1), (2, 3)])
+def test_rht_scorer_batches(tau_max, max_workers):
+    from RCAEval.graph_heads.rht import DecomposableScorer, RHTScorer
+
+    class Windows:
+        train_window = 80
+        test_window = 20
+
+    rng = np.random.default_rng(tau_max)
+    nodes = [Node(f"X{i}", None) for i in range(25)]
+    # without self loops, whose regressions fit exactly, leaving z-scores of rounding errors
+    graph = nx.gnm_random_graph(25, 60, seed=tau_max, directed=True)
+    graph = nx.relabel_nodes(graph, dict(enumerate(nodes)))
+    graph.remove_edges_from(list(graph.out_edges(nodes[3])))
+    graph = MemoryGraph(graph)
+    values = rng.normal(size=(120, 25)).cumsum(axis=0)
+    values[7, 2] = np.nan
+    series = {node: list(values[:, i]) for i, node in enumerate(nodes)}
+    # left to score_node
+    series[nodes[3]] = series[nodes[3]][:-1]
+
+    scorer = RHTScorer(tau_max=tau_max, max_workers=max_workers)
+    expected = DecomposableScorer._score(scorer, nodes, series, graph, Windows())
+    actual = scorer._score(nodes, series, graph, Windows())
+    assert list(actual) == list(expected)
+    np.testing.assert_allclose(
+        [score.score for score in actual.values()], [score.score for score in expected.values()]
+    )
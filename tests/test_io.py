@@ -0,0 +1,236 @@
+"""Tests."""
+import os
+import tempfile
+from os import path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from RCAEval.io.columnar import (
+    cache_paths,
+    convert_csv,
+    convert_dataset,
+    is_cache_fresh,
+    load_case_window,
+    read_csv,
+)
+
+
+def make_case(case_dir, num_rows=120, inject_offset=60, seed=0):
+    """Write a small metric case with a data.csv and an inject_time.txt"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(case_dir, exist_ok=True)
+    start = 1692569339
+    data = pd.DataFrame(
+        {
+            "time": np.arange(start, start + num_rows),
+            "cart_cpu": rng.normal(1, 0.1, num_rows),
+            "cart_mem": rng.normal(2e8, 1e6, num_rows),
+            "cart_latency-50": rng.normal(0.1, 0.01, num_rows),
+            "cart_latency-90": rng.normal(0.2, 0.01, num_rows),
+            "front_cpu": np.ones(num_rows),
+        }
+    )
+    data.loc[3:5, "cart_cpu"] = np.nan
+    data.loc[7, "cart_mem"] = np.inf
+    data.to_csv(path.join(case_dir, "data.csv"), index=False)
+    with open(path.join(case_dir, "inject_time.txt"), "w") as f:
+        f.write(str(start + inject_offset))
+    return path.join(case_dir, "data.csv")
+
+
+def test_columnar_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = make_case(path.join(tmp, "cart_cpu", "1"))
+        assert not is_cache_fresh(csv_path)
+
+        assert convert_dataset(tmp) == 1
+        assert is_cache_fresh(csv_path)
+        assert all(path.exists(p) for p in cache_paths(csv_path))
+
+        expected = pd.read_csv(csv_path)
+        pd.testing.assert_frame_equal(read_csv(csv_path), expected)
+        pd.testing.assert_frame_equal(read_csv(csv_path, mmap=True), expected)
+
+        # a CSV newer than its cache invalidates it
+        for cache_path in cache_paths(csv_path):
+            os.utime(cache_path, (os.path.getmtime(csv_path) - 10,) * 2)
+        assert not is_cache_fresh(csv_path)
+        assert convert_csv(csv_path)
+        assert is_cache_fresh(csv_path)
+
+
+def test_columnar_cache_skips_non_numeric():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = path.join(tmp, "traces.csv")
+        pd.DataFrame({"time": [1, 2], "operation": ["a", "b"]}).to_csv(csv_path, index=False)
+        assert not convert_csv(csv_path)
+        assert not is_cache_fresh(csv_path)
+        assert read_csv(csv_path)["operation"].to_list() == ["a", "b"]
+
+
+def test_catalog():
+    from RCAEval.io.catalog import build_catalog
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_case(path.join(tmp, "cart_cpu", "1"), seed=1)
+        make_case(path.join(tmp, "cart_mem", "2"), num_rows=90, inject_offset=30, seed=2)
+
+        catalog = build_catalog(tmp)
+        assert [case["id"] for case in catalog] == ["cart_cpu_1", "cart_mem_2"]
+
+        entry = catalog.entry("cart_mem_2")
+        assert entry["service"] == "cart" and entry["fault"] == "mem"
+        assert entry["inject_time"] == 1692569339 + 30
+        assert entry["rows"] == 90
+        assert (entry["time_start"], entry["time_end"]) == (1692569339, 1692569339 + 89)
+
+        for case in catalog:
+            data_path = catalog.data_path(case)
+            assert catalog.entry(data_path) is case
+            pd.testing.assert_frame_equal(catalog.load(case), pd.read_csv(data_path))
+
+        # the frame is a view on the memory map, not a copy
+        data = catalog.load("cart_cpu_1")
+        assert np.shares_memory(data["cart_cpu"].to_numpy(), catalog.matrix("cart_cpu_1"))
+
+        # up to date catalogs are reused as is
+        mtime = os.path.getmtime(path.join(tmp, "catalog.json"))
+        build_catalog(tmp)
+        assert os.path.getmtime(path.join(tmp, "catalog.json")) == mtime
+
+
+def full_window(csv_path, inject_time, length):
+    """The window as main.py used to compute it from the whole CSV"""
+    data = pd.read_csv(csv_path)
+    data = data.loc[:, ~data.columns.str.endswith("_latency-50")]
+    data = data.replace([np.inf, -np.inf], np.nan)
+    data = data.fillna(method="ffill")
+    data = data.fillna(0)
+    normal_df = data[data["time"] < inject_time].tail(length)
+    anomal_df = data[data["time"] >= inject_time].head(length)
+    return pd.concat([normal_df, anomal_df], ignore_index=True)
+
+
+@pytest.mark.parametrize("source", ["csv", "cache", "catalog"])
+def test_load_case_window(source):
+    from RCAEval.io.catalog import build_catalog
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = make_case(path.join(tmp, "cart_cpu", "1"), num_rows=300, inject_offset=150)
+        # gaps across the window start must be filled from before the window
+        data = pd.read_csv(csv_path)
+        data.loc[90:110, "cart_cpu"] = np.nan
+        data.loc[95:105, "cart_mem"] = np.inf
+        data.loc[:120, "front_cpu"] = np.nan
+        data.to_csv(csv_path, index=False)
+
+        catalog = None
+        if source == "cache":
+            assert convert_csv(csv_path)
+        elif source == "catalog":
+            catalog = build_catalog(tmp)
+
+        start = 1692569339
+        for inject_time, length in [
+            (start + 150, 50),
+            (start + 150, 200),
+            (start + 10, 30),
+            (start + 290, 30),
+            (start + 1000, 30),
+            (start + 150, 0),
+        ]:
+            window = load_case_window(csv_path, inject_time, length, length, catalog=catalog, chunksize=64)
+            pd.testing.assert_frame_equal(window, full_window(csv_path, inject_time, length))
+
+
+def test_load_case_window_unsorted():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = make_case(path.join(tmp, "cart_cpu", "1"))
+        data = pd.read_csv(csv_path)
+        data.iloc[::-1].to_csv(csv_path, index=False)
+        inject_time = 1692569339 + 60
+        expected = full_window(csv_path, inject_time, 20)
+
+        window = load_case_window(csv_path, inject_time, 20, 20, chunksize=16)
+        pd.testing.assert_frame_equal(window, expected)
+        assert convert_csv(csv_path)
+        pd.testing.assert_frame_equal(load_case_window(csv_path, inject_time, 20, 20), expected)
+
+
+def test_preprocess():
+    from RCAEval.io.time_series import drop_extra, preprocess, select_useful_cols
+
+    rng = np.random.default_rng(0)
+    num_rows = 50
+    data = pd.DataFrame(
+        {
+            "time": np.arange(num_rows),
+            "cart_cpu": rng.normal(0, 5, num_rows),
+            "cart_mem": rng.integers(1e8, 2e8, num_rows),
+            "cart_lat50": rng.normal(0, 0.1, num_rows),
+            "front_cpu": np.ones(num_rows),  # constant
+            "front_mem": np.r_[np.ones(num_rows - 2), 2.0, 2.0] * 3e8,  # near constant
+            "main_cpu": rng.normal(0, 5, num_rows),  # extra
+            "quiet_cpu": rng.normal(0, 0.1, num_rows),  # not useful
+            "time.1": np.arange(num_rows),
+        },
+        index=np.arange(num_rows) + 100,
+    )
+    data.loc[110, "cart_cpu"] = np.nan
+
+    assert preprocess(data) is data
+    assert preprocess(data, dataset="causalrca-sock-shop").columns.to_list() == data.columns[1:].to_list()
+
+    out = preprocess(data, dataset="re2-ob")
+    assert out.columns.to_list() == [
+        "cart_cpu", "cart_mem", "cart_lat50", "front_mem", "main_cpu", "quiet_cpu", "time.1"
+    ]
+    assert out.index.equals(data.index)
+    np.testing.assert_array_equal(out["cart_mem"], data["cart_mem"] / 1e6)
+    np.testing.assert_array_equal(out["cart_cpu"], data["cart_cpu"])
+    assert out["time.1"].dtype == np.int64
+
+    out = preprocess(data, dataset="re2-ob", dk_select_useful=True)
+    assert out.columns.to_list() == ["cart_cpu", "cart_mem", "cart_lat50"]
+    np.testing.assert_array_equal(out["cart_mem"], data["cart_mem"] / 1e6)
+
+    assert drop_extra(data).columns.to_list() == [
+        "time", "cart_cpu", "cart_mem", "cart_lat50", "front_cpu", "front_mem", "quiet_cpu"
+    ]
+    # time is kept, and twice if its name also looks like a metric
+    assert select_useful_cols(data.rename(columns={"quiet_cpu": "time_cpu"})) == [
+        "time", "cart_cpu", "cart_mem", "cart_lat50", "front_mem", "main_cpu", "time_cpu", "time.1"
+    ]
+
+
+@pytest.mark.parametrize("dataset", [None, "re2-ob", "causalrca-sock-shop"])
+@pytest.mark.parametrize("anomalies", [None, [50]])
+def test_split_and_preprocess(dataset, anomalies):
+    from RCAEval.io.time_series import preprocess, split_and_preprocess
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = pd.read_csv(make_case(tmp)).fillna(0).replace(np.inf, 0)
+    # constant in the anomalous window only
+    data.loc[60:, "cart_cpu"] = 1.0
+    inject_time = data["time"][60]
+
+    if anomalies is None:
+        normal_df = data[data["time"] < inject_time]
+        anomal_df = data[data["time"] >= inject_time]
+    else:
+        normal_df = data.head(anomalies[0])
+        anomal_df = data.tail(len(data) - anomalies[0])
+    normal_df = preprocess(normal_df, dataset=dataset)
+    anomal_df = preprocess(anomal_df, dataset=dataset)
+    columns = [c for c in normal_df.columns if c in anomal_df.columns]
+
+    normal, anomal, actual_columns = split_and_preprocess(
+        data, inject_time, dataset=dataset, anomalies=anomalies
+    )
+    assert actual_columns == columns
+    np.testing.assert_array_equal(normal, normal_df[columns].to_numpy(dtype=np.float64))
+    np.testing.assert_array_equal(anomal, anomal_df[columns].to_numpy(dtype=np.float64))
+    if dataset == "re2-ob" and anomalies is None:
+        assert "cart_cpu" not in columns and "front_cpu" not in columns
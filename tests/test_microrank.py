@@ -0,0 +1,127 @@
+"""Tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from RCAEval.e2e.microrank import build_span_graph, get_pagerank_graph, pageRank, trace_pagerank
+
+
+def make_spans(num_traces, seed=0, num_services=5):
+    """A span frame of random call trees, shuffled"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for trace in range(num_traces):
+        spans = []
+        for k in range(int(rng.integers(1, 10))):
+            spans.append(f"{trace}-{k}")
+            rows.append(
+                {
+                    "traceID": f"trace{trace}",
+                    "spanID": spans[-1],
+                    "parentSpanID": spans[rng.integers(k)] if k else np.nan,
+                    "serviceName": f"svc{rng.integers(num_services)}",
+                    "methodName": f"m{rng.integers(3)}",
+                    "startTime": trace * 1000 + k * 10,
+                    "duration": int(rng.integers(100, 5000)),
+                }
+            )
+    df = pd.DataFrame(rows).sample(frac=1, random_state=seed).reset_index(drop=True)
+    df["operation"] = df["serviceName"] + "_" + df["methodName"]
+    return df
+
+
+def loop_pagerank_graph(df):
+    """get_pagerank_graph as it was written, with two iterrows loops"""
+    operation_operation, operation_trace, trace_operation = {}, {}, {}
+    op_dict, child_dict = {}, {}
+    for _, row in df.iterrows():
+        op_dict[row["spanID"]] = row["operation"]
+        child_dict.setdefault(row["parentSpanID"], []).append(row["spanID"])
+        operation_trace.setdefault(row["traceID"], []).append(row["operation"])
+        trace_operation.setdefault(row["operation"], []).append(row["traceID"])
+    for _, row in df.iterrows():
+        op = row["operation"]
+        # (sic) always true, the children of an operation are the ones of its last span
+        if op not in operation_trace:
+            operation_operation[op] = []
+        children = child_dict.get(row["spanID"], [])
+        operation_operation[op].extend(op_dict[child] for child in children)
+    pr_trace = {trace_id: list(ops) for trace_id, ops in operation_trace.items()}
+    sets = [
+        {key: sorted(set(values)) for key, values in relation.items()}
+        for relation in (operation_operation, operation_trace, trace_operation)
+    ]
+    return (*sets, pr_trace)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_pagerank_graph(seed):
+    df = make_spans(30 + 10 * seed, seed)
+    if seed % 2:
+        # duplicated spans
+        df = pd.concat([df, df.iloc[:7]], ignore_index=True)
+    expected = loop_pagerank_graph(df)
+    actual = get_pagerank_graph(df)
+    for expected_relation, relation in zip(expected[:3], actual[:3]):
+        assert list(relation) == list(expected_relation)
+        assert {key: sorted(values) for key, values in relation.items()} == expected_relation
+    assert actual[3] == expected[3]
+
+
+def test_build_span_graph():
+    df = make_spans(20)
+    operations, traces, (parents, children), coverage = build_span_graph(df)
+    assert operations.tolist() == df["operation"].unique().tolist()
+    assert traces.tolist() == df["traceID"].unique().tolist()
+    assert coverage.sum() == len(df)
+    assert coverage.shape == (len(traces), len(operations))
+    assert len(set(zip(parents, children))) == len(parents)
+
+
+def dense_trace_pagerank(operation_operation, operation_trace, trace_operation, pr_trace, anomaly):
+    """trace_pagerank as it was written, on dense matrices"""
+    nodes, traces = list(operation_operation), list(operation_trace)
+    p_ss = np.zeros((len(nodes), len(nodes)), dtype=np.float32)
+    p_sr = np.zeros((len(nodes), len(traces)), dtype=np.float32)
+    p_rs = np.zeros((len(traces), len(nodes)), dtype=np.float32)
+    for operation, children in operation_operation.items():
+        for child in children:
+            p_ss[nodes.index(child)][nodes.index(operation)] = 1.0 / len(children)
+    for trace_id, children in operation_trace.items():
+        for child in children:
+            p_sr[nodes.index(child)][traces.index(trace_id)] = 1.0 / len(children)
+    for operation, children in trace_operation.items():
+        for child in children:
+            p_rs[traces.index(child)][nodes.index(operation)] = 1.0 / len(children)
+
+    # the number of traces with the same coverage
+    coverage = p_sr.T
+    kinds = [sum((row == other).all() for other in coverage) for row in coverage]
+    pr = np.zeros((len(traces), 1), dtype=np.float32)
+    if not anomaly:
+        num_sum = sum(1.0 / kinds[traces.index(trace_id)] for trace_id in pr_trace)
+        for trace_id in pr_trace:
+            pr[traces.index(trace_id)] = 1.0 / kinds[traces.index(trace_id)] / num_sum
+    else:
+        kind_sum = sum(1.0 / kinds[traces.index(trace_id)] for trace_id in pr_trace)
+        num_sum = sum(1.0 / len(ops) for ops in pr_trace.values())
+        for trace_id, ops in pr_trace.items():
+            kind = kinds[traces.index(trace_id)]
+            pr[traces.index(trace_id)] = (
+                1.0 / (kind / kind_sum * 0.5 + 1.0 / len(ops)) / num_sum * 0.5
+            )
+
+    result = pageRank(p_ss, p_sr, p_rs, pr, len(nodes), len(traces))[:, 0]
+    weight = {operation: result[i] * result.sum() / len(nodes) for i, operation in enumerate(nodes)}
+    return weight, {operation: int((p_sr[i] != 0).sum()) for i, operation in enumerate(nodes)}
+
+
+@pytest.mark.parametrize("anomaly", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_trace_pagerank(seed, anomaly):
+    graph = get_pagerank_graph(make_spans(40 + 20 * seed, seed, num_services=3 + seed))
+    expected_weight, expected_num = dense_trace_pagerank(*graph, anomaly)
+    weight, num = trace_pagerank(*graph, anomaly)
+    assert num == expected_num
+    assert list(weight) == list(expected_weight)
+    np.testing.assert_allclose(list(weight.values()), list(expected_weight.values()), rtol=1e-12)
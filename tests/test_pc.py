@@ -0,0 +1,85 @@
+"""Tests."""
+import numpy as np
+import pandas as pd
+import pytest
+from causallearn.search.ConstraintBased.FCI import fci as causallearn_fci
+from causallearn.search.ConstraintBased.PC import pc as causallearn_pc
+
+from RCAEval.graph_construction.citest import FisherZ
+from RCAEval.graph_construction.fci import fci, fci_default
+from RCAEval.graph_construction.pc import pc, pc_default
+
+
+def make_data(seed, num_rows=300, num_nodes=8):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(num_rows, num_nodes))
+    weights = np.triu(rng.normal(size=(num_nodes, num_nodes)) * (rng.random((num_nodes, num_nodes)) < 0.35), 1)
+    for j in range(num_nodes):
+        x[:, j] += x @ weights[:, j]
+    return x
+
+
+def sepsets(cg):
+    n = cg.sepset.shape[0]
+    return [[None if cg.sepset[i, j] is None else list(cg.sepset[i, j]) for j in range(n)] for i in range(n)]
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("stable", [True, False])
+def test_pc_is_causallearn_pc(seed, stable):
+    data = make_data(seed)
+    expected = causallearn_pc(data, stable=stable, show_progress=False)
+    cg = pc(data, stable=stable, show_progress=False)
+    assert np.array_equal(cg.G.graph, expected.G.graph)
+    assert sepsets(cg) == sepsets(expected)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_fisherz_pc_is_causallearn_pc(seed):
+    data = make_data(seed, num_nodes=10)
+    expected = causallearn_pc(data, show_progress=False)
+    cg = pc(data, indep_test=FisherZ(), show_progress=False)
+    assert np.array_equal(cg.G.graph, expected.G.graph)
+    assert sepsets(cg) == sepsets(expected)
+
+    expected, _ = causallearn_fci(data)
+    graph, _ = fci(data, FisherZ())
+    assert np.array_equal(graph.graph, expected.graph)
+
+
+def test_fci_depth():
+    data = make_data(0)
+    expected, _ = fci(data, depth=0)
+    graph, _ = fci(data, depth=0, n_jobs=2)
+    assert np.array_equal(graph.graph, expected.graph)
+    with pytest.raises(TypeError):
+        fci(data, depth=1.0)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("parallel_backend", ["thread", "process"])
+def test_parallel_pc_is_serial_pc(seed, parallel_backend):
+    data = make_data(seed, num_nodes=10)
+    expected = pc(data, show_progress=False)
+    cg = pc(data, show_progress=False, n_jobs=2, parallel_backend=parallel_backend)
+    assert np.array_equal(cg.G.graph, expected.G.graph)
+    assert sepsets(cg) == sepsets(expected)
+    # the search reads back every prefetched p-value
+    assert cg.test.p_values.misses == 0
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("parallel_backend", ["thread", "process"])
+def test_parallel_fci_is_serial_fci(seed, parallel_backend):
+    data = make_data(seed)
+    expected, _ = causallearn_fci(data)
+    serial, _ = fci(data)
+    graph, _ = fci(data, n_jobs=2, parallel_backend=parallel_backend)
+    assert np.array_equal(serial.graph, expected.graph)
+    assert np.array_equal(graph.graph, serial.graph)
+
+
+def test_defaults_take_n_jobs():
+    data = pd.DataFrame(make_data(0), columns=[f"s{i}_cpu" for i in range(8)])
+    assert np.array_equal(pc_default(data, n_jobs=2), pc_default(data))
+    assert np.array_equal(fci_default(data, n_jobs=2), fci_default(data))
@@ -0,0 +1,90 @@
+"""Tests."""
+import os
+import time
+import tempfile
+from os import path
+
+import pytest
+
+from RCAEval.benchmark.store import (
+    STATUS_FAILED,
+    STATUS_OK,
+    CaseTimeout,
+    ResultStore,
+    file_fingerprint,
+    result_key,
+    time_limit,
+)
+
+
+def test_result_key():
+    key = result_key(method="baro", kwargs={"dataset": "re2-ob", "anomalies": None}, length=20)
+    assert key == result_key(length=20, kwargs={"anomalies": None, "dataset": "re2-ob"}, method="baro")
+    assert key != result_key(method="baro", kwargs={"dataset": "re2-ob", "anomalies": None}, length=10)
+
+
+def test_file_fingerprint():
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = path.join(tmp, "data.csv")
+        with open(filename, "w") as f:
+            f.write("time,a_cpu\n1,0.5\n")
+        before = file_fingerprint(filename)
+        assert before == file_fingerprint(filename)
+
+        with open(filename, "a") as f:
+            f.write("2,0.7\n")
+        assert before != file_fingerprint(filename)
+
+
+def test_store_fingerprint():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(path.join(tmp, "store"))
+        filename = path.join(tmp, "data.csv")
+        with open(filename, "w") as f:
+            f.write("time,a_cpu\n1,0.5\n")
+        stat = os.stat(filename)
+        assert store.fingerprint(filename) == file_fingerprint(filename)
+        # kept apart from the case records
+        assert os.listdir(path.join(tmp, "store")) == ["fingerprints"]
+
+        # same size and mtime, the stored hash is returned without reading the file
+        with open(filename, "w") as f:
+            f.write("time,a_cpu\n1,0.7\n")
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert store.fingerprint(filename) != file_fingerprint(filename)
+
+        # a new mtime, the file is hashed again
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert store.fingerprint(filename) == file_fingerprint(filename)
+
+
+def test_result_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(tmp)
+        assert store.get("abc") is None
+        assert not store.is_done("abc")
+
+        store.put("abc", {"status": STATUS_FAILED, "error": "boom"})
+        assert store.get("abc")["error"] == "boom"
+        assert not store.is_done("abc")
+
+        store.put("abc", {"status": STATUS_OK, "ranks": ["a_cpu", "b_mem"]})
+        assert store.get("abc")["ranks"] == ["a_cpu", "b_mem"]
+        assert store.is_done("abc")
+
+
+def test_time_limit():
+    with pytest.raises(CaseTimeout):
+        with time_limit(0.1):
+            time.sleep(1)
+
+    # an RCA method catching Exception must not swallow the timeout
+    with pytest.raises(CaseTimeout):
+        with time_limit(0.1):
+            try:
+                time.sleep(1)
+            except Exception:
+                pass
+
+    with time_limit(None):
+        time.sleep(0.01)
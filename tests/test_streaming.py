@@ -0,0 +1,98 @@
+"""Tests."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from RCAEval.e2e import streaming
+from RCAEval.e2e.baro import robust_scores
+from RCAEval.e2e.streaming import StreamingBARO, StreamingNSigma
+
+
+def make_stream(num_rows=600, num_cols=8, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(num_rows, num_cols)) * rng.uniform(0.5, 1e3, num_cols)
+    values[:, 1] = 3.0  # constant
+    values[num_rows // 2 :, 5] += 5e3  # the root cause
+    data = pd.DataFrame(values, columns=[f"svc{i}_cpu" for i in range(num_cols)])
+    data.insert(0, "time", np.arange(num_rows))
+    return data
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 300])
+def test_streaming_nsigma(batch_size):
+    data = make_stream()
+    normal, anomal = data.iloc[:300], data.iloc[300:]
+    window = 100
+
+    scorer = StreamingNSigma(window=window)
+    for i in range(0, len(normal), batch_size):
+        scorer.update(normal.iloc[i : i + batch_size])
+    for i in range(0, len(anomal), batch_size):
+        scorer.score(anomal.iloc[i : i + batch_size])
+
+    # exact statistics of the last `window` normal samples
+    baseline = normal.drop(columns=["time"]).tail(window).to_numpy()
+    values = anomal.drop(columns=["time"]).to_numpy()
+    expected = StandardScaler().fit(baseline).transform(values).max(axis=0)
+    np.testing.assert_allclose(scorer._scores, expected, rtol=1e-9, atol=1e-9)
+
+    out = scorer.ranks()
+    assert out["node_names"] == [f"svc{i}_cpu" for i in range(8)]
+    assert out["ranks"][0] == "svc5_cpu"
+
+
+def test_streaming_baro():
+    data = make_stream()
+    normal, anomal = data.iloc[:300], data.iloc[300:]
+
+    # while the window is not full, the quantiles are exact
+    scorer = StreamingBARO(window=300)
+    scorer.update(normal)
+    scorer.score(anomal)
+    columns = scorer.columns
+    expected = robust_scores(normal[columns].to_numpy(), anomal[columns].to_numpy())
+    np.testing.assert_array_equal(scorer._scores, expected)
+    assert scorer.ranks()["ranks"][0] == "svc5_cpu"
+
+    # after the warm-up, the estimates follow a shifted baseline
+    rng = np.random.default_rng(1)
+    scorer = StreamingBARO(window=100, learning_rate=0.05, columns=["a", "b"])
+    scorer.update(rng.normal(0, 1, size=(100, 2)))
+    for row in rng.normal(10, 1, size=(2000, 2)):
+        scorer.update(row)
+    center, scale = scorer._center_scale()
+    np.testing.assert_allclose(center, 10, atol=0.3)
+    np.testing.assert_allclose(scale, 1.35, atol=0.3)
+
+
+def test_streaming_scorer_api():
+    scorer = StreamingNSigma(window=10, columns=["a", "b"])
+    with pytest.raises(ValueError):
+        scorer.score([1.0, 2.0])
+    assert scorer.ranks() == {"node_names": ["a", "b"], "ranks": ["a", "b"]}
+
+    scorer.update(np.arange(20, dtype=float).reshape(10, 2))
+    scorer.score({"a": 4.0, "b": 100.0})
+    assert scorer.ranks()["ranks"] == ["b", "a"]
+    scorer.reset()
+    assert scorer.ranks()["ranks"] == ["a", "b"]
+    with pytest.raises(ValueError):
+        scorer.update(np.zeros((2, 3)))
+
+
+def test_streaming_baro_warmup():
+    rng = np.random.default_rng(2)
+    rows = rng.normal(size=(50, 3))
+    scorer = StreamingBARO(window=50, columns=["a", "b", "c"])
+    for i in range(0, 40, 4):
+        scorer.update(rows[i : i + 4])
+        quantiles = scorer._exact_quantiles()
+        assert scorer._exact_quantiles() is quantiles  # cached until the next update
+        expected = np.percentile(rows[: i + 4], [25.0, 50.0, 75.0], axis=0)
+        np.testing.assert_allclose(quantiles, expected)
+    scorer.update(rows[40:])
+    np.testing.assert_allclose(scorer._quantiles, np.percentile(rows, [25.0, 50.0, 75.0], axis=0))
+
+    with pytest.raises(TypeError):
+        streaming._StreamingScorer(window=10)
@@ -0,0 +1,110 @@
+"""Tests."""
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from RCAEval.e2e.tracerca import (
+    itemset_ranks,
+    mine_itemsets,
+    operation_scores,
+    trace_operation_matrix,
+)
+
+
+def make_spans(num_spans=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "traceID": rng.integers(0, num_spans // 8, num_spans).astype(str),
+            "operation": rng.choice(["cart_get", "cart_set", "checkout", "frontend"], num_spans),
+            "abnormal": rng.random(num_spans) < 0.2,
+        }
+    )
+
+
+def loop_operation_scores(anomal_df):
+    # the support and confidence of tracerca as it was written
+    scores = {}
+    for op in list(anomal_df.operation.unique()):
+        s = anomal_df[anomal_df.operation == op]["abnormal"].sum() / anomal_df["abnormal"].sum()
+        c = anomal_df[anomal_df.operation == op]["abnormal"].sum() / len(
+            anomal_df[anomal_df.operation == op]
+        )
+        scores[op] = (s, c, 2 * s * c / (s + c))
+    return scores
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_operation_scores(seed):
+    df = make_spans(seed=seed)
+    actual = operation_scores(df)
+    expected = loop_operation_scores(df)
+    assert list(actual.index) == list(expected)
+    for op, row in actual.iterrows():
+        assert np.allclose(row[["support", "confidence", "ji"]], expected[op])
+
+
+def brute_force_itemsets(df, max_size, min_support):
+    traces = {trace: set(spans.operation) for trace, spans in df.groupby("traceID")}
+    abnormal = set(df.traceID[df.abnormal])
+    operations = list(df.operation.unique())
+    output = {}
+    for size in range(1, max_size + 1):
+        for items in combinations(range(len(operations)), size):
+            ops = {operations[j] for j in items}
+            having = {trace for trace, trace_ops in traces.items() if ops <= trace_ops}
+            hits = len(having & abnormal)
+            support = hits / len(abnormal)
+            if hits and support >= min_support:
+                confidence = hits / len(having)
+                output[items] = (support, confidence)
+    return output
+
+
+@pytest.mark.parametrize("min_support", [0.0, 0.3, 0.8])
+def test_mine_itemsets(min_support):
+    df = make_spans(seed=1)
+    operations, matrix, abnormal = trace_operation_matrix(df)
+    assert list(operations) == list(df.operation.unique())
+    itemsets = mine_itemsets(matrix, abnormal, 3, min_support)
+    expected = brute_force_itemsets(df, 3, min_support)
+    assert {items for items, *_ in itemsets} == set(expected)
+    for items, support, confidence, ji in itemsets:
+        assert np.allclose((support, confidence), expected[items])
+        assert np.isclose(ji, 2 * support * confidence / (support + confidence))
+
+
+def test_itemset_ranks_are_complete():
+    df = make_spans(seed=2)
+    # rare operations, in a few traces each, are in no frequent itemset
+    df.loc[0:2, "operation"] = "payment"
+    df.loc[0:2, "abnormal"] = True
+    df.loc[3:6, "operation"] = "shipping"
+    df.loc[3:6, "abnormal"] = [True, False, False, False]
+    df.loc[7:8, "operation"] = "email"
+    df.loc[7:8, "abnormal"] = False
+
+    operations, matrix, abnormal = trace_operation_matrix(df)
+    frequent = {
+        operations[j] for items, *_ in mine_itemsets(matrix, abnormal, 2, 0.3) for j in items
+    }
+    assert frequent == {"cart_get", "cart_set", "checkout", "frontend"}
+
+    ranks = itemset_ranks(df, 2, 0.3)
+    assert set(ranks[:4]) == frequent
+    # by their own ji, and the operation without abnormal spans dropped as by
+    # the default ranking
+    assert ranks[4:] == ["payment", "shipping"]
+
+
+def test_itemset_ranks_drop_operations_without_ji():
+    df = make_spans(seed=1)
+    # in abnormal traces, so in frequent itemsets, but never abnormal itself
+    df.loc[df.operation == "checkout", "abnormal"] = False
+    operations, matrix, abnormal = trace_operation_matrix(df)
+    assert "checkout" in {
+        operations[j] for items, *_ in mine_itemsets(matrix, abnormal, 2, 0.1) for j in items
+    }
+    assert set(itemset_ranks(df, 2, 0.1)) == {"cart_get", "cart_set", "frontend"}
@@ -0,0 +1,64 @@
+"""Tests."""
+import numpy as np
+import pandas as pd
+
+from RCAEval.io.traces import (
+    abnormal_spans,
+    add_operation,
+    add_slo,
+    operation_slo,
+    split_spans,
+)
+
+
+def make_spans(num_spans=500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "serviceName": rng.choice(["cart", "checkout", "frontend"], num_spans),
+            "methodName": rng.choice(["get", "set", None], num_spans),
+            "operationName": rng.choice(["GET", "POST"], num_spans),
+            "startTime": np.sort(rng.integers(0, 10_000_000, num_spans)),
+            "duration": rng.integers(100, 50_000, num_spans),
+        }
+    )
+    return add_operation(df)
+
+
+def loop_operation_slo(span_df):
+    """The SLOs as get_operation_slo computed them, filtering the frame per operation"""
+    operation_slo = {}
+    for op in span_df["operation"].dropna().unique():
+        mean = round(span_df[span_df["operation"] == op]["duration"].mean() / 1_000, 2)
+        std = round(span_df[span_df["operation"] == op]["duration"].std() / 1_000, 2)
+        operation_slo[op] = {"mean": mean, "std": std}
+    return operation_slo
+
+
+def test_operation_slo():
+    span_df = make_spans()
+    assert "frontend_POST" in set(span_df["operation"])
+    expected = loop_operation_slo(span_df)
+    slo = operation_slo(span_df).to_dict(orient="index")
+    assert list(slo) == list(expected)
+    assert slo == expected
+
+
+def test_split_operation_slo():
+    span_df = make_spans()
+    inject_time = 6_000_000
+    normal_df, anomal_df = split_spans(span_df, inject_time)
+    assert len(normal_df) + len(anomal_df) == len(span_df)
+    assert (normal_df["startTime"] + normal_df["duration"] < inject_time).all()
+
+    slo = operation_slo(normal_df)
+    assert slo.to_dict(orient="index") == loop_operation_slo(normal_df)
+
+    spans = add_slo(anomal_df, slo.drop(index=anomal_df["operation"].iloc[0]))
+    assert spans.index.equals(anomal_df.index)
+    expected = [slo.loc[op, "mean"] for op in anomal_df["operation"]]
+    known = spans["operation"] != anomal_df["operation"].iloc[0]
+    np.testing.assert_array_equal(spans["mean"][known], np.array(expected)[known])
+    # no SLO, never abnormal
+    assert spans["mean"][~known].isna().all()
+    assert not abnormal_spans(spans)[~known].any()